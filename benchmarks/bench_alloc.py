@@ -0,0 +1,113 @@
+""" Compares per-ping allocation churn and latency of ping()/ping6() with
+handle-owned scratch state against previous allocate-per-call approach.
+
+Usage: python -m benchmarks.bench_alloc [-n COUNT] [-a ADDRESS] [-6]
+"""
+
+import argparse
+import ctypes
+import os
+import time
+import tracemalloc
+
+import winping
+from winping.structs import *
+
+
+class LegacyIpOptionInformation(object):
+    def __init__(s, r):
+        s.Ttl = r.Ttl
+        s.Tos = r.Tos
+        s.Flags = r.Flags
+        s.OptionsData = ctypes.string_at(r.OptionsData, r.OptionsSize)
+
+
+class LegacyIcmpEchoReply(object):
+    def __init__(s, r):
+        s.Address = str(r.Address)
+        s.Status = r.Status
+        s.RoundTripTime = r.RoundTripTime
+        s.Data = ctypes.string_at(r.Data, r.DataSize)
+        s.Options = LegacyIpOptionInformation(r.Options)
+
+
+class LegacyIcmp6EchoReply(object):
+    def __init__(s, r):
+        s.Address = str(r.Address.sin6_addr)
+        s.Status = r.Status
+        s.RoundTripTime = r.RoundTripTime
+
+
+def legacy_ping(handle, address, *, timeout=1000, data=None,
+                expected_count=10):
+    address = inet_addr(address)
+    if data is None:
+        data = os.urandom(32)
+    bufsize = (ctypes.sizeof(ICMP_ECHO_REPLY) +
+               len(data) + 8) * expected_count
+    buf = ctypes.create_string_buffer(bufsize)
+    count = handle.backend.send_echo(handle.handle, address, data, None,
+                                     buf, bufsize, timeout)
+    replies = ctypes.cast(buf, ctypes.POINTER(ICMP_ECHO_REPLY * count)).contents
+    return [ LegacyIcmpEchoReply(r) for r in replies ]
+
+
+def legacy_ping6(handle, address, *, timeout=1000, data=None,
+                 expected_count=10):
+    address = inet6_addr(address)
+    source = inet6_addr('::')
+    options = IP_OPTION_INFORMATION(128, 0, 0, 0, 0)
+    if data is None:
+        data = os.urandom(32)
+    bufsize = (ctypes.sizeof(ICMPV6_ECHO_REPLY) + len(data) + 8 +
+               ctypes.sizeof(IO_STATUS_BLOCK)) * expected_count
+    buf = ctypes.create_string_buffer(bufsize)
+    count = handle.backend.send_echo6(handle.handle, source, address, data,
+                                      options, buf, bufsize, timeout)
+    replies = ctypes.cast(buf, ctypes.POINTER(ICMPV6_ECHO_REPLY * count)).contents
+    return [ LegacyIcmp6EchoReply(r) for r in replies ]
+
+
+def measure(fun, handle, address, count):
+    fun(handle, address)
+    start = time.perf_counter()
+    for _ in range(count):
+        fun(handle, address)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fun(handle, address)
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fun(handle, address)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return elapsed / count * 1e6, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", dest="count", type=int, default=2000)
+    parser.add_argument("-a", dest="address", default=None)
+    parser.add_argument("-6", dest="ipv6", action="store_true")
+    args = parser.parse_args()
+
+    if args.ipv6:
+        Handle, funs = winping.Icmp6Handle, (legacy_ping6, winping.ping6)
+        address = args.address or '::1'
+    else:
+        Handle, funs = winping.IcmpHandle, (legacy_ping, winping.ping)
+        address = args.address or '127.0.0.1'
+
+    print("%-10s %12s %16s" % ("variant", "us/ping", "peak bytes/ping"))
+    for name, fun in zip(("legacy", "pooled"), funs):
+        with Handle() as handle:
+            us, peak = measure(fun, handle, address, args.count)
+            print("%-10s %12.2f %16d" % (name, us, peak))
+            if fun is funs[1]:
+                print("pooled buffers: allocated=%d reused=%d" %
+                      (handle.buffers.allocated, handle.buffers.reused))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+""" Measures highest send rate LoadGenerator sustains on deterministic
+in-process backend, i.e. its own CPU cost. No packets are sent.
+
+Usage: python -m benchmarks.bench_load [-d SECONDS] [-l SIZE]
+                                       [-c COUNT ...]
+"""
+
+import argparse
+import asyncio
+
+from winping.load import LoadGenerator
+
+from .fake import FakeBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-d", dest="duration", type=float, default=3.,
+                        help="seconds to run each case")
+    parser.add_argument("-l", dest="size", type=int, default=32,
+                        help="number of data bytes to be sent")
+    parser.add_argument("-c", dest="inflight", type=int, nargs="+",
+                        default=[64, 256, 1024],
+                        help="in-flight request limits to measure")
+    args = parser.parse_args()
+
+    print("%-10s %14s %14s" % ("inflight", "sent/s", "replies/s"))
+    for inflight in args.inflight:
+        loop = asyncio.new_event_loop()
+        # rate far above what generator can reach
+        generator = LoadGenerator(loop, ['127.0.0.1'], 1e9, size=args.size,
+                                  max_inflight=inflight,
+                                  backend=FakeBackend(max_rtt=1))
+        try:
+            stats = loop.run_until_complete(generator.run(args.duration))
+        finally:
+            generator.close()
+            loop.close()
+        print("%-10d %14.0f %14.0f" % (inflight,
+                                       generator.sent / args.duration,
+                                       stats.received / args.duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+""" Measures library overhead of ping calls on deterministic in-process
+backend: pings per second, peak allocated bytes per ping and reply parse
+cost, for single and batched calls. No packets are sent.
+
+Usage: python -m benchmarks.bench_ping [-n COUNT] [-r REPLIES] [-k CASE]
+                                       [--save FILE] [--compare FILE]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import winping
+from winping.structs import *
+
+from .fake import FakeBackend
+
+ADDRESS = '192.0.2.1'
+ADDRESS6 = '2001:db8::1'
+BATCH_SIZE = 256
+REPEAT = 3
+
+
+def _targets(count, ipv6=False):
+    if ipv6:
+        return ['2001:db8::%x' % (i + 1,) for i in range(count)]
+    return ['198.18.%d.%d' % (i // 250, i % 250 + 1) for i in range(count)]
+
+
+def _filled(handle, replies):
+    """ Returns buffer lease holding replies as left by backend """
+    data = handle.default_data
+    bufsize = handle.bufsize(data, replies)
+    lease = handle.buffers.lease(bufsize)
+    if isinstance(handle, winping.Icmp6Handle):
+        count = handle.backend.send_echo6(handle.handle, handle.source,
+                                          handle.address(ADDRESS6), data,
+                                          handle.options, lease.buf,
+                                          bufsize, 1000)
+    else:
+        count = handle.backend.send_echo(handle.handle,
+                                         handle.address(ADDRESS), data,
+                                         None, lease.buf, bufsize, 1000)
+    return lease, count
+
+
+def _touch(replies):
+    for rep in replies:
+        rep.Address
+        rep.Status
+        rep.RoundTripTime
+        if isinstance(rep, winping.IcmpEchoReply):
+            rep.Data
+            rep.Options.Ttl
+
+
+def case_ping(backend, replies):
+    handle = winping.IcmpHandle(backend)
+    return (lambda: winping.ping(handle, ADDRESS, expected_count=replies),
+            1, handle.close)
+
+
+def case_ping6(backend, replies):
+    handle = winping.Icmp6Handle(backend)
+    return (lambda: winping.ping6(handle, ADDRESS6, expected_count=replies),
+            1, handle.close)
+
+
+def case_ping_profile(backend, replies):
+    handle = winping.IcmpHandle(backend)
+    profile = winping.ProbeProfile(ttl=64, tos=0x10)
+    return (lambda: winping.ping(handle, ADDRESS, expected_count=replies,
+                                 profile=profile),
+            1, handle.close)
+
+
+def case_parse(backend, replies):
+    handle = winping.IcmpHandle(backend)
+    lease, count = _filled(handle, replies)
+    return (lambda: _touch(winping._parse(lease, count)), 1, handle.close)
+
+
+def case_parse6(backend, replies):
+    handle = winping.Icmp6Handle(backend)
+    lease, count = _filled(handle, replies)
+    return (lambda: _touch(winping._parse6(lease, count)), 1, handle.close)
+
+
+def case_inet_addr(backend, replies):
+    return (lambda: inet_addr(ADDRESS), 1, None)
+
+
+def case_inet6_addr(backend, replies):
+    return (lambda: inet6_addr(ADDRESS6), 1, None)
+
+
+def case_async_batch(backend, replies):
+    loop = asyncio.new_event_loop()
+    handle = winping.IcmpHandle(backend)
+    targets = _targets(BATCH_SIZE)
+
+    async def batch():
+        await asyncio.gather(*(
+            winping.async_ping(handle, target, expected_count=replies)
+            for target in targets))
+
+    def run():
+        loop.run_until_complete(batch())
+
+    def close():
+        handle.close()
+        loop.close()
+
+    return run, BATCH_SIZE, close
+
+
+def case_ping_many(backend, replies):
+    targets = _targets(BATCH_SIZE // 2) + _targets(BATCH_SIZE // 2, True)
+    return (lambda: collections.deque(winping.ping_many(
+                targets, backend=backend, expected_count=replies), 0),
+            BATCH_SIZE, None)
+
+
+def case_sweep(backend, replies):
+    targets = _targets(BATCH_SIZE)
+    return (lambda: winping.sweep(targets, backend=backend,
+                                  expected_count=replies),
+            BATCH_SIZE, None)
+
+
+CASES = collections.OrderedDict([
+    ('ping', case_ping),
+    ('ping6', case_ping6),
+    ('ping_profile', case_ping_profile),
+    ('parse', case_parse),
+    ('parse6', case_parse6),
+    ('inet_addr', case_inet_addr),
+    ('inet6_addr', case_inet6_addr),
+    ('async_batch', case_async_batch),
+    ('ping_many', case_ping_many),
+    ('sweep', case_sweep),
+])
+
+
+def measure(fun, per_call, count):
+    """ Returns pair (pings per second, peak bytes per ping). Timing is best
+    of REPEAT runs of count pings. """
+    calls = max(count // per_call, 1)
+    fun()
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fun()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fun()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fun()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return calls * per_call / best, peak / per_call
+
+
+def run(names, count, replies):
+    results = collections.OrderedDict()
+    for name in names:
+        backend = FakeBackend(replies=replies)
+        fun, per_call, close = CASES[name](backend, replies)
+        try:
+            rate, peak = measure(fun, per_call, count)
+        finally:
+            if close is not None:
+                close()
+        results[name] = collections.OrderedDict([
+            ('pings_per_sec', rate),
+            ('us_per_ping', 1e6 / rate),
+            ('peak_bytes_per_ping', peak),
+        ])
+    return results
+
+
+def report(results, baseline=None):
+    header = "%-14s %14s %12s %16s" % ("case", "pings/s", "us/ping",
+                                        "peak bytes/ping")
+    if baseline is not None:
+        header += " %10s" % ("vs base",)
+    print(header)
+    for name, res in results.items():
+        line = "%-14s %14.0f %12.3f %16.1f" % (name, res['pings_per_sec'],
+                                               res['us_per_ping'],
+                                               res['peak_bytes_per_ping'])
+        if baseline is not None:
+            base = baseline.get(name)
+            if base:
+                line += " %+9.1f%%" % ((res['pings_per_sec'] /
+                                        base['pings_per_sec'] - 1) * 100,)
+            else:
+                line += " %10s" % ("-",)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", dest="count", type=int, default=20000,
+                        help="pings per timed run")
+    parser.add_argument("-r", dest="replies", type=int, default=1,
+                        help="replies returned for each request")
+    parser.add_argument("-k", dest="cases", action="append",
+                        choices=list(CASES),
+                        help="run only selected case. May be repeated")
+    parser.add_argument("--save", metavar="FILE",
+                        help="save results as JSON")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare throughput with saved results")
+    args = parser.parse_args()
+
+    results = run(args.cases or list(CASES), args.count, args.replies)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+
+    if args.save:
+        doc = collections.OrderedDict([
+            ('python', sys.version.split()[0]),
+            ('implementation', platform.python_implementation()),
+            ('platform', platform.platform()),
+            ('timestamp', time.time()),
+            ('count', args.count),
+            ('replies', args.replies),
+            ('results', results),
+        ])
+        with open(args.save, 'w') as f:
+            json.dump(doc, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
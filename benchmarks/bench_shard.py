@@ -0,0 +1,46 @@
+""" Measures throughput of sharded_sweep() by number of worker processes on
+deterministic in-process backend. No packets are sent.
+
+Usage: python -m benchmarks.bench_shard [-n TARGETS] [-r ROUNDS]
+                                        [-j PROCESSES ...]
+"""
+
+import argparse
+import os
+import time
+
+import winping
+
+from .fake import FakeBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", dest="count", type=int, default=100000,
+                        help="number of targets")
+    parser.add_argument("-r", dest="rounds", type=int, default=3,
+                        help="rounds over target list")
+    parser.add_argument("-j", dest="processes", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help="process counts to measure")
+    parser.add_argument("-c", dest="concurrency", type=int, default=1024,
+                        help="requests in flight per process")
+    args = parser.parse_args()
+
+    targets = ['10.%d.%d.%d' % (i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF)
+               for i in range(1, args.count + 1)]
+    print("%-10s %14s %10s" % ("processes", "pings/s", "speedup"))
+    base = None
+    for processes in args.processes:
+        start = time.perf_counter()
+        results = winping.sharded_sweep(
+            targets, processes=processes, rounds=args.rounds, interval=0,
+            concurrency=args.concurrency, backend=FakeBackend())
+        rate = len(results) / (time.perf_counter() - start)
+        if base is None:
+            base = rate
+        print("%-10d %14.0f %9.2fx" % (processes, rate, rate / base))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+""" Sweeps large address list on simulated network and reports throughput
+along with outcome digest, which stays the same for the same seed.
+
+Usage: python -m benchmarks.bench_simulated [-n TARGETS] [-r ROUNDS]
+                                            [-s SEED] [--time-scale SCALE]
+"""
+
+import argparse
+import time
+
+import winping
+from winping.backends.simulated import Backend, TargetProfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", dest="count", type=int, default=50000,
+                        help="number of targets")
+    parser.add_argument("-r", dest="rounds", type=int, default=3,
+                        help="rounds over target list")
+    parser.add_argument("-c", dest="concurrency", type=int, default=4096,
+                        help="requests in flight")
+    parser.add_argument("-s", dest="seed", type=int, default=0,
+                        help="simulation seed")
+    parser.add_argument("--time-scale", dest="time_scale", type=float,
+                        default=0., help="delay multiplier, 1 is real time")
+    args = parser.parse_args()
+
+    backend = Backend({
+        # nearby hosts, some of them flaky
+        '10.0.0.0/16': TargetProfile(latency=2, jitter=.5, loss=.01),
+        # remote hosts with heavy tail
+        '10.1.0.0/16': TargetProfile(latency=40, jitter=20,
+                                     distribution='exponential', loss=.05),
+        # filtered network
+        '10.2.0.0/16': TargetProfile(error='DestinationHostUnreachable',
+                                     error_address='10.2.0.1'),
+    }, TargetProfile(loss=1.), seed=args.seed, time_scale=args.time_scale)
+    targets = ['10.%d.%d.%d' % (i % 4, i >> 8 & 0xFF, i & 0xFF)
+               for i in range(args.count)]
+
+    results = winping.ResultColumns(targets)
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        winping.sweep(targets, results, concurrency=args.concurrency,
+                      timeout=200, backend=backend)
+    elapsed = time.perf_counter() - start
+    stats = results.stats_by_target()
+    received = sum(s.received for s in stats.values())
+    rtt_sum = sum(s.avg * s.received for s in stats.values() if s.received)
+    print("%d requests in %.2fs, %.0f pings/s" %
+          (len(results), elapsed, len(results) / elapsed))
+    print("received = %d, RTT sum = %.0fms" % (received, rtt_sum))
+
+
+if __name__ == '__main__':
+    main()
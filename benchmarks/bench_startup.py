@@ -0,0 +1,146 @@
+""" Measures startup cost: wall time of fresh interpreter importing the
+package or running the command line tool, less bare interpreter startup,
+along with import time and number of modules it loads, as reported by
+-X importtime.
+
+Usage: python -m benchmarks.bench_startup [-r RUNS] [-k CASE]
+                                          [--save FILE] [--compare FILE]
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+CASES = collections.OrderedDict([
+    ('import', ['-c', 'import winping']),
+    ('import_all', ['-c', 'from winping import *']),
+    ('cli_help', ['-m', 'winping', '-h']),
+    ('serve_help', ['-m', 'winping', 'serve', '-h']),
+])
+BASELINE = ['-c', 'pass']
+
+
+def _run(args, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    proc = subprocess.run(cmd + args, cwd=root, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, check=True)
+    return time.perf_counter() - start, proc.stderr.decode()
+
+
+def wall_time(args, runs):
+    """ Returns best wall time in seconds out of runs """
+    return min(_run(args)[0] for _ in range(runs))
+
+
+def _imports(args):
+    """ Returns ordered dict of module name to pair (cumulative import time
+    in microseconds, whether module was imported at top level) """
+    res = collections.OrderedDict()
+    for line in _run(args, importtime=True)[1].splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        res[name.strip()] = (int(fields[1]), not name.startswith('  '))
+    return res
+
+
+def import_time(args, startup):
+    """ Returns pair (import time in seconds, number of modules imported)
+    beyond ones imported during interpreter startup """
+    total = 0
+    count = 0
+    for name, (cumulative, top) in _imports(args).items():
+        if name in startup:
+            continue
+        count += 1
+        # nested imports are part of cumulative time of top level ones
+        if top:
+            total += cumulative
+    return total / 1e6, count
+
+
+def run(names, runs):
+    base = wall_time(BASELINE, runs)
+    startup = _imports(BASELINE)
+    results = collections.OrderedDict()
+    for name in names:
+        args = CASES[name]
+        wall = wall_time(args, runs)
+        imports, modules = import_time(args, startup)
+        results[name] = collections.OrderedDict([
+            ('wall_ms', wall * 1000),
+            ('startup_ms', (wall - base) * 1000),
+            ('import_ms', imports * 1000),
+            ('modules', modules),
+        ])
+    return base, results
+
+
+def report(base, results, baseline=None):
+    print("bare interpreter: %.1f ms" % (base * 1000,))
+    header = "%-12s %10s %12s %12s %8s" % ("case", "wall ms", "startup ms",
+                                          "import ms", "modules")
+    if baseline is not None:
+        header += " %10s" % ("vs base",)
+    print(header)
+    for name, res in results.items():
+        line = "%-12s %10.1f %12.1f %12.1f %8d" % (
+            name, res['wall_ms'], res['startup_ms'], res['import_ms'],
+            res['modules'])
+        if baseline is not None:
+            prev = baseline.get(name)
+            if prev:
+                line += " %+9.1f%%" % ((res['startup_ms'] /
+                                        prev['startup_ms'] - 1) * 100,)
+            else:
+                line += " %10s" % ("-",)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-r", dest="runs", type=int, default=10,
+                        help="interpreter launches per case, best is taken")
+    parser.add_argument("-k", dest="cases", action="append",
+                        choices=list(CASES),
+                        help="run only selected case. May be repeated")
+    parser.add_argument("--save", metavar="FILE",
+                        help="save results as JSON")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare startup time with saved results")
+    args = parser.parse_args()
+
+    base, results = run(args.cases or list(CASES), args.runs)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(base, results, baseline)
+
+    if args.save:
+        doc = collections.OrderedDict([
+            ('python', sys.version.split()[0]),
+            ('implementation', platform.python_implementation()),
+            ('platform', platform.platform()),
+            ('timestamp', time.time()),
+            ('runs', args.runs),
+            ('interpreter_ms', base * 1000),
+            ('results', results),
+        ])
+        with open(args.save, 'w') as f:
+            json.dump(doc, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
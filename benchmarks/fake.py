@@ -0,0 +1,129 @@
+""" Deterministic in-process backend for benchmarks.
+
+Replies are laid out in caller's buffer like IcmpSendEcho / Icmp6SendEcho2
+do: array of ICMP_ECHO_REPLY (ICMPV6_ECHO_REPLY) structures followed by
+echoed data. No packets are sent, so benchmarks measure library overhead
+only and run on any platform.
+"""
+
+import ctypes
+
+from winping.backends import Backend
+from winping.errors import *
+from winping.structs import *
+
+IP_SUCCESS = 0
+IP_BUF_TOO_SMALL = 11001
+IP_REQ_TIMED_OUT = 11010
+
+_REPLY_SIZE = ctypes.sizeof(ICMP_ECHO_REPLY)
+_REPLY6_SIZE = ctypes.sizeof(ICMPV6_ECHO_REPLY)
+
+
+class FakeHandle(object):
+    __slots__ = ('seq',)
+
+    def __init__(self):
+        self.seq = 0
+
+
+class FakeBackend(Backend):
+    """ Answers every request with `replies` echo replies. RTT cycles
+    through 0..max_rtt-1 ms by sequence number, every `loss_every`-th request
+    (if set) times out. """
+
+    name = 'fake'
+
+    def __init__(self, replies=1, ttl=64, max_rtt=20, loss_every=None):
+        self.replies = replies
+        self.ttl = ttl
+        self.max_rtt = max_rtt
+        self.loss_every = loss_every
+
+    def create_handle(self):
+        return FakeHandle()
+
+    def create_handle6(self):
+        return FakeHandle()
+
+    def close_handle(self, handle):
+        pass
+
+    def _next(self, handle, funcname):
+        handle.seq += 1
+        if self.loss_every and handle.seq % self.loss_every == 0:
+            raise RequestTimedOut(0, "%s failed" % (funcname,), None,
+                                  IP_REQ_TIMED_OUT)
+        return handle.seq % self.max_rtt
+
+    def send_echo(self, handle, address, data, options,
+                  buf, bufsize, timeout, source=None):
+        rtt = self._next(handle, "IcmpSendEcho")
+        count = self.replies
+        size = len(data)
+        if bufsize < (_REPLY_SIZE + size) * count:
+            raise BufferTooSmall(0, "IcmpSendEcho failed", None,
+                                 IP_BUF_TOO_SMALL)
+        replies = (ICMP_ECHO_REPLY * count).from_buffer(buf)
+        base = ctypes.addressof(buf)
+        data_ptr = base + _REPLY_SIZE * count
+        ctypes.memmove(data_ptr, data, size)
+        ttl = options.Ttl if options is not None and options.Ttl else self.ttl
+        for rep in replies:
+            rep.Address = address
+            rep.Status = IP_SUCCESS
+            rep.RoundTripTime = rtt
+            rep.DataSize = size
+            rep.Reserved = 0
+            rep.Data = data_ptr
+            rep.Options.Ttl = ttl
+            rep.Options.Tos = options.Tos if options is not None else 0
+            rep.Options.Flags = options.Flags if options is not None else 0
+            rep.Options.OptionsSize = 0
+            rep.Options.OptionsData = 0
+        return count
+
+    def send_echo6(self, handle, source, address, data, options,
+                   buf, bufsize, timeout):
+        rtt = self._next(handle, "Icmp6SendEcho2")
+        count = self.replies
+        size = len(data)
+        if bufsize < (_REPLY6_SIZE + size) * count:
+            raise BufferTooSmall(0, "Icmp6SendEcho2 failed", None,
+                                 IP_BUF_TOO_SMALL)
+        replies = (ICMPV6_ECHO_REPLY * count).from_buffer(buf)
+        ctypes.memmove(ctypes.addressof(buf) + _REPLY6_SIZE * count, data,
+                       size)
+        for rep in replies:
+            rep.Address.sin6_port = 0
+            rep.Address.sin6_flowinfo = 0
+            rep.Address.sin6_addr = address.sin6_addr
+            rep.Address.sin6_scope_id = 0
+            rep.Status = IP_SUCCESS
+            rep.RoundTripTime = rtt
+        return count
+
+    def send_echo_async(self, handle, address, data, options,
+                        buf, bufsize, timeout, loop, source=None):
+        return self._complete(loop, self.send_echo, handle, address, data,
+                              options, buf, bufsize, timeout)
+
+    def send_echo6_async(self, handle, source, address, data, options,
+                         buf, bufsize, timeout, loop):
+        return self._complete(loop, self.send_echo6, handle, source, address,
+                              data, options, buf, bufsize, timeout)
+
+    def _complete(self, loop, fun, *args):
+        # completion is delivered on next loop iteration, like real reply
+        fut = loop.create_future()
+
+        def complete():
+            if fut.done():
+                return
+            try:
+                fut.set_result(fun(*args))
+            except OSError as e:
+                fut.set_exception(e)
+
+        loop.call_soon(complete)
+        return fut
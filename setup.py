@@ -12,13 +12,16 @@ setup(name='winping',
       author='Vladislav Yarmak',
       author_email='vladislav-ex-src@vm-0.com',
       license='MIT',
-      packages=['winping'],
+      packages=['winping', 'winping.backends'],
       python_requires='>=3.5.3',
       setup_requires=[
           'wheel',
       ],
       install_requires=[
       ],
+      extras_require={
+          'numpy': ['numpy'],
+      },
       entry_points={
           'console_scripts': [
               'winping=winping.__main__:main',
@@ -38,6 +41,7 @@ setup(name='winping',
           "Operating System :: Microsoft :: Windows :: Windows 8",
           "Operating System :: Microsoft :: Windows :: Windows 8.1",
           "Operating System :: Microsoft :: Windows :: Windows 10",
+          "Operating System :: POSIX :: Linux",
           "Development Status :: 4 - Beta",
           "Environment :: Console",
           "Intended Audience :: Developers",
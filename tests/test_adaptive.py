@@ -0,0 +1,105 @@
+import unittest
+
+from winping.adaptive import AdaptiveTimeouts
+from winping.errors import RequestTimedOut
+
+IP_DEST_HOST_UNREACHABLE = 11003
+IP_REQ_TIMED_OUT = 11010
+IP_TTL_EXPIRED_TRANSIT = 11013
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class AdaptiveTimeoutsTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.timeouts = AdaptiveTimeouts(max_timeout=1000, min_timeout=50,
+                                         threshold=3, backoff=1.,
+                                         max_backoff=5., clock=self.clock)
+
+    def fail_probes(self, count, status=IP_REQ_TIMED_OUT):
+        for _ in range(count):
+            self.timeouts.failure('t', status)
+
+    def test_unknown_target(self):
+        self.assertEqual(self.timeouts.timeout('t'), 1000)
+        self.assertTrue(self.timeouts.should_probe('t'))
+
+    def test_rto(self):
+        # first sample: srtt = R, rttvar = R / 2
+        self.timeouts.observe('t', 100.)
+        self.assertEqual(self.timeouts.timeout('t'), 300)
+        # rttvar = 3/4 * 50 + 1/4 * 20, srtt = 7/8 * 100 + 1/8 * 120
+        self.timeouts.observe('t', 120.)
+        state = self.timeouts.targets['t']
+        self.assertEqual((state.srtt, state.rttvar), (102.5, 42.5))
+        self.assertEqual(self.timeouts.timeout('t'), 273)
+
+    def test_rto_bounds(self):
+        for _ in range(50):
+            self.timeouts.observe('t', 1.)
+        self.assertEqual(self.timeouts.timeout('t'), 50)
+        self.timeouts.observe('slow', 800.)
+        self.assertEqual(self.timeouts.timeout('slow'), 1000)
+
+    def test_timeout_doubles(self):
+        self.timeouts.observe('t', 100.)
+        self.fail_probes(1)
+        self.assertEqual(self.timeouts.timeout('t'), 600)
+        self.fail_probes(1)
+        self.assertEqual(self.timeouts.timeout('t'), 1000)
+        # unreachable host doesn't mean timeout was too short
+        self.timeouts.observe('t', 100.)
+        timeout = self.timeouts.timeout('t')
+        self.fail_probes(1, IP_DEST_HOST_UNREACHABLE)
+        self.assertEqual(self.timeouts.timeout('t'), timeout)
+
+    def test_backoff(self):
+        self.fail_probes(2)
+        self.assertTrue(self.timeouts.should_probe('t'))
+        self.fail_probes(1)
+        self.assertFalse(self.timeouts.should_probe('t'))
+        self.assertEqual(self.timeouts.backed_off(), ['t'])
+        self.clock.now = 1.
+        self.assertTrue(self.timeouts.should_probe('t'))
+        # every further failure doubles recovery time up to max_backoff
+        for delay in (2., 4., 5., 5.):
+            self.fail_probes(1)
+            self.clock.now += delay - .1
+            self.assertFalse(self.timeouts.should_probe('t'))
+            self.clock.now += .1
+            self.assertTrue(self.timeouts.should_probe('t'))
+        self.assertEqual(self.timeouts.targets['t'].skipped, 5)
+
+    def test_reply_resets_backoff(self):
+        self.fail_probes(3, IP_DEST_HOST_UNREACHABLE)
+        self.assertFalse(self.timeouts.should_probe('t'))
+        self.timeouts.observe('t', 10.)
+        self.assertTrue(self.timeouts.should_probe('t'))
+        self.assertEqual(self.timeouts.backed_off(), [])
+        self.assertEqual(self.timeouts.targets['t'].failures, 0)
+
+    def test_other_statuses_are_ignored(self):
+        self.fail_probes(5, IP_TTL_EXPIRED_TRANSIT)
+        self.assertTrue(self.timeouts.should_probe('t'))
+        self.assertNotIn('t', self.timeouts.targets)
+
+    def test_add_result(self):
+        timed_out = RequestTimedOut(0, "Request timed out", None,
+                                    IP_REQ_TIMED_OUT)
+        for _ in range(3):
+            self.timeouts.add_result('t', timed_out)
+        # errors without IP_STATUS code are not outcomes of probes
+        self.timeouts.add_result('t', OSError(1, "Operation not permitted"))
+        self.assertEqual(self.timeouts.targets['t'].failures, 3)
+        self.assertFalse(self.timeouts.should_probe('t'))
+
+
+if __name__ == '__main__':
+    unittest.main()
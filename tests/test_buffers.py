@@ -0,0 +1,46 @@
+import unittest
+
+from winping.buffers import BufferPool
+
+
+class RacyList(list):
+    """ Free list emulating another thread releasing small buffer right
+    before buffer is taken off the list """
+
+    def __init__(self, items, released):
+        super().__init__(items)
+        self.released = released
+
+    def pop(self, *args):
+        if self.released is not None:
+            self.append(self.released)
+            self.released = None
+        return super().pop(*args)
+
+
+class BufferPoolTest(unittest.TestCase):
+    def test_reuses_fitting_buffer(self):
+        pool = BufferPool()
+        buf = pool.acquire(100)
+        pool.release(buf)
+        self.assertIs(pool.acquire(50), buf)
+        self.assertEqual(pool.reused, 1)
+
+    def test_drops_small_buffer(self):
+        pool = BufferPool()
+        pool.release(pool.acquire(10))
+        self.assertGreaterEqual(len(pool.acquire(100)), 100)
+        self.assertEqual(pool.allocated, 2)
+        self.assertEqual(pool.dropped, 1)
+        self.assertEqual(pool.free, [])
+
+    def test_concurrent_release(self):
+        pool = BufferPool()
+        small, big = pool.acquire(10), pool.acquire(100)
+        pool.free = RacyList([big], small)
+        self.assertGreaterEqual(len(pool.acquire(100)), 100)
+        self.assertEqual(pool.free, [big])
+
+
+if __name__ == '__main__':
+    unittest.main()
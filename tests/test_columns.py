@@ -0,0 +1,106 @@
+import math
+import unittest
+import unittest.mock
+
+import winping
+from winping import columns
+from winping.backends.simulated import Backend, TargetProfile
+from winping.columns import ResultColumns
+from winping.errors import RequestTimedOut
+
+IP_REQ_TIMED_OUT = 11010
+
+
+def filled():
+    cols = ResultColumns(['a', 'b'])
+    for idx, rtt in enumerate((4., 1., 3., 2.)):
+        cols.add('a', 0, rtt, 64, timestamp=100. + idx)
+    cols.add('a', IP_REQ_TIMED_OUT, timestamp=104.)
+    cols.add('b', IP_REQ_TIMED_OUT, timestamp=105.)
+    return cols
+
+
+def rows(cols):
+    return list(zip([cols.targets[idx] for idx in cols.target], cols.status,
+                    [None if math.isnan(rtt) else rtt for rtt in cols.rtt],
+                    cols.ttl, cols.timestamp))
+
+
+class ResultColumnsTest(unittest.TestCase):
+    def test_round_trip(self):
+        cols = filled()
+        copy = ResultColumns(cols.targets)
+        copy.loads(cols.dumps())
+        self.assertEqual(rows(copy), rows(cols))
+        # loads() appends
+        copy.loads(cols.dumps())
+        self.assertEqual(rows(copy), rows(cols) * 2)
+
+    def test_round_trip_with_offset(self):
+        part = ResultColumns(['b'])
+        part.add('b', 0, 5., 60, timestamp=1.)
+        whole = ResultColumns(['a', 'b'])
+        whole.loads(part.dumps(index_offset=1))
+        self.assertEqual(rows(whole), [('b', 0, 5., 60, 1.)])
+
+    def test_empty_round_trip(self):
+        copy = ResultColumns()
+        copy.loads(ResultColumns().dumps())
+        self.assertEqual(len(copy), 0)
+
+    def test_stats(self):
+        stats = filled().stats('a')
+        self.assertEqual((stats.sent, stats.received, stats.lost),
+                         (5, 4, 1))
+        self.assertEqual(stats.loss, 20.)
+        self.assertEqual((stats.min, stats.max, stats.avg), (1., 4., 2.5))
+        # linear interpolation between closest ranks
+        self.assertSameValues(list(stats.percentiles.values()),
+                              [2.5, 3.7, 3.97])
+
+    def test_stats_by_target(self):
+        cols = filled()
+        by_target = cols.stats_by_target()
+        self.assertEqual(list(by_target), ['a', 'b'])
+        self.assertEqual(by_target['a'], cols.stats('a'))
+        self.assertEqual((by_target['b'].sent, by_target['b'].loss),
+                         (1, 100.))
+        self.assertTrue(math.isnan(by_target['b'].avg))
+
+    @unittest.skipIf(columns.numpy is None, "NumPy is not available")
+    def test_numpy_matches_python(self):
+        cols = filled()
+        vectorized = cols.stats_by_target()
+        with unittest.mock.patch.object(columns, 'numpy', None):
+            expected = cols.stats_by_target()
+        for target, stats in expected.items():
+            other = vectorized[target]
+            self.assertEqual(stats[:4], other[:4])
+            self.assertSameValues(
+                stats[4:7] + tuple(stats.percentiles.values()),
+                other[4:7] + tuple(other.percentiles.values()))
+
+    def assertSameValues(self, first, second):
+        self.assertEqual(len(first), len(second))
+        for x, y in zip(first, second):
+            if math.isnan(x):
+                self.assertTrue(math.isnan(y))
+            else:
+                self.assertAlmostEqual(x, y)
+
+    def test_add_result(self):
+        cols = ResultColumns()
+        backend = Backend(default=TargetProfile(latency=7, ttl=50),
+                          time_scale=0)
+        with winping.IcmpHandle(backend) as handle:
+            cols.add_result('t', winping.ping(handle, '192.0.2.1'))
+        cols.add_result('t', RequestTimedOut(0, "Request timed out", None,
+                                             IP_REQ_TIMED_OUT))
+        cols.add_result('t', OSError(1, "Operation not permitted"))
+        self.assertEqual(list(cols.status), [0, IP_REQ_TIMED_OUT])
+        self.assertEqual(cols.rtt[0], 7.)
+        self.assertEqual(cols.ttl[0], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
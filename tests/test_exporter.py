@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+from winping.backends.simulated import Backend, TargetProfile
+from winping.exporter import Exporter
+
+
+async def http_get(host, port, path, method='GET'):
+    """ Returns (status line, body) of HTTP/1.0 request """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(('%s %s HTTP/1.0\r\nHost: %s\r\n\r\n' %
+                      (method, path, host)).encode('ascii'))
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return head.split(b'\r\n', 1)[0].decode('ascii'), body.decode('utf-8')
+
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        backend = Backend({
+            '192.0.2.2': TargetProfile(error='DestinationHostUnreachable'),
+        }, TargetProfile(latency=5), time_scale=0)
+        self.exporter = Exporter(self.loop, [('up', '192.0.2.1'),
+                                             ('down', '192.0.2.2')],
+                                 interval=.01, backend=backend)
+        self.address = self.loop.run_until_complete(
+            self.exporter.start('127.0.0.1', 0))
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.exporter.close())
+        self.loop.close()
+
+    def get(self, path, method='GET'):
+        return self.loop.run_until_complete(
+            http_get(self.address[0], self.address[1], path, method))
+
+    def test_metrics(self):
+        self.loop.run_until_complete(asyncio.sleep(.1))
+        status, body = self.get('/metrics')
+        self.assertEqual(status, 'HTTP/1.0 200 OK')
+        samples = {}
+        for line in body.splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        up = 'target="up",address="192.0.2.1"'
+        down = 'target="down",address="192.0.2.2"'
+        sent = samples['winping_probes_sent_total{%s}' % (up,)]
+        self.assertGreater(sent, 0)
+        self.assertEqual(samples['winping_probes_received_total{%s}' % (up,)],
+                         sent)
+        self.assertEqual(samples['winping_last_rtt_seconds{%s}' % (up,)],
+                         .005)
+        self.assertEqual(samples['winping_rtt_seconds_count{%s}' % (up,)],
+                         sent)
+        self.assertEqual(samples['winping_probes_received_total{%s}' %
+                                 (down,)], 0)
+        self.assertEqual(
+            samples['winping_probe_errors_total{%s,error='
+                    '"DestinationHostUnreachable"}' % (down,)],
+            samples['winping_probes_sent_total{%s}' % (down,)])
+        self.assertEqual(samples['winping_targets'], 2)
+        self.assertEqual(samples['winping_scrapes_total'], 1)
+
+    def test_head(self):
+        status, body = self.get('/metrics', 'HEAD')
+        self.assertEqual(status, 'HTTP/1.0 200 OK')
+        self.assertEqual(body, '')
+
+    def test_not_found(self):
+        self.assertEqual(self.get('/')[0], 'HTTP/1.0 404 Not Found')
+
+    def test_method_not_allowed(self):
+        self.assertEqual(self.get('/metrics', 'POST')[0],
+                         'HTTP/1.0 405 Method Not Allowed')
+
+    def test_idle_client_is_disconnected(self):
+        self.exporter.request_timeout = .05
+
+        async def idle():
+            reader, writer = await asyncio.open_connection(*self.address[:2])
+            try:
+                # request without end of headers
+                writer.write(b'GET /metrics HTTP/1.0\r\n')
+                return await asyncio.wait_for(reader.read(), 5)
+            finally:
+                writer.close()
+
+        self.assertEqual(self.loop.run_until_complete(idle()), b'')
+        self.assertEqual(self.exporter.scrapes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+
+import winping
+from winping.backends.simulated import Backend, TargetProfile
+from winping.errors import RequestTimedOut
+from winping.monitor import StateTracker, UNKNOWN, UP, DEGRADED, DOWN
+
+FAST = '192.0.2.1'
+SLOW = '192.0.2.2'
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def timed_out():
+    return RequestTimedOut(0, "Request timed out", None, 11010)
+
+
+class StateTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.events = []
+        self.tracker = StateTracker(window=30., max_loss=20., max_rtt=100.,
+                                    down_count=3,
+                                    callback=self.events.append,
+                                    clock=self.clock)
+        backend = Backend({SLOW: TargetProfile(latency=300)},
+                          default=TargetProfile(latency=5), time_scale=0)
+        self.handle = winping.IcmpHandle(backend)
+
+    def tearDown(self):
+        self.handle.close()
+
+    def reply(self, target=FAST):
+        return winping.ping(self.handle, target)
+
+    def transitions(self):
+        return [(event.target, event.old, event.new)
+                for event in self.events]
+
+    def test_up_degraded_down_up(self):
+        tracker = self.tracker
+        self.assertEqual(tracker.state('t'), UNKNOWN)
+        event = tracker.add_result('t', self.reply(), timestamp=1.)
+        self.assertEqual((event.old, event.new, event.timestamp),
+                         (UNKNOWN, UP, 1.))
+        for _ in range(2):
+            self.assertIsNone(tracker.add_result('t', self.reply()))
+        # one of four lost is above 20% loss
+        tracker.add_result('t', timed_out())
+        self.assertEqual(tracker.state('t'), DEGRADED)
+        # previous results leave window
+        self.clock.now = 40.
+        for _ in range(3):
+            tracker.add_result('t', timed_out())
+        self.assertEqual(tracker.state('t'), DOWN)
+        self.clock.now = 80.
+        tracker.add_result('t', self.reply())
+        self.assertEqual(self.transitions(), [('t', UNKNOWN, UP),
+                                              ('t', UP, DEGRADED),
+                                              ('t', DEGRADED, DOWN),
+                                              ('t', DOWN, UP)])
+
+    def test_too_few_losses(self):
+        tracker = self.tracker
+        for _ in range(2):
+            self.assertIsNone(tracker.add_result('t', timed_out()))
+        self.assertEqual(tracker.state('t'), UNKNOWN)
+        tracker.add_result('t', timed_out())
+        self.assertEqual(tracker.state('t'), DOWN)
+
+    def test_keeps_state_until_enough_losses(self):
+        tracker = self.tracker
+        tracker.add_result('t', self.reply())
+        self.clock.now = 40.
+        # window holds fewer unanswered probes than down_count
+        for _ in range(2):
+            tracker.add_result('t', timed_out())
+        self.assertEqual(tracker.state('t'), UP)
+
+    def test_slow_target(self):
+        event = self.tracker.add_result('t', self.reply(SLOW))
+        self.assertEqual(event.new, DEGRADED)
+        self.assertEqual(event.as_dict()['rtt'], 300)
+
+    def test_summary(self):
+        tracker = self.tracker
+        tracker.add_result('a', self.reply())
+        tracker.add_result('b', self.reply(SLOW))
+        tracker.add_result('c', timed_out())
+        summary = tracker.summary()
+        self.assertEqual(list(summary.items()),
+                         [(UP, 1), (DEGRADED, 1), (DOWN, 0), (UNKNOWN, 1),
+                          ('changes', 2)])
+        self.assertEqual(tracker.summary()['changes'], 0)
+
+    def test_as_dict(self):
+        for _ in range(3):
+            self.tracker.add_result('t', timed_out(), timestamp=5.)
+        record = self.events[-1].as_dict()
+        self.assertEqual(list(record.items()),
+                         [('timestamp', 5.), ('target', 't'),
+                          ('old', UNKNOWN), ('new', DOWN), ('sent', 3),
+                          ('received', 0), ('loss', 100.), ('rtt', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
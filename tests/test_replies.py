@@ -0,0 +1,43 @@
+import unittest
+
+import winping
+from winping.backends.simulated import Backend, TargetProfile
+
+
+def simulated():
+    return Backend(default=TargetProfile(latency=5), time_scale=0)
+
+
+class ReplyLifetimeTest(unittest.TestCase):
+    def test_ping6_replies_outlive_next_call(self):
+        with winping.Icmp6Handle(simulated()) as h:
+            first = winping.ping6(h, '2001:db8::1')
+            second = winping.ping6(h, '2001:db8::2')
+            self.assertEqual(first[0].Address, '2001:db8::1')
+            self.assertEqual(second[0].Address, '2001:db8::2')
+
+    def test_ping_replies_outlive_next_call(self):
+        with winping.IcmpHandle(simulated()) as h:
+            first = winping.ping(h, '192.0.2.1')
+            second = winping.ping(h, '192.0.2.2')
+            self.assertEqual(first[0].Address, '192.0.2.1')
+            self.assertEqual(second[0].Address, '192.0.2.2')
+
+    def test_data_outlives_reply(self):
+        with winping.IcmpHandle(simulated()) as h:
+            data = winping.ping(h, '192.0.2.1', data=b'a' * 32)[0].Data
+            expected = bytes(data)
+            winping.ping(h, '192.0.2.2', data=b'b' * 32)
+            self.assertEqual(bytes(data), expected)
+
+    def test_ping_many_ipv6_addresses(self):
+        targets = ['2001:db8::%d' % i for i in range(1, 9)]
+        results = list(winping.ping_many(targets, concurrency=2,
+                                         backend=simulated()))
+        self.assertEqual(len(results), len(targets))
+        for target, replies in results:
+            self.assertEqual(replies[0].Address, target)
+
+
+if __name__ == '__main__':
+    unittest.main()
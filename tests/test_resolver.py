@@ -0,0 +1,113 @@
+import asyncio
+import socket
+import unittest
+
+from winping.resolver import Resolver
+
+ADDRESSES = {
+    'v4.example': [(socket.AF_INET, '192.0.2.1')],
+    'v6.example': [(socket.AF_INET6, '2001:db8::1')],
+    'dual.example': [(socket.AF_INET6, '2001:db8::2'),
+                     (socket.AF_INET, '192.0.2.2')],
+}
+
+
+class StubGetaddrinfo(object):
+    """ getaddrinfo over fixed table which counts lookups """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, host, port, family=0, *args):
+        self.calls.append(host)
+        try:
+            entries = ADDRESSES[host]
+        except KeyError:
+            raise socket.gaierror(socket.EAI_NONAME, "Name not known")
+        return [(af, socket.SOCK_RAW, 0, '', (address, port))
+                for af, address in entries
+                if family in (socket.AF_UNSPEC, af)]
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.now = 0.
+        self.stub = StubGetaddrinfo()
+        self.resolver = Resolver(getaddrinfo=self.stub, ttl=10,
+                                 negative_ttl=1, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.resolver.close()
+        self.loop.close()
+
+    def run_coro(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_resolve(self):
+        self.assertEqual(self.run_coro(self.resolver.resolve('v4.example')),
+                         ('192.0.2.1', socket.AF_INET))
+        self.assertEqual(self.run_coro(self.resolver.resolve('v6.example')),
+                         ('2001:db8::1', socket.AF_INET6))
+
+    def test_family(self):
+        self.assertEqual(
+            self.run_coro(self.resolver.resolve('dual.example',
+                                                socket.AF_INET)),
+            ('192.0.2.2', socket.AF_INET))
+        with self.assertRaises(socket.gaierror):
+            self.run_coro(self.resolver.resolve('v6.example',
+                                                socket.AF_INET))
+
+    def test_literal_is_not_looked_up(self):
+        self.assertEqual(self.run_coro(self.resolver.resolve('192.0.2.9')),
+                         ('192.0.2.9', socket.AF_INET))
+        self.assertEqual(self.stub.calls, [])
+
+    def test_cache(self):
+        self.run_coro(self.resolver.resolve('v4.example'))
+        self.run_coro(self.resolver.resolve('v4.example'))
+        self.assertEqual(self.stub.calls, ['v4.example'])
+        self.assertEqual(self.resolver.hits, 1)
+        self.now = 11.
+        self.run_coro(self.resolver.resolve('v4.example'))
+        self.assertEqual(self.stub.calls, ['v4.example'] * 2)
+
+    def test_negative_cache(self):
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                self.run_coro(self.resolver.resolve('missing.example'))
+        self.assertEqual(self.stub.calls, ['missing.example'])
+        self.now = 2.
+        with self.assertRaises(socket.gaierror):
+            self.run_coro(self.resolver.resolve('missing.example'))
+        self.assertEqual(len(self.stub.calls), 2)
+
+    def test_resolve_many(self):
+        names = ['v4.example', 'missing.example', 'v4.example', '::1']
+        results = self.run_coro(self.resolver.resolve_many(names))
+        self.assertEqual(list(results), ['v4.example', 'missing.example',
+                                         '::1'])
+        self.assertEqual(results['v4.example'],
+                         ('192.0.2.1', socket.AF_INET))
+        self.assertIsInstance(results['missing.example'], socket.gaierror)
+        self.assertEqual(results['::1'], ('::1', socket.AF_INET6))
+        self.assertEqual(sorted(self.stub.calls),
+                         ['missing.example', 'v4.example'])
+
+    def test_resolve_blocking(self):
+        self.assertEqual(self.resolver.resolve_blocking('dual.example'),
+                         ('2001:db8::2', socket.AF_INET6))
+        with self.assertRaises(socket.gaierror):
+            self.resolver.resolve_blocking('missing.example')
+        # cache is shared with coroutine lookups
+        self.assertEqual(self.run_coro(self.resolver.resolve('dual.example')),
+                         ('2001:db8::2', socket.AF_INET6))
+        with self.assertRaises(socket.gaierror):
+            self.run_coro(self.resolver.resolve('missing.example'))
+        self.assertEqual(self.stub.calls, ['dual.example', 'missing.example'])
+        self.assertIsNone(self.resolver.executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
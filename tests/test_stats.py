@@ -0,0 +1,119 @@
+import math
+import statistics
+import unittest
+
+from winping.errors import RequestTimedOut
+from winping.stats import RttHistogram, RttStats, WindowedRttStats
+
+# relative bucket width of histogram with default precision
+PRECISION = 2 ** (1 - 7)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class RttStatsTest(unittest.TestCase):
+    def test_uniform_percentiles(self):
+        stats = RttStats()
+        for rtt in range(1, 1001):
+            stats.add(float(rtt))
+        for q, value in stats.percentiles((50, 90, 99, 100)).items():
+            self.assertAlmostEqual(value, q * 10, delta=q * 10 * PRECISION)
+        self.assertEqual(stats.min, 1.)
+        self.assertEqual(stats.max, 1000.)
+        self.assertAlmostEqual(stats.mean, 500.5)
+
+    def test_exact_small_values(self):
+        stats = RttStats()
+        for rtt in (0.01, 0.02, 0.03, 0.04):
+            stats.add(rtt)
+        self.assertEqual(list(stats.percentiles((25, 50, 100)).values()),
+                         [0.01, 0.02, 0.04])
+
+    def test_stddev(self):
+        rtts = [12.5, 7., 30., 18.25, 9.75, 11.]
+        stats = RttStats()
+        for rtt in rtts:
+            stats.add(rtt)
+        self.assertAlmostEqual(stats.mean, statistics.mean(rtts))
+        self.assertAlmostEqual(stats.stddev, statistics.stdev(rtts))
+
+    def test_jitter(self):
+        stats = RttStats()
+        self.assertTrue(math.isnan(stats.jitter))
+        for rtt in (10., 20., 15., 15.):
+            stats.add(rtt)
+        # differences are 10, 5 and 0
+        self.assertAlmostEqual(stats.jitter, 5.)
+
+    def test_merge(self):
+        rtts = [10., 20., 15., 15., 40., 5.]
+        whole, first, second = RttStats(), RttStats(), RttStats()
+        for idx, rtt in enumerate(rtts):
+            whole.add(rtt)
+            (first if idx < 3 else second).add(rtt)
+        first.add_loss()
+        whole.add_loss()
+        first.merge(second)
+        expected = whole.summary()
+        self.assertEqual(list(first.summary()), list(expected))
+        for key, value in first.summary().items():
+            self.assertAlmostEqual(value, expected[key], msg=key)
+
+    def test_loss(self):
+        stats = RttStats()
+        stats.add(1.)
+        stats.add_result(RequestTimedOut(0, "Request timed out", None, 11010))
+        # errors without IP_STATUS code are not outcomes of probes
+        stats.add_result(OSError(1, "Operation not permitted"))
+        self.assertEqual((stats.sent, stats.received, stats.lost),
+                         (2, 1, 1))
+        self.assertEqual(stats.loss, 50.)
+
+    def test_histogram_is_bounded(self):
+        histogram = RttHistogram()
+        for value in range(0, 10 ** 7, 997):
+            histogram.add(value / 1000)
+        self.assertEqual(histogram.total, len(range(0, 10 ** 7, 997)))
+        # 128 exact values plus 64 buckets per power of two up to 2 ** 24
+        self.assertLessEqual(len(histogram.counts), 128 + 64 * 17)
+
+
+class WindowedRttStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.stats = WindowedRttStats(60., slots=6, clock=self.clock)
+
+    def test_expiry(self):
+        self.stats.add(10.)
+        self.clock.now = 30.
+        self.stats.add(20.)
+        self.stats.add_loss()
+        current = self.stats.current()
+        self.assertEqual((current.sent, current.received), (3, 2))
+        self.clock.now = 65.
+        current = self.stats.current()
+        self.assertEqual((current.sent, current.received), (2, 1))
+        self.assertEqual(current.mean, 20.)
+        self.clock.now = 95.
+        self.assertEqual(self.stats.current().sent, 0)
+        # totals are kept for the whole run
+        self.assertEqual((self.stats.total.sent, self.stats.total.received),
+                         (3, 2))
+
+    def test_bounded_slots(self):
+        for second in range(3600):
+            self.clock.now = float(second)
+            self.stats.add(float(second % 50))
+        self.assertLessEqual(len(self.stats.slots), 6)
+        self.assertEqual(self.stats.current().sent, 60)
+        self.assertEqual(self.stats.total.sent, 3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
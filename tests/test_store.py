@@ -0,0 +1,111 @@
+import math
+import os
+import tempfile
+import unittest
+
+from winping.errors import RequestTimedOut
+from winping.store import TimeSeriesWriter, TimeSeriesReader
+
+IP_REQ_TIMED_OUT = 11010
+
+
+def records(count, start=1000.):
+    """ Records alternating between two targets, every fifth one lost.
+    RTTs are exact in single precision. """
+    res = []
+    for idx in range(count):
+        target = 'a' if idx % 2 == 0 else 'b'
+        if idx % 5 == 4:
+            res.append((start + idx, target, IP_REQ_TIMED_OUT, None))
+        else:
+            res.append((start + idx, target, 0, 1. + idx / 4))
+    return res
+
+
+def written(reader, *args, **kwargs):
+    return [(timestamp, target, status, None if math.isnan(rtt) else rtt)
+            for timestamp, target, status, rtt in
+            reader.query(*args, **kwargs)]
+
+
+class TimeSeriesStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'store')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rows, **kwargs):
+        with TimeSeriesWriter(self.path, **kwargs) as writer:
+            for timestamp, target, status, rtt in rows:
+                if rtt is None:
+                    writer.append(target, status, timestamp=timestamp)
+                else:
+                    writer.append(target, status, rtt, timestamp)
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.path)
+                      if name.endswith('.seg'))
+
+    def test_round_trip(self):
+        rows = records(10)
+        self.write(rows, segment_records=4)
+        self.assertEqual(len(self.segments()), 3)
+        self.assertEqual(written(TimeSeriesReader(self.path)), rows)
+
+    def test_query_range(self):
+        rows = records(10)
+        self.write(rows, segment_records=4)
+        reader = TimeSeriesReader(self.path)
+        self.assertEqual(written(reader, 1002.5, 1007.), rows[3:7])
+        self.assertEqual(written(reader, start=1008.), rows[8:])
+        self.assertEqual(written(reader, end=1000.), [])
+        self.assertEqual(written(reader, targets=['b', 'missing']),
+                         rows[1::2])
+
+    def test_reopen_appends(self):
+        rows = records(6)
+        self.write(rows[:3], segment_records=4)
+        self.write(rows[3:], segment_records=4)
+        self.assertEqual(len(self.segments()), 2)
+        self.assertEqual(written(TimeSeriesReader(self.path)), rows)
+        with open(os.path.join(self.path, 'targets')) as f:
+            self.assertEqual(f.read(), 'a\nb\n')
+
+    def test_retention(self):
+        rows = records(20)
+        self.write(rows, segment_records=4, max_segments=2)
+        self.assertEqual(self.segments(),
+                         ['0000000004.seg', '0000000005.seg'])
+        self.assertEqual(written(TimeSeriesReader(self.path)), rows[12:])
+
+    def test_aggregate(self):
+        self.write(records(10), segment_records=4)
+        reader = TimeSeriesReader(self.path)
+        stats = reader.aggregate()
+        self.assertEqual(list(stats), ['a', 'b'])
+        self.assertEqual((stats['a'].sent, stats['a'].received), (5, 4))
+        self.assertEqual((stats['b'].sent, stats['b'].received), (5, 4))
+        self.assertEqual(stats['a'].mean, (1. + 1.5 + 2.5 + 3.) / 4)
+        buckets = reader.aggregate(step=5.)
+        self.assertEqual(list(buckets), [1000., 1005.])
+        self.assertEqual(buckets[1005.]['b'].sent, 3)
+
+    def test_write_result(self):
+        with TimeSeriesWriter(self.path) as writer:
+            writer.write_result('a', RequestTimedOut(
+                0, "Request timed out", None, IP_REQ_TIMED_OUT), 1.)
+            # errors without IP_STATUS code are not outcomes of probes
+            writer.write_result('a', OSError(1, "Operation not permitted"),
+                                2.)
+        self.assertEqual(written(TimeSeriesReader(self.path)),
+                         [(1., 'a', IP_REQ_TIMED_OUT, None)])
+
+    def test_missing_store(self):
+        with self.assertRaises(FileNotFoundError):
+            TimeSeriesReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from winping.backends.simulated import Backend, TargetProfile
+from winping.traceroute import (traceroute, path_mtu, DEFAULT_MAX_MTU,
+                                IP_TTL_EXPIRED_TRANSIT)
+
+ROUTE = ['10.0.0.1', '10.0.1.1']
+
+
+def simulated():
+    return Backend({
+        '192.0.2.1': TargetProfile(mtu=1400, route=ROUTE),
+        '2001:db8::1': TargetProfile(mtu=1350, route=ROUTE),
+    }, time_scale=0)
+
+
+class PathMtuTest(unittest.TestCase):
+    def test_mtu(self):
+        self.assertEqual(path_mtu('192.0.2.1', backend=simulated()), 1400)
+
+    def test_mtu6(self):
+        self.assertEqual(path_mtu('2001:db8::1', backend=simulated()), 1350)
+
+    def test_mtu_above_search_range(self):
+        self.assertEqual(path_mtu('192.0.2.2', backend=simulated()),
+                         DEFAULT_MAX_MTU)
+        self.assertEqual(path_mtu('192.0.2.2', high=9000,
+                                  backend=simulated()), 9000)
+
+
+class TracerouteTest(unittest.TestCase):
+    def test_hops(self):
+        hops = traceroute('192.0.2.1', queries=2, backend=simulated())
+        self.assertEqual([hop.ttl for hop in hops], [1, 2, 3])
+        for hop, address in zip(hops, ROUTE):
+            self.assertEqual([(res.Address, res.Status)
+                              for res in hop.results],
+                             [(address, IP_TTL_EXPIRED_TRANSIT)] * 2)
+        self.assertEqual([(res.Address, res.Status)
+                          for res in hops[-1].results],
+                         [('192.0.2.1', 0)] * 2)
+
+    def test_max_hops(self):
+        hops = traceroute('192.0.2.1', max_hops=1, backend=simulated())
+        self.assertEqual(len(hops), 1)
+        self.assertEqual(hops[0].results[0].Address, ROUTE[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,339 +1,514 @@
 import ctypes
-import ctypes.wintypes
-import socket
-import struct
+import importlib
 import os
+import sys
 
 from .errors import *
+from .errors import errno_map
+from .structs import *
+from .backends import get_backend
+from .buffers import BufferPool, BufferLease
 
 __all__ = [
     'ping',
     'ping6',
+    'async_ping',
+    'async_ping6',
+    'ping_many',
+    'sweep',
+    'sharded_sweep',
+    'traceroute',
+    'async_traceroute',
+    'path_mtu',
+    'async_path_mtu',
+    'ResultColumns',
+    'Resolver',
+    'AdaptiveTimeouts',
+    'TimestampedPayload',
+    'StateTracker',
+    'RttStats',
+    'WindowedRttStats',
+    'ProbeProfile',
     'IcmpHandle',
     'Icmp6Handle',
+    'HandlePool',
+    'Tracer',
+    'set_tracer',
+    'get_tracer',
     'IpOptionInformation',
     'IcmpEchoReply',
     'Icmp6EchoReply',
 ]
 
 
-INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
-ERROR_IO_PENDING = 997
+class IpOptionInformation(object):
+    __slots__ = ('Ttl', 'Tos', 'Flags', 'OptionsData')
 
+    def __init__(s, r):
+        s.Ttl = r.Ttl
+        s.Tos = r.Tos
+        s.Flags = r.Flags
+        s.OptionsData = ctypes.string_at(r.OptionsData, r.OptionsSize)
 
-class IPAddr(ctypes.Structure):
-    _fields_ = [ ("S_addr", ctypes.c_ulong),
-                 ]
 
-    def __str__(self):
-        return socket.inet_ntoa(struct.pack("L", self.S_addr))
+class IcmpEchoReply(object):
+    """ View of ICMP_ECHO_REPLY structure.
 
+    Status and RoundTripTime are read upfront, Address, Data and Options are
+    decoded on first access. If reply buffer lease is given, Data is
+    memoryview over the reply buffer, which keeps the lease, otherwise it is
+    copied to bytes.
+    Sequence and RoundTripTimeUs are set by TimestampedPayload.stamp(). """
 
-class in6_addr(ctypes.Structure):
-    _fields_ = [ ("Byte", ctypes.c_ubyte * 16),
-                 ]
+    __slots__ = ('Status', 'RoundTripTime', 'Sequence', 'RoundTripTimeUs',
+                 '_r', '_lease', '_address', '_data', '_options')
 
-    def __str__(self):
-        return socket.inet_ntop(socket.AF_INET6, bytes(self.Byte))
+    def __init__(s, r, lease=None):
+        s.Status = r.Status
+        s.RoundTripTime = r.RoundTripTime
+        s.Sequence = None
+        s.RoundTripTimeUs = None
+        s._r = r
+        s._lease = lease
+        s._address = None
+        s._data = None
+        s._options = None
+
+    @property
+    def Address(s):
+        if s._address is None:
+            s._address = str(s._r.Address)
+        return s._address
+
+    @property
+    def Data(s):
+        if s._data is None:
+            r = s._r
+            if s._lease is None:
+                s._data = ctypes.string_at(r.Data, r.DataSize)
+            else:
+                buf = s._lease.buf
+                offset = (r.Data or 0) - ctypes.addressof(buf)
+                if 0 <= offset and offset + r.DataSize <= len(buf):
+                    # view exports array holding the lease, so buffer is
+                    # not reused while view is alive, even without reply
+                    view = (ctypes.c_ubyte * r.DataSize).from_buffer(
+                        buf, offset)
+                    view.lease = s._lease
+                    s._data = memoryview(view).cast('B')
+                else:
+                    s._data = ctypes.string_at(r.Data, r.DataSize)
+        return s._data
+
+    @property
+    def Options(s):
+        if s._options is None:
+            s._options = IpOptionInformation(s._r.Options)
+        return s._options
 
 
-class sockaddr_in6(ctypes.Structure):
-    _fields_ = [
-        ("sin6_family", ctypes.c_short),
-        ("sin6_port", ctypes.c_ushort),
-        ("sin6_flowinfo", ctypes.c_ulong),
-        ("sin6_addr", in6_addr),
-        ("sin6_scope_id", ctypes.c_ulong)
-    ]
+class Icmp6EchoReply(object):
+    """ View of ICMPV6_ECHO_REPLY structure. Address is decoded on first
+    access, lease keeps reply buffer from reuse meanwhile. """
 
+    __slots__ = ('Status', 'RoundTripTime', 'Sequence', 'RoundTripTimeUs',
+                 '_r', '_lease', '_address')
 
-class IPV6_ADDRESS_EX(ctypes.Structure):
-    _fields_ = [
-        ("sin6_port", ctypes.c_ushort),
-        ("sin6_flowinfo", ctypes.c_ulong),
-        ("sin6_addr", in6_addr),
-        ("sin6_scope_id", ctypes.c_ulong)
-    ]
-    _pack_ = 1
+    def __init__(s, r, lease=None):
+        s.Status = r.Status
+        s.RoundTripTime = r.RoundTripTime
+        s.Sequence = None
+        s.RoundTripTimeUs = None
+        s._r = r
+        s._lease = lease
+        s._address = None
 
+    @property
+    def Address(s):
+        if s._address is None:
+            s._address = str(s._r.Address.sin6_addr)
+        return s._address
 
-class ICMPV6_ECHO_REPLY(ctypes.Structure):
-    _fields_ = [
-        ("Address", IPV6_ADDRESS_EX),
-        ("Status", ctypes.c_ulong),
-        ("RoundTripTime", ctypes.c_uint)
-    ]
 
+DEFAULT_TTL = 128
+IP_FLAG_DF = 0x2
 
-class IP_OPTION_INFORMATION(ctypes.Structure):
-    _fields_ = [ ("Ttl", ctypes.c_ubyte),
-                 ("Tos", ctypes.c_ubyte),
-                 ("Flags", ctypes.c_ubyte),
-                 ("OptionsSize", ctypes.c_ubyte),
-                 ("OptionsData", ctypes.c_uint32),
-                 ]
 
+class ProbeProfile(object):
+    """ Reusable echo request options: TTL, TOS byte (DSCP is its upper six
+    bits), don't fragment flag and source address.
 
-class ICMP_ECHO_REPLY(ctypes.Structure):
-    _fields_ = [ ("Address", IPAddr),
-                 ("Status", ctypes.c_ulong),
-                 ("RoundTripTime", ctypes.c_ulong),
-                 ("DataSize", ctypes.c_ushort),
-                 ("Reserved", ctypes.c_ushort),
-                 ("Data", ctypes.c_void_p),
-                 ("Options", IP_OPTION_INFORMATION),
-                 ]
+    Option and address structures are built once, so profile may be passed
+    to ping functions in hot loops instead of separate keyword arguments. """
 
+    __slots__ = ('ttl', 'tos', 'dont_fragment', 'source', 'options',
+                 '_source4', '_source6')
 
-class DUMMYUNION(ctypes.Union):
-    _fields_ = [
-        ("Status", ctypes.c_long),
-        ("Pointer", ctypes.c_void_p),
-    ]
+    def __init__(self, ttl=DEFAULT_TTL, tos=0, dont_fragment=False,
+                 source=None, dscp=None):
+        if dscp is not None:
+            tos = (dscp << 2) | (tos & 0x3)
+        if not (1 <= ttl <= 255):
+            raise ValueError("TTL out of range: %r" % (ttl,))
+        if not (0 <= tos <= 255):
+            raise ValueError("TOS out of range: %r" % (tos,))
+        self.ttl = ttl
+        self.tos = tos
+        self.dont_fragment = dont_fragment
+        self.source = source
+        self.options = IP_OPTION_INFORMATION(
+            ttl, tos, IP_FLAG_DF if dont_fragment else 0, 0, 0)
+        self._source4 = None
+        self._source6 = None
 
+    @property
+    def dscp(self):
+        return self.tos >> 2
 
-class IO_STATUS_BLOCK(ctypes.Structure):
-    _fields_ = [
-        ("DUMMYUNIONNAME", DUMMYUNION),
-        ("Information", ctypes.POINTER(ctypes.c_ulong))
-    ]
+    def source4(self):
+        if self.source is None:
+            return None
+        if self._source4 is None:
+            self._source4 = inet_addr(self.source)
+        return self._source4
 
+    def source6(self, default=None):
+        if self.source is None:
+            return default
+        if self._source6 is None:
+            self._source6 = inet6_addr(self.source)
+        return self._source6
 
-class IpOptionInformation(object):
-    def __init__(s, r):
-        s.Ttl = r.Ttl
-        s.Tos = r.Tos
-        s.Flags = r.Flags
-        s.OptionsData = ctypes.string_at(r.OptionsData, r.OptionsSize)
 
+_DEFAULT_PROFILE = ProbeProfile()
 
-class IcmpEchoReply(object):
-    def __init__(s, r):
-        s.Address = str(r.Address)
-        s.Status = r.Status
-        s.RoundTripTime = r.RoundTripTime
-        s.Data = ctypes.string_at(r.Data, r.DataSize)
-        s.Options = IpOptionInformation(r.Options)
 
+ADDRESS_CACHE_SIZE = 4096
+DEFAULT_DATA_SIZE = 32
 
-class Icmp6EchoReply(object):
-    def __init__(s, r):
-        s.Address = str(r.Address.sin6_addr)
-        s.Status = r.Status
-        s.RoundTripTime = r.RoundTripTime
-    
+_REPLY_SIZE = ctypes.sizeof(ICMP_ECHO_REPLY)
+_REPLY6_SIZE = ctypes.sizeof(ICMPV6_ECHO_REPLY)
+_IOSB_SIZE = ctypes.sizeof(IO_STATUS_BLOCK)
 
-icmp = ctypes.windll.iphlpapi
-kernel = ctypes.windll.kernel32
 
+class IcmpHandle(object):
+    """ ICMP handle of selected backend. Also owns request scratch state
+    reused across calls: reply buffer pool, default payload and converted
+    destination addresses. """
+
+    inet_addr = staticmethod(inet_addr)
+    reply_size = _REPLY_SIZE
+
+    def __init__(self, backend=None):
+        self.backend = get_backend(backend)
+        self.handle = self._create()
+        self.buffers = BufferPool()
+        self.default_data = os.urandom(DEFAULT_DATA_SIZE)
+        self.addresses = {}
+
+    def _create(self):
+        return self.backend.create_handle()
+
+    def close(self):
+        self.backend.close_handle(self.handle)
+        self.buffers.clear()
+
+    def address(self, ip):
+        try:
+            return self.addresses[ip]
+        except KeyError:
+            pass
+        if len(self.addresses) >= ADDRESS_CACHE_SIZE:
+            self.addresses.clear()
+        res = self.addresses[ip] = self.inet_addr(ip)
+        return res
 
-GetLastError = ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
-                                  use_last_error=True)(("GetLastError", kernel))
+    def bufsize(self, data, expected_count):
+        return (self.reply_size + len(data) + 8 + _IOSB_SIZE) * expected_count
 
+    def __enter__(self):
+        return self
 
-def IcmpCreateFile_errcheck(res, func, args):
-    if res == INVALID_HANDLE_VALUE:
-        errno = GetLastError()
-        raise OSError(0, "IcmpCreateFile failed", None, errno)
-    return args
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
 
 
-IcmpCreateFile = ctypes.WINFUNCTYPE(ctypes.wintypes.HANDLE,
-                                    use_last_error=True)(("IcmpCreateFile", icmp))
-IcmpCreateFile.errcheck = IcmpCreateFile_errcheck
+class Icmp6Handle(IcmpHandle):
+    inet_addr = staticmethod(inet6_addr)
+    reply_size = _REPLY6_SIZE
 
-Icmp6CreateFile = ctypes.WINFUNCTYPE(ctypes.wintypes.HANDLE,
-                                     use_last_error=True)(("Icmp6CreateFile", icmp))
-Icmp6CreateFile.errcheck = IcmpCreateFile_errcheck
+    def __init__(self, backend=None):
+        super().__init__(backend)
+        self.source = inet6_addr('::')
+        self.options = IP_OPTION_INFORMATION(DEFAULT_TTL, 0, 0, 0, 0)
 
+    def _create(self):
+        return self.backend.create_handle6()
 
-def IcmpCloseHandle_errcheck(res, func, args):
-    if not res:
-        errno = GetLastError()
-        raise OSError(0, "IcmpCloseHandle failed", None, errno)
-    return args
 
+def _parse(lease, count):
+    replies = (ICMP_ECHO_REPLY * count).from_buffer(lease.buf)
+    return [ IcmpEchoReply(r, lease) for r in replies ]
 
-IcmpCloseHandle = (ctypes.WINFUNCTYPE(ctypes.wintypes.BOOL,
-                                      ctypes.wintypes.HANDLE,
-                                      use_last_error=True)(
-                                          ("IcmpCloseHandle", icmp), (
-                                              (1,"IcmpHandle"),)))
-IcmpCloseHandle.errcheck = IcmpCloseHandle_errcheck
 
+def _parse6(lease, count):
+    replies = (ICMPV6_ECHO_REPLY * count).from_buffer(lease.buf)
+    return [ Icmp6EchoReply(r, lease) for r in replies ]
 
-def IcmpSendEcho_errcheck(res, func, args):
-    if res == 0:
-        errno = GetLastError()
-        if errno in errno_map:
-            raise errno_map[errno](0, "IcmpSendEcho failed", None, errno)
-        else:
-            raise OSError(0, "IcmpSendEcho failed", None, errno)
-    return args
-
-
-IcmpSendEcho = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
-                                   ctypes.wintypes.HANDLE,
-                                   IPAddr,
-                                   ctypes.wintypes.LPVOID,
-                                   ctypes.wintypes.WORD,
-                                   ctypes.POINTER(IP_OPTION_INFORMATION),
-                                   ctypes.wintypes.LPVOID,
-                                   ctypes.wintypes.DWORD,
-                                   ctypes.wintypes.DWORD,
-                                   use_last_error=True)(
-                                       ("IcmpSendEcho", icmp), (
-                                           (1, "IcmpHandle"),
-                                           (1, "DestinationAddress"),
-                                           (1, "RequestData"),
-                                           (1, "RequestSize"),
-                                           (1, "RequestOptions"),
-                                           (1, "ReplyBuffer"),
-                                           (1, "ReplySize"),
-                                           (1, "Timeout"))))
-IcmpSendEcho.errcheck = IcmpSendEcho_errcheck
-
-
-def Icmp6SendEcho2_errcheck(res, func, args):
-    if res == 0:
-        errno = GetLastError()
-        if errno == ERROR_IO_PENDING:
-            pass
-        elif errno in errno_map:
-            raise errno_map[errno](0, "Icmp6SendEcho2 failed", None, errno)
-        else:
-            raise OSError(0, "Icmp6SendEcho2 failed", None, errno)
-    return args
-
-
-Icmp6SendEcho2 = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
-                                     ctypes.wintypes.HANDLE,
-                                     ctypes.wintypes.HANDLE,
-                                     ctypes.wintypes.LPVOID,
-                                     ctypes.wintypes.LPVOID,
-                                     ctypes.POINTER(sockaddr_in6),
-                                     ctypes.POINTER(sockaddr_in6),
-                                     ctypes.wintypes.LPVOID,
-                                     ctypes.wintypes.WORD,
-                                     ctypes.POINTER(IP_OPTION_INFORMATION),
-                                     ctypes.wintypes.LPVOID,
-                                     ctypes.wintypes.DWORD,
-                                     ctypes.wintypes.DWORD,
-                                     use_last_error=True)(
-                                         ("Icmp6SendEcho2", icmp), (
-                                             (1, "IcmpHandle"),
-                                             (1, "Event"),
-                                             (1, "ApcRoutine"),
-                                             (1, "ApcContext"),
-                                             (1, "SourceAddress"),
-                                             (1, "DestinationAddress"),
-                                             (1, "RequestData"),
-                                             (1, "RequestSize"),
-                                             (1, "RequestOptions"),
-                                             (1, "ReplyBuffer"),
-                                             (1, "ReplySize"),
-                                             (1, "Timeout"))))
-Icmp6SendEcho2.errcheck = Icmp6SendEcho2_errcheck
-
-
-def Icmp6ParseReplies_errcheck(res, func, args):
-    if res != 1:
-        errno = GetLastError()
-        raise OSError(0, "Icmp6ParseReplies failed", None, errno)
-    return args
-
-
-Icmp6ParseReplies = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
-                                        ctypes.wintypes.LPVOID,
-                                        ctypes.wintypes.DWORD)(
-                                            ("Icmp6ParseReplies", icmp), (
-                                                (1, "ReplyBuffer"),
-                                                (1, "ReplySize"))))
-Icmp6ParseReplies.errcheck = Icmp6ParseReplies_errcheck
 
+_tracer = None
 
-class IcmpHandle(object):
-    def __init__(self):
-        self.handle = IcmpCreateFile()
 
-    def __enter__(self):
-        return self.handle
+def set_tracer(tracer):
+    """ Installs Tracer for all ping calls, None disables tracing. Returns
+    previously installed tracer. """
+    global _tracer
+    prev, _tracer = _tracer, tracer
+    return prev
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        IcmpCloseHandle(self.handle)
 
+def get_tracer():
+    return _tracer
 
-class Icmp6Handle(object):
-    def __init__(self):
-        self.handle = Icmp6CreateFile()
 
-    def __enter__(self):
-        return self.handle
+def _profile(profile, ttl, tos, dont_fragment, source):
+    if ttl is None and tos is None and dont_fragment is None and source is None:
+        return profile
+    if profile is None:
+        profile = _DEFAULT_PROFILE
+    return ProbeProfile(
+        ttl=profile.ttl if ttl is None else ttl,
+        tos=profile.tos if tos is None else tos,
+        dont_fragment=(profile.dont_fragment if dont_fragment is None
+                       else dont_fragment),
+        source=profile.source if source is None else source)
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        IcmpCloseHandle(self.handle)
+
+def ping(handle, address, *, timeout=1000, data=None, expected_count=10,
+         ttl=None, tos=None, dont_fragment=None, source=None, profile=None):
+    span = None if _tracer is None else _tracer.span(handle)
+    address = handle.address(address)
+    if data is None:
+        data = handle.default_data
+    bufsize = handle.bufsize(data, expected_count)
+    if span is not None:
+        span.mark()
+    lease = handle.buffers.lease(bufsize)
+    if span is not None:
+        span.leased()
+    profile = _profile(profile, ttl, tos, dont_fragment, source)
+
+    try:
+        if profile is None:
+            count = handle.backend.send_echo(handle.handle, address, data,
+                                             None, lease.buf, bufsize,
+                                             timeout)
+        elif profile.source is None:
+            count = handle.backend.send_echo(handle.handle, address, data,
+                                             profile.options, lease.buf,
+                                             bufsize, timeout)
+        else:
+            count = handle.backend.send_echo(handle.handle, address, data,
+                                             profile.options, lease.buf,
+                                             bufsize, timeout,
+                                             source=profile.source4())
+    except OSError as e:
+        if span is not None:
+            span.fail(e)
+        raise
+
+    if span is None:
+        return _parse(lease, count)
+    span.mark()
+    replies = _parse(lease, count)
+    span.finish(replies)
+    return replies
 
 
-def inet_addr(ip):
-    return IPAddr(struct.unpack("L", socket.inet_aton(ip))[0])
+def ping6(handle, address, *, timeout=1000, data=None, expected_count=10,
+          ttl=None, tos=None, dont_fragment=None, source=None, profile=None):
+    span = None if _tracer is None else _tracer.span(handle)
+    address = handle.address(address)
+    if data is None:
+        data = handle.default_data
+    bufsize = handle.bufsize(data, expected_count)
+    if span is not None:
+        span.mark()
+    lease = handle.buffers.lease(bufsize)
+    if span is not None:
+        span.leased()
+    profile = _profile(profile, ttl, tos, dont_fragment, source)
+    if profile is None:
+        source, options = handle.source, handle.options
+    else:
+        source, options = profile.source6(handle.source), profile.options
+
+    try:
+        count = handle.backend.send_echo6(handle.handle, source,
+                                          address, data, options,
+                                          lease.buf, bufsize, timeout)
+    except OSError as e:
+        if span is not None:
+            span.fail(e)
+        raise
+
+    if span is None:
+        return _parse6(lease, count)
+    span.mark()
+    replies = _parse6(lease, count)
+    span.finish(replies)
+    return replies
 
 
-def inet6_addr(ip):
-    return sockaddr_in6(socket.AF_INET6.value,
-                        0,
-                        0,
-                        in6_addr.from_buffer_copy(socket.inet_pton(socket.AF_INET6, ip)),
-                        0)
+def _get_event_loop():
+    # asyncio is already loaded by whoever runs the loop, so it is not
+    # imported along with the package
+    import asyncio
+    return asyncio.get_event_loop()
 
 
-def ping(handle, address, *, timeout=1000, data=None, expected_count=10):
-    address = inet_addr(address)
+async def _send_async(handle, address, timeout, data, expected_count,
+                      options=None, source=None, span=None):
+    address = handle.address(address)
+    if data is None:
+        data = handle.default_data
+    bufsize = handle.bufsize(data, expected_count)
+    if span is not None:
+        span.mark()
+    buf = handle.buffers.acquire(bufsize)
+    if span is not None:
+        span.leased()
+
+    try:
+        if source is None:
+            count = await handle.backend.send_echo_async(
+                handle.handle, address, data, options, buf, bufsize, timeout,
+                _get_event_loop())
+        else:
+            count = await handle.backend.send_echo_async(
+                handle.handle, address, data, options, buf, bufsize, timeout,
+                _get_event_loop(), source=source)
+    except OSError:
+        handle.buffers.release(buf)
+        raise
+    # buffer of cancelled request is not recycled: OS may still write into it
+    return BufferLease(handle.buffers, buf), count
+
+
+async def _send6_async(handle, address, timeout, data, expected_count,
+                       options=None, source=None, span=None):
+    address = handle.address(address)
     if data is None:
-        data = os.urandom(32)
-    bufsize = (ctypes.sizeof(ICMP_ECHO_REPLY) +
-               len(data) + 8) * expected_count
-    buf = ctypes.create_string_buffer(bufsize)
-    
-    count = IcmpSendEcho(IcmpHandle=handle,
-                         DestinationAddress=address,
-                         RequestData=data,
-                         RequestSize=len(data),
-                         RequestOptions=None,
-                         ReplyBuffer=buf,
-                         ReplySize=bufsize,
-                         Timeout=timeout)
-    
-    replies = ctypes.cast(buf, ctypes.POINTER(ICMP_ECHO_REPLY * count)).contents
-    replies = [ IcmpEchoReply(r) for r in replies ]
-    
+        data = handle.default_data
+    if options is None:
+        options = handle.options
+    if source is None:
+        source = handle.source
+    bufsize = handle.bufsize(data, expected_count)
+    if span is not None:
+        span.mark()
+    buf = handle.buffers.acquire(bufsize)
+    if span is not None:
+        span.leased()
+
+    try:
+        count = await handle.backend.send_echo6_async(
+            handle.handle, source, address, data, options,
+            buf, bufsize, timeout, _get_event_loop())
+    except OSError:
+        handle.buffers.release(buf)
+        raise
+    return BufferLease(handle.buffers, buf), count
+
+
+async def async_ping(handle, address, *, timeout=1000, data=None,
+                     expected_count=10, ttl=None, tos=None,
+                     dont_fragment=None, source=None, profile=None):
+    span = None if _tracer is None else _tracer.span(handle)
+    profile = _profile(profile, ttl, tos, dont_fragment, source)
+    try:
+        if profile is None:
+            lease, count = await _send_async(handle, address, timeout, data,
+                                             expected_count, span=span)
+        else:
+            lease, count = await _send_async(handle, address, timeout, data,
+                                             expected_count, profile.options,
+                                             profile.source4(), span)
+    except OSError as e:
+        if span is not None:
+            span.fail(e)
+        raise
+    if span is None:
+        return _parse(lease, count)
+    span.mark()
+    replies = _parse(lease, count)
+    span.finish(replies)
     return replies
 
 
-def ping6(handle, address, *, timeout=1000, data=None, expected_count=10):
-    address = inet6_addr(address)
-    source = inet6_addr('::')
-    options = IP_OPTION_INFORMATION(128, 0, 0, 0, 0)
-    if data is None:
-        data = os.urandom(32)
-    bufsize = (ctypes.sizeof(ICMPV6_ECHO_REPLY) + len(data) + 8 +
-               ctypes.sizeof(IO_STATUS_BLOCK)) * expected_count
-    buf = ctypes.create_string_buffer(bufsize)
-    
-    count = Icmp6SendEcho2(IcmpHandle=handle,
-                           Event=None,
-                           ApcRoutine=None,
-                           ApcContext=None,
-                           SourceAddress=source,
-                           DestinationAddress=ctypes.byref(address),
-                           RequestData=data,
-                           RequestSize=len(data),
-                           RequestOptions=ctypes.byref(options),
-                           ReplyBuffer=buf,
-                           ReplySize=bufsize,
-                           Timeout=timeout)
-    Icmp6ParseReplies(ReplyBuffer=buf, ReplySize=bufsize)
-
-    replies = ctypes.cast(buf, ctypes.POINTER(ICMPV6_ECHO_REPLY * count)).contents
-    replies = [ Icmp6EchoReply(r) for r in replies ]
-    
+async def async_ping6(handle, address, *, timeout=1000, data=None,
+                      expected_count=10, ttl=None, tos=None,
+                      dont_fragment=None, source=None, profile=None):
+    span = None if _tracer is None else _tracer.span(handle)
+    profile = _profile(profile, ttl, tos, dont_fragment, source)
+    try:
+        if profile is None:
+            lease, count = await _send6_async(handle, address, timeout, data,
+                                              expected_count, span=span)
+        else:
+            lease, count = await _send6_async(handle, address, timeout, data,
+                                              expected_count, profile.options,
+                                              profile.source6(handle.source),
+                                              span)
+    except OSError as e:
+        if span is not None:
+            span.fail(e)
+        raise
+    if span is None:
+        return _parse6(lease, count)
+    span.mark()
+    replies = _parse6(lease, count)
+    span.finish(replies)
     return replies
+
+
+# names provided by submodules, which are imported on first access
+_lazy = {
+    'AdaptiveTimeouts': 'adaptive',
+    'ping_many': 'batch',
+    'sweep': 'batch',
+    'ResultColumns': 'columns',
+    'StateTracker': 'monitor',
+    'TimestampedPayload': 'payload',
+    'HandlePool': 'pool',
+    'Resolver': 'resolver',
+    'sharded_sweep': 'shard',
+    'RttStats': 'stats',
+    'WindowedRttStats': 'stats',
+    'Tracer': 'tracing',
+    'traceroute': 'traceroute',
+    'async_traceroute': 'traceroute',
+    'path_mtu': 'traceroute',
+    'async_path_mtu': 'traceroute',
+}
+
+
+def __getattr__(name):
+    try:
+        module = _lazy[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name)) from None
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ (PEP 562) is not supported
+    for _name in _lazy:
+        __getattr__(_name)
@@ -3,39 +3,218 @@ import time
 import argparse
 import socket
 import os
+import collections
 
-from . import *
+from . import (ping, ping6, IcmpHandle, Icmp6Handle, ProbeProfile,
+               set_tracer, DEFAULT_TTL)
 from .errors import *
+from .errors import errno_map, get_status
+# modules implementing modes are imported by functions running those modes
+from .defaults import (DEFAULT_CONCURRENCY, DEFAULT_STATE_WINDOW,
+                       DEFAULT_MAX_LOSS, DEFAULT_MAX_HOPS, DEFAULT_LISTEN,
+                       DEFAULT_PORT, OUTPUT_FORMATS)
 
+DEFAULT_INTERVAL = 1.
 
-def parse_args():
-    def check_positive_int(value):
-        value = int(value)
-        if value <= 0:
-             raise argparse.ArgumentTypeError(
-                 "%s is an invalid positive number value" % value)
-        return value
-
-    def check_nonnegative_int(value):
-        value = int(value)
-        if value < 0:
-             raise argparse.ArgumentTypeError(
-                 "%s is an invalid non-negative number value" % value)
-        return value
-
-    def check_size(value):
-        value = int(value)
-        if not (0 <= value <= 65500):
-             raise argparse.ArgumentTypeError(
-                 "Bad data size, valid range is from 0 to 65500)")
-        return value
 
+def check_positive_int(value):
+    value = int(value)
+    if value <= 0:
+         raise argparse.ArgumentTypeError(
+             "%s is an invalid positive number value" % value)
+    return value
+
+
+def check_nonnegative_int(value):
+    value = int(value)
+    if value < 0:
+         raise argparse.ArgumentTypeError(
+             "%s is an invalid non-negative number value" % value)
+    return value
+
+
+def check_positive_float(value):
+    value = float(value)
+    if not value > 0:
+         raise argparse.ArgumentTypeError(
+             "%s is an invalid positive number value" % value)
+    return value
+
+
+def check_ttl(value):
+    value = int(value)
+    if not (1 <= value <= 255):
+         raise argparse.ArgumentTypeError(
+             "Bad TTL value, valid range is from 1 to 255")
+    return value
+
+
+def check_tos(value):
+    value = int(value, 0)
+    if not (0 <= value <= 255):
+         raise argparse.ArgumentTypeError(
+             "Bad TOS value, valid range is from 0 to 255")
+    return value
+
+
+def check_size(value):
+    value = int(value)
+    if not (0 <= value <= 65500):
+         raise argparse.ArgumentTypeError(
+             "Bad data size, valid range is from 0 to 65500)")
+    return value
+
+
+def add_profile_args(parser):
+    parser.add_argument("--ttl",
+                        help="time to live of echo requests",
+                        type=check_ttl,
+                        default=None)
+    parser.add_argument("--tos",
+                        help="type of service byte of echo requests, e.g. "
+                        "DSCP value shifted left by two",
+                        type=check_tos,
+                        default=None)
+    parser.add_argument("--df",
+                        help="set don't fragment flag in echo requests",
+                        dest="dont_fragment",
+                        action="store_true")
+    parser.add_argument("-S",
+                        help="source address to use",
+                        metavar="SRCADDR",
+                        dest="source",
+                        default=None)
+
+
+def add_proto_args(parser):
+    proto_group = parser.add_mutually_exclusive_group()
+    proto_group.add_argument("-4",
+                             help="force using IPv4",
+                             dest="force_ipv4",
+                             action="store_true")
+    proto_group.add_argument("-6",
+                             help="force using IPv6",
+                             dest="force_ipv6",
+                             action="store_true")
+
+
+def parse_serve_args(argv):
     parser = argparse.ArgumentParser(
-        description="Ping implementation which utilizes Windows ICMP API",
+        prog="winping serve",
+        description="Probe destinations continuously and expose results "
+        "as Prometheus metrics over HTTP",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("address",
                         help="specifies the host name or IP address of the "
-                        "destination")
+                        "destination",
+                        nargs="*")
+    parser.add_argument("-f",
+                        help="read list of destinations from file, one per "
+                        "line ('-' for standard input)",
+                        metavar="FILE",
+                        dest="file")
+    parser.add_argument("--listen",
+                        help="address to serve metrics on",
+                        default=DEFAULT_LISTEN)
+    parser.add_argument("--port",
+                        help="port to serve metrics on",
+                        type=check_nonnegative_int,
+                        default=DEFAULT_PORT)
+    parser.add_argument("-i",
+                        help="interval in seconds between echo requests to "
+                        "the same destination",
+                        type=check_positive_float,
+                        dest="interval",
+                        default=1.)
+    parser.add_argument("-w",
+                        help="timeout in milliseconds to wait for each reply",
+                        type=check_positive_int,
+                        dest="timeout",
+                        default=1000)
+    parser.add_argument("-l",
+                        help="number of data bytes to be sent",
+                        type=check_size,
+                        dest="size",
+                        default=32)
+    parser.add_argument("--max-inflight",
+                        help="maximal number of outstanding echo requests",
+                        type=check_positive_int,
+                        metavar="COUNT",
+                        dest="max_inflight",
+                        default=DEFAULT_CONCURRENCY)
+    add_profile_args(parser)
+    add_proto_args(parser)
+    args = parser.parse_args(argv)
+    if not args.address and args.file is None:
+        parser.error("at least one destination is required")
+    return args
+
+
+def parse_load_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="winping load",
+        description="Send echo requests at given rate and report achieved "
+        "throughput and round trip times every second",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("address",
+                        help="specifies the host name or IP address of the "
+                        "destination. Several destinations are loaded in "
+                        "round robin",
+                        nargs="+")
+    parser.add_argument("-r",
+                        help="echo requests per second",
+                        type=check_positive_float,
+                        dest="rate",
+                        default=1000.)
+    parser.add_argument("-d",
+                        help="duration of test in seconds (until stopped "
+                        "if not given)",
+                        type=check_positive_float,
+                        dest="duration",
+                        default=None)
+    parser.add_argument("-l",
+                        help="number of data bytes to be sent",
+                        type=check_size,
+                        dest="size",
+                        default=32)
+    parser.add_argument("-w",
+                        help="timeout in milliseconds to wait for each reply",
+                        type=check_positive_int,
+                        dest="timeout",
+                        default=1000)
+    parser.add_argument("--burst",
+                        help="maximal number of echo requests sent at once "
+                        "(1/100 of rate by default)",
+                        type=check_positive_int,
+                        metavar="COUNT",
+                        default=None)
+    parser.add_argument("--max-inflight",
+                        help="maximal number of outstanding echo requests",
+                        type=check_positive_int,
+                        metavar="COUNT",
+                        dest="max_inflight",
+                        default=DEFAULT_CONCURRENCY)
+    add_profile_args(parser)
+    add_proto_args(parser)
+    return parser.parse_args(argv)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Ping implementation which utilizes Windows ICMP API. "
+        "Run 'winping serve --help' for metrics exporter mode and "
+        "'winping load --help' for load generation mode",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("address",
+                        help="specifies the host name or IP address of the "
+                        "destination. If more than one destination is "
+                        "given, they are probed concurrently",
+                        nargs="*")
+    parser.add_argument("-f",
+                        help="read list of destinations from file, one per "
+                        "line ('-' for standard input)",
+                        metavar="FILE",
+                        dest="file")
     parser.add_argument("-w",
                         help="timeout in milliseconds to wait for each reply",
                         type=check_positive_int,
@@ -58,101 +237,853 @@ def parse_args():
                              dest="count",
                              default=4)
 
-    proto_group = parser.add_mutually_exclusive_group()
-    proto_group.add_argument("-4",
-                             help="force using IPv4",
-                             dest="force_ipv4",
+    interval_group = parser.add_mutually_exclusive_group()
+    # absent -i is told apart from default value, as it is rejected for
+    # multiple destinations
+    interval_group.add_argument("-i",
+                                help="interval in seconds between echo "
+                                "requests to single destination, fractional "
+                                "values are allowed (default: %s)" %
+                                (DEFAULT_INTERVAL,),
+                                type=check_positive_float,
+                                dest="interval",
+                                default=argparse.SUPPRESS)
+    interval_group.add_argument("-A",
+                                help="adaptive mode for single destination: "
+                                "send next echo request as soon as previous "
+                                "reply arrives",
+                                dest="adaptive",
+                                action="store_true")
+
+    add_profile_args(parser)
+    add_proto_args(parser)
+    multi_group = parser.add_argument_group("multiple destinations")
+    multi_group.add_argument("-p",
+                             help="interval in milliseconds between echo "
+                             "requests to the same destination",
+                             type=check_positive_int,
+                             dest="period",
+                             default=1000)
+    multi_group.add_argument("--max-inflight",
+                             help="maximal number of outstanding echo "
+                             "requests",
+                             type=check_positive_int,
+                             metavar="COUNT",
+                             dest="max_inflight",
+                             default=DEFAULT_CONCURRENCY)
+    multi_group.add_argument("-q",
+                             help="don't show per-reply results, only final "
+                             "summary",
+                             dest="quiet",
                              action="store_true")
-    proto_group.add_argument("-6",
-                             help="force using IPv6",
-                             dest="force_ipv6",
+    multi_group.add_argument("--backoff",
+                             help="adapt timeouts to observed round trip "
+                             "times (-w is the upper bound) and probe "
+                             "unresponsive destinations less often",
                              action="store_true")
-    
+    multi_group.add_argument("-j",
+                             help="split destinations between given number "
+                             "of worker processes. Only final summary is "
+                             "shown",
+                             type=check_positive_int,
+                             metavar="PROCESSES",
+                             dest="processes",
+                             default=None)
+    monitor_group = parser.add_argument_group("monitoring")
+    monitor_group.add_argument("--monitor",
+                               help="instead of per-reply results print "
+                               "only changes of destination state (up, "
+                               "degraded or down) and periodic summaries",
+                               action="store_true")
+    monitor_group.add_argument("--state-window",
+                               help="length of window in seconds which "
+                               "state is computed over",
+                               type=check_positive_float,
+                               metavar="SECONDS",
+                               dest="state_window",
+                               default=DEFAULT_STATE_WINDOW)
+    monitor_group.add_argument("--max-loss",
+                               help="loss percentage above which "
+                               "destination is degraded",
+                               type=check_positive_float,
+                               metavar="PERCENT",
+                               dest="max_loss",
+                               default=DEFAULT_MAX_LOSS)
+    monitor_group.add_argument("--max-rtt",
+                               help="average round trip time in milliseconds "
+                               "above which destination is degraded",
+                               type=check_positive_float,
+                               metavar="MS",
+                               dest="max_rtt",
+                               default=None)
+    monitor_group.add_argument("--summary",
+                               help="interval in seconds between summaries "
+                               "of destination states",
+                               type=check_positive_int,
+                               metavar="SECONDS",
+                               default=60)
+    route_group = parser.add_argument_group("path discovery")
+    mode_group = route_group.add_mutually_exclusive_group()
+    mode_group.add_argument("--traceroute",
+                            help="trace route to destination",
+                            action="store_true")
+    mode_group.add_argument("--pmtu",
+                            help="discover path MTU to destination",
+                            action="store_true")
+    route_group.add_argument("--max-hops",
+                             help="maximum number of hops to search for "
+                             "destination",
+                             type=check_positive_int,
+                             metavar="HOPS",
+                             dest="max_hops",
+                             default=DEFAULT_MAX_HOPS)
+    parser.add_argument("--format",
+                        help="print results as machine readable records "
+                        "instead of text. Statistics go to standard error",
+                        choices=("text",) + OUTPUT_FORMATS,
+                        default="text")
+    parser.add_argument("--reresolve",
+                        help="resolve destination names again every given "
+                        "number of seconds",
+                        type=check_positive_int,
+                        metavar="SECONDS",
+                        default=None)
+    parser.add_argument("--window",
+                        help="periodically print statistics over sliding "
+                        "window of given length in seconds",
+                        type=check_positive_int,
+                        metavar="SECONDS",
+                        default=None)
+    parser.add_argument("--record",
+                        help="append results to time-series store in given "
+                        "directory",
+                        metavar="PATH",
+                        default=None)
+    parser.add_argument("--record-segments",
+                        help="keep at most given number of latest store "
+                        "segments of about 20MB each, removing older ones. "
+                        "All segments are kept by default",
+                        type=check_positive_int,
+                        metavar="N",
+                        dest="record_segments",
+                        default=None)
+    parser.add_argument("--profile",
+                        help="time phases of echo requests and print "
+                        "profile to standard error on exit",
+                        action="store_true")
+    parser.add_argument("--precise",
+                        help="carry send timestamp in echo request data to "
+                        "measure round trip time in microseconds and "
+                        "detect duplicate and reordered replies",
+                        action="store_true")
+
     args = parser.parse_args()
+    if not args.address and args.file is None:
+        parser.error("at least one destination is required")
+    if ((args.traceroute or args.pmtu) and
+            (len(args.address) != 1 or args.file is not None)):
+        parser.error("path discovery requires single destination")
+    if args.monitor:
+        if (args.traceroute or args.pmtu or args.processes is not None or
+                args.window):
+            parser.error("monitoring can't be combined with path discovery, "
+                         "worker processes or --window")
+        if args.format not in ("text", "jsonl"):
+            parser.error("monitoring supports only text and jsonl formats")
+    if ((args.monitor or len(args.address) != 1 or args.file is not None) and
+            (hasattr(args, "interval") or args.adaptive)):
+        parser.error("-i and -A apply to single destination, use -p to set "
+                     "interval for multiple destinations")
+    args.interval = getattr(args, "interval", DEFAULT_INTERVAL)
+    if args.record_segments is not None and args.record is None:
+        parser.error("--record-segments requires --record")
+    if args.precise:
+        from .payload import PAYLOAD_HEADER
+        if args.size < PAYLOAD_HEADER.size:
+            parser.error("precise timing requires at least %d bytes of data"
+                         % (PAYLOAD_HEADER.size,))
+    if args.processes is not None:
+        if args.infinite:
+            parser.error("worker processes require finite count of echo "
+                         "requests")
+        if (args.format != "text" or args.reresolve or args.record or
+                args.precise or args.window):
+            parser.error("worker processes support only text summary")
     return args
 
 
+def print_rtt_distribution(stats, file=None):
+    pct = stats.percentiles((50, 90, 99))
+    print("    Median = %.1fms, 90%% = %.1fms, 99%% = %.1fms, "
+          "Jitter = %.1fms, Std dev = %.1fms" %
+          (pct[50], pct[90], pct[99], stats.jitter, stats.stddev), file=file)
+
+
+def print_window_stats(stats, window, file=None):
+    print("Last %ds: Sent = %d, Received = %d, Lost = %d (%.2f%% loss)" %
+          (window, stats.sent, stats.received, stats.lost, stats.loss),
+          file=file)
+    if stats.received:
+        print_rtt_distribution(stats, file)
+
+
+def make_writer(args):
+    if args.format == "text":
+        return None
+    from .output import writers
+    sys.stdout.flush()
+    stream = sys.stdout.buffer
+    if stream.isatty():
+        return writers[args.format](stream, batch_size=1)
+    return writers[args.format](stream)
+
+
+def make_resolver(args):
+    from .resolver import Resolver
+    if args.force_ipv4:
+        family = socket.AF_INET
+    elif args.force_ipv6:
+        family = socket.AF_INET6
+    else:
+        family = socket.AF_UNSPEC
+    return Resolver(family=family)
+
+
+def make_timeouts(args):
+    if not args.backoff:
+        return None
+    from .adaptive import AdaptiveTimeouts
+    return AdaptiveTimeouts(max_timeout=args.timeout,
+                            backoff=args.period / 1000)
+
+
+def make_profile(args):
+    if (args.ttl is None and args.tos is None and not args.dont_fragment and
+            args.source is None):
+        return None
+    return ProbeProfile(ttl=DEFAULT_TTL if args.ttl is None else args.ttl,
+                        tos=args.tos or 0,
+                        dont_fragment=args.dont_fragment,
+                        source=args.source)
+
+
+def read_targets(args):
+    targets = list(args.address)
+    if args.file is not None:
+        f = sys.stdin if args.file == '-' else open(args.file)
+        with f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    targets.append(line)
+    return targets
+
+
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        serve(parse_serve_args(sys.argv[2:]))
+        return
+    if sys.argv[1:2] == ["load"]:
+        load(parse_load_args(sys.argv[2:]))
+        return
     args = parse_args()
-    ai_list = socket.getaddrinfo(args.address, 0)
-    if (args.force_ipv4 or args.force_ipv6):
-        target_af = socket.AF_INET if args.force_ipv4 else socket.AF_INET6
-        ai_list = [ai for ai in ai_list if ai[0] == target_af]
-    if not ai_list:
+    targets = read_targets(args)
+    tracer = None
+    if args.profile:
+        from .tracing import Tracer
+        tracer = Tracer()
+        set_tracer(tracer)
+    try:
+        if args.traceroute or args.pmtu:
+            discover_path(args, targets[0])
+            return
+        # monitoring emits state changes in place of result records
+        writer = None if args.monitor else make_writer(args)
+        store = None
+        if args.record is not None:
+            from .store import TimeSeriesWriter
+            store = TimeSeriesWriter(args.record,
+                                     max_segments=args.record_segments)
+        try:
+            if args.monitor:
+                monitor(args, targets, store)
+            elif len(targets) == 1 and args.file is None:
+                ping_single(args, targets[0], writer, store)
+            else:
+                ping_multi(args, targets, writer, store)
+        finally:
+            if writer is not None:
+                writer.close()
+            if store is not None:
+                store.close()
+    finally:
+        if tracer is not None:
+            set_tracer(None)
+            print("\nRequest profile:", file=sys.stderr)
+            print(tracer.format(), file=sys.stderr)
+
+
+def ping_single(args, address, writer=None, store=None):
+    from .payload import TimestampedPayload, DUPLICATE
+    from .scheduler import IntervalScheduler
+    from .stats import RttStats, WindowedRttStats
+    resolver = make_resolver(args)
+    try:
+        ip, af = resolver.resolve_blocking(address)
+    except OSError:
         print("Ping request could not find host %s. "
-              "Please check the name and try again." % (args.address),
+              "Please check the name and try again." % (address),
               file=sys.stderr)
         sys.exit(3)
-    ip = ai_list[0][4][0]
-    af = ai_list[0][0]
+    addresses = {address: ip}
     ping_fun, Handle = ((ping, IcmpHandle) if af == socket.AF_INET
                         else (ping6, Icmp6Handle))
     data = os.urandom(args.size)
-    count = args.count
-    
+    payload = TimestampedPayload(args.size) if args.precise else None
+    profile = make_profile(args)
+    # human readable text goes out of the way of records
+    out = sys.stdout if writer is None else sys.stderr
+
     print("\nPinging %s [%s] with %d bytes of data:" %
-              (args.address, ip, len(data)))
-
-    requests = 0
-    responses = 0
-    lost = 0
-    min_rtt = float("+inf")
-    max_rtt = float("-inf")
-    sum_rtt = 0
-    
-    try:
-        with Handle() as handle:
-            while True:
-                count -= 1
-                try:
-                    res = ping_fun(handle, ip, timeout=args.timeout, data=data)
-                except RequestTimedOut:
-                    requests += 1
-                    lost += 1
-                except OSError as e:
-                    print("Error: ", (e,), file=sys.stderr)
+              (address, ip, len(data)), file=out)
+
+    if args.window:
+        window = WindowedRttStats(args.window)
+        results = window.total
+    else:
+        window = results = RttStats()
+
+    def refresh():
+        # address family is pinned to the one of handle, last known
+        # address is kept if name fails to resolve
+        resolver.invalidate()
+        try:
+            new_ip = resolver.resolve_blocking(address, af)[0]
+        except OSError:
+            return
+        if new_ip != addresses[address]:
+            print("Address of %s changed from %s to %s" %
+                  (address, addresses[address], new_ip), file=out)
+            addresses[address] = new_ip
+
+    def probe(handle, seq):
+        nonlocal window_deadline
+        ip = addresses[address]
+        request = data if payload is None else payload.next()
+        try:
+            res = ping_fun(handle, ip, timeout=args.timeout,
+                           data=request, profile=profile)
+        except RequestTimedOut as e:
+            window.add_result(e)
+            if store is not None:
+                store.write_result(address, e)
+            if writer is not None:
+                writer.write_result(address, ip, seq, e)
+        except OSError as e:
+            print("Error: ", (e,), file=sys.stderr)
+        else:
+            if payload is None:
+                flags = [None] * len(res)
+            else:
+                flags = payload.stamp(res)
+            window.add_result(res)
+            if store is not None:
+                store.write_result(address, res)
+            if writer is not None:
+                writer.write_result(address, ip, seq, res)
+                return
+            for rep, flag in zip(res, flags):
+                if rep.Status == 0:
+                    if rep.RoundTripTimeUs is None:
+                        rtt = "%dms" % (rep.RoundTripTime,)
+                    else:
+                        rtt = "%.3fms" % (rep.RoundTripTimeUs / 1000,)
+                    if flag is not None:
+                        rtt += " (DUP!)" if flag == DUPLICATE else \
+                            " (reordered)"
+                    if af == socket.AF_INET:
+                        print("Reply from %s: bytes=%d time=%s TTL=%d" %
+                            (rep.Address,
+                             len(rep.Data),
+                             rtt,
+                             rep.Options.Ttl))
+                        # duplicates carry data of earlier request
+                        if rep.Data != request and flag != DUPLICATE:
+                            print("Corrupted packet!", file=sys.stderr)
+                    else:
+                        print("Reply from %s: time=%s" %
+                              (rep.Address, rtt))
                 else:
-                    requests += 1
-                    for rep in res:
-                        if rep.Status == 0:
-                            rtt = rep.RoundTripTime
-                            max_rtt = max(max_rtt, rtt)
-                            min_rtt = min(min_rtt, rtt)
-                            sum_rtt += rtt
-                            if af == socket.AF_INET:
-                                print("Reply from %s: bytes=%d time=%dms TTL=%d" %
-                                    (rep.Address,
-                                     len(rep.Data),
-                                     rtt,
-                                     rep.Options.Ttl))
-                                if rep.Data != data:
-                                    print("Corrupted packet!", file=sys.stderr)
-                            else:
-                                print("Reply from %s: time=%dms" %
-                                      (rep.Address, rtt))
-                            responses += 1
-                        else:
-                            lost += 1
-                finally:
-                    if not args.infinite and count <= 0:
-                        break
-                time.sleep(1)
+                    print("Reply from %s: %s." %
+                          (rep.Address,
+                           errno_map.get(rep.Status, OSError).__name__))
+        finally:
+            if args.window and time.monotonic() >= window_deadline:
+                window_deadline += args.window
+                print_window_stats(window.current(), args.window, out)
+
+    window_deadline = time.monotonic() + (args.window or 0)
+    refresh_deadline = time.monotonic() + (args.reresolve or 0)
+    # requests are sent on fixed cadence. Request whose reply came late is
+    # sent right away without shifting the following ones, adaptive mode
+    # sends next request as soon as previous reply arrives instead
+    scheduler = IntervalScheduler(args.interval)
+    scheduler.tick()
+    sent = 0
+    with Handle() as handle:
+        try:
+            while True:
+                if args.reresolve and time.monotonic() >= refresh_deadline:
+                    refresh_deadline += args.reresolve
+                    refresh()
+                probe(handle, sent)
+                sent += 1
+                if not args.infinite and sent >= args.count:
+                    break
+                if not args.adaptive:
+                    scheduler.sleep()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            resolver.close()
+
+    stats = results
+    if stats.sent:
+        print("\nPing statistics for %s:" % (ip,), file=out)
+        print("    Packets: Sent = %d, Received = %d, Lost = %d (%.2f%% loss)," % (
+            stats.sent,
+            stats.received,
+            stats.lost,
+            stats.loss), file=out)
+    if stats.received:
+        print("Approximate round trip times in milli-seconds:", file=out)
+        if payload is None:
+            print("    Minimum = %dms, Maximum = %dms, Average = %sms" %
+                  (stats.min,
+                   stats.max,
+                   int(round(stats.mean))), file=out)
+        else:
+            print("    Minimum = %.3fms, Maximum = %.3fms, Average = %.3fms" %
+                  (stats.min,
+                   stats.max,
+                   stats.mean), file=out)
+        if payload is not None and (payload.duplicates or payload.reordered):
+            print("    Duplicates = %d, Reordered = %d" %
+                  (payload.duplicates, payload.reordered), file=out)
+        print_rtt_distribution(stats, out)
+
+
+def format_hop(hop):
+    from .traceroute import IP_TTL_EXPIRED_TRANSIT
+    cols = []
+    address = None
+    message = None
+    for res in hop.results:
+        if isinstance(res, OSError):
+            cols.append("%5s   " % ("*",))
+            continue
+        rtt = res.RoundTripTime
+        cols.append("%5s ms" % ("<1" if rtt < 1 else rtt,))
+        address = address or res.Address
+        if res.Status not in (0, IP_TTL_EXPIRED_TRANSIT):
+            message = errno_map.get(res.Status, OSError).__name__
+    if address is None:
+        tail = "Request timed out."
+    elif message is not None:
+        tail = "%s reports: %s." % (address, message)
+    else:
+        tail = address
+    return "%3d  %s  %s" % (hop.ttl, "  ".join(cols), tail)
+
+
+def discover_path(args, address):
+    import asyncio
+    from .traceroute import async_traceroute, async_path_mtu, DEFAULT_MAX_MTU
+    loop = asyncio.new_event_loop()
+    resolver = make_resolver(args)
+    try:
+        ip, af = loop.run_until_complete(resolver.resolve(address))
+    except OSError:
+        print("Unable to resolve target system name %s." % (address,),
+              file=sys.stderr)
+        sys.exit(3)
+    finally:
+        resolver.close()
+    Handle = IcmpHandle if af == socket.AF_INET else Icmp6Handle
+    with Handle() as handle:
+        try:
+            if args.traceroute:
+                print("\nTracing route to %s [%s]" % (address, ip))
+                print("over a maximum of %d hops:\n" % (args.max_hops,))
+                hops = loop.run_until_complete(async_traceroute(
+                    handle, ip, max_hops=args.max_hops,
+                    timeout=args.timeout))
+                for hop in hops:
+                    print(format_hop(hop))
+                print("\nTrace complete.")
+            else:
+                mtu = loop.run_until_complete(async_path_mtu(
+                    handle, ip, high=DEFAULT_MAX_MTU, timeout=args.timeout))
+                # search doesn't go above upper bound
+                print("Path MTU to %s [%s] is %s%d bytes." %
+                      (address, ip,
+                       "at least " if mtu >= DEFAULT_MAX_MTU else "", mtu))
+        except OSError as e:
+            print("Error: ", (e,), file=sys.stderr)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.close()
+
+
+def ping_multi(args, targets, writer=None, store=None, tracker=None):
+    import asyncio
+    from .batch import BatchPinger
+    from .payload import TimestampedPayload, reply_rtt
+    from .scheduler import IntervalScheduler
+    from .stats import TargetStats, WindowedRttStats
+    loop = asyncio.new_event_loop()
+    resolver = make_resolver(args)
+    # names are resolved concurrently, unlike one by one in order
+    results = loop.run_until_complete(resolver.resolve_many(targets))
+    stats = TargetStats()
+    windows = None
+    if args.window:
+        windows = TargetStats(lambda: WindowedRttStats(args.window))
+    addresses = {}
+    probes = []
+    for name in targets:
+        res = results[name]
+        if isinstance(res, OSError):
+            print("%s: name or address could not be resolved" % (name,),
+                  file=sys.stderr)
+            continue
+        stats[name]
+        if windows is not None:
+            windows[name]
+        addresses[name] = res[0]
+        probes.append(name)
+    if args.processes is not None:
+        resolver.close()
+        loop.close()
+        ping_sharded(args, probes, addresses)
+        return
+
+    async def reresolve():
+        # periodically refreshes mapping of names to addresses, last known
+        # address is kept if name fails to resolve
+        while True:
+            await asyncio.sleep(args.reresolve)
+            resolver.invalidate()
+            results = await resolver.resolve_many(addresses)
+            for name, res in results.items():
+                if isinstance(res, OSError):
+                    continue
+                if res[0] != addresses[name]:
+                    print("Address of %s changed from %s to %s" %
+                          (name, addresses[name], res[0]), file=out)
+                    addresses[name] = res[0]
+
+    async def probe_target(pinger, inflight, name):
+        scheduler = IntervalScheduler(args.period / 1000)
+        scheduler.tick()
+        seq = 0
+        while args.infinite or seq < args.count:
+            ip = addresses[name]
+            if (pinger.timeouts is not None and
+                    not pinger.timeouts.should_probe(ip)):
+                seq += 1
+                if args.infinite or seq < args.count:
+                    await scheduler.wait()
+                continue
+            async with inflight:
+                _, res = await pinger.ping(ip)
+            if isinstance(res, OSError) and get_status(res) is None:
+                print("%s : error: %s" % (name, res), file=sys.stderr)
+            else:
+                target_stats = stats[name]
+                target_stats.add_result(res)
+                if windows is not None:
+                    windows[name].add_result(res)
+                if store is not None:
+                    store.write_result(name, res)
+                if tracker is not None:
+                    tracker.add_result(name, res)
+                elif writer is not None:
+                    writer.write_result(name, ip, seq, res)
+                elif not args.quiet:
+                    if isinstance(res, OSError):
+                        outcomes = [type(res).__name__]
+                    else:
+                        outcomes = ["%.2f ms" % (reply_rtt(rep),)
+                                    if rep.Status == 0 else
+                                    errno_map.get(rep.Status,
+                                                  OSError).__name__
+                                    for rep in res]
+                    if target_stats.received:
+                        summary = "%.2f avg, %.0f%% loss" % (
+                            target_stats.mean, target_stats.loss)
+                    else:
+                        summary = "%.0f%% loss" % (target_stats.loss,)
+                    for outcome in outcomes:
+                        print("%s : [%d], %s (%s)" % (name, seq, outcome,
+                                                      summary))
+            seq += 1
+            if args.infinite or seq < args.count:
+                await scheduler.wait()
+
+    async def print_windows():
+        scheduler = IntervalScheduler(args.window)
+        scheduler.tick()
+        while True:
+            await scheduler.wait()
+            print("\nLast %ds:" % (args.window,), file=out)
+            print_target_stats(collections.OrderedDict(
+                (name, window.current()) for name, window in windows.items()),
+                out)
+
+    async def print_summaries():
+        scheduler = IntervalScheduler(args.summary)
+        scheduler.tick()
+        while True:
+            await scheduler.wait()
+            print_summary(args, tracker)
+
+    async def run(pinger):
+        inflight = asyncio.Semaphore(args.max_inflight)
+        tasks = [asyncio.ensure_future(probe_target(pinger, inflight, name))
+                 for name in probes]
+        refresh = None
+        if args.reresolve:
+            refresh = asyncio.ensure_future(reresolve())
+        summaries = None
+        if tracker is not None:
+            summaries = asyncio.ensure_future(print_summaries())
+        elif windows is not None:
+            summaries = asyncio.ensure_future(print_windows())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if refresh is not None:
+                refresh.cancel()
+            if summaries is not None:
+                summaries.cancel()
+            for task in tasks:
+                task.cancel()
+
+    out = sys.stdout if writer is None else sys.stderr
+    pinger = BatchPinger(loop, timeout=args.timeout,
+                         data=os.urandom(args.size),
+                         profile=make_profile(args),
+                         timeouts=make_timeouts(args),
+                         payload=(TimestampedPayload(args.size)
+                                  if args.precise else None))
+    task = loop.create_task(run(pinger))
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        loop.run_until_complete(asyncio.wait((task,)))
+    finally:
+        pinger.close()
+        resolver.close()
+        loop.close()
+
+    if tracker is not None:
+        print_summary(args, tracker)
+        return
+    print(file=out)
+    print_target_stats(stats, out)
+    if not any(target_stats.received for target_stats in stats.values()):
+        sys.exit(1)
+
+
+def print_event(args, event):
+    if args.format == "jsonl":
+        import json
+        print(json.dumps(event.as_dict(), separators=(',', ':')))
+    else:
+        stats = event.stats
+        line = "%s %s : %s -> %s, %d/%d received" % (
+            time.strftime("%Y-%m-%d %H:%M:%S",
+                          time.localtime(event.timestamp)),
+            event.target, event.old, event.new, stats.received, stats.sent)
+        if stats.received:
+            line += ", %.2f ms avg" % (stats.mean,)
+        print(line)
+    sys.stdout.flush()
+
+
+def print_summary(args, tracker):
+    summary = tracker.summary()
+    if args.format == "jsonl":
+        import json
+        record = collections.OrderedDict([("timestamp", time.time())])
+        record.update(summary)
+        print(json.dumps(record, separators=(',', ':')))
+    else:
+        print("%s summary : %s" % (
+            time.strftime("%Y-%m-%d %H:%M:%S"),
+            ", ".join("%d %s" % (count, state)
+                      for state, count in summary.items())))
+    sys.stdout.flush()
+
+
+def print_target_stats(stats, file=None):
+    width = max((len(name) for name in stats), default=0)
+    for name, target_stats in stats.items():
+        line = "%-*s : xmt/rcv/%%loss = %d/%d/%.0f%%" % (
+            width, name, target_stats.sent, target_stats.received,
+            target_stats.loss)
+        if target_stats.received:
+            line += ", min/avg/max = %.2f/%.2f/%.2f" % (
+                target_stats.min, target_stats.mean, target_stats.max)
+        print(line, file=file)
+
+
+def monitor(args, targets, store=None):
+    from .monitor import StateTracker
+    tracker = StateTracker(window=args.state_window, max_loss=args.max_loss,
+                           max_rtt=args.max_rtt,
+                           callback=lambda event: print_event(args, event))
+    ping_multi(args, targets, store=store, tracker=tracker)
+
+
+def ping_sharded(args, names, addresses):
+    # multiprocessing is loaded only when sharding is requested
+    from .shard import sharded_sweep
+    try:
+        results = sharded_sweep(
+            [addresses[name] for name in names], processes=args.processes,
+            rounds=args.count, interval=args.period / 1000,
+            concurrency=max(args.max_inflight // args.processes, 1),
+            timeout=args.timeout, data=os.urandom(args.size),
+            profile=make_profile(args), timeouts=make_timeouts(args))
+    except KeyboardInterrupt:
+        sys.exit(1)
+    stats = results.stats_by_target()
+
+    print()
+    width = max((len(name) for name in names), default=0)
+    for name in names:
+        target_stats = stats[addresses[name]]
+        line = "%-*s : xmt/rcv/%%loss = %d/%d/%.0f%%" % (
+            width, name, target_stats.sent, target_stats.received,
+            target_stats.loss)
+        if target_stats.received:
+            line += ", min/avg/max = %.2f/%.2f/%.2f" % (
+                target_stats.min, target_stats.avg, target_stats.max)
+        print(line)
+    if not any(target_stats.received for target_stats in stats.values()):
+        sys.exit(1)
+
+
+def serve(args):
+    import asyncio
+    from .exporter import Exporter
+    targets = read_targets(args)
+    loop = asyncio.new_event_loop()
+    resolver = make_resolver(args)
+    results = loop.run_until_complete(resolver.resolve_many(targets))
+    resolver.close()
+    addresses = []
+    for name, res in results.items():
+        if isinstance(res, OSError):
+            print("%s: name or address could not be resolved" % (name,),
+                  file=sys.stderr)
+        else:
+            addresses.append((name, res[0]))
+    if not addresses:
+        loop.close()
+        sys.exit(3)
+
+    exporter = Exporter(loop, addresses, interval=args.interval,
+                        timeout=args.timeout, data=os.urandom(args.size),
+                        max_inflight=args.max_inflight,
+                        profile=make_profile(args))
+    try:
+        host, port = loop.run_until_complete(
+            exporter.start(args.listen, args.port))
+        print("Probing %d destinations, metrics are served on "
+              "http://%s:%d/metrics" % (len(addresses), host, port),
+              file=sys.stderr)
+        loop.run_forever()
     except KeyboardInterrupt:
         pass
+    finally:
+        loop.run_until_complete(exporter.close())
+        loop.close()
+
+
+def print_load_report(report):
+    stats = report.stats
+    if stats.received:
+        pct = stats.percentiles((50, 90, 99))
+        rtts = "%9.3f %9.3f %9.3f" % (pct[50], pct[90], pct[99])
+    else:
+        rtts = "%9s %9s %9s" % ("-", "-", "-")
+    print("%7.1f %10.0f %10.0f %7.2f%% %s %8d %8d" %
+          (report.elapsed, report.send_rate, report.reply_rate, stats.loss,
+           rtts, report.inflight, report.missed))
+    sys.stdout.flush()
+
+
+def load(args):
+    import asyncio
+    from .load import LoadGenerator
+    loop = asyncio.new_event_loop()
+    resolver = make_resolver(args)
+    results = loop.run_until_complete(resolver.resolve_many(args.address))
+    resolver.close()
+    addresses = []
+    for name, res in results.items():
+        if isinstance(res, OSError):
+            print("%s: name or address could not be resolved" % (name,),
+                  file=sys.stderr)
+        else:
+            addresses.append(res[0])
+    if not addresses:
+        loop.close()
+        sys.exit(3)
+
+    generator = LoadGenerator(loop, addresses, args.rate, size=args.size,
+                              timeout=args.timeout, burst=args.burst,
+                              max_inflight=args.max_inflight,
+                              profile=make_profile(args),
+                              callback=print_load_report)
+    print("Sending %g echo requests per second with %d bytes of data to %s:"
+          % (args.rate, args.size, ", ".join(addresses)))
+    print("%7s %10s %10s %8s %9s %9s %9s %8s %8s" %
+          ("time", "sent/s", "replies/s", "loss", "p50 ms", "p90 ms",
+           "p99 ms", "inflight", "missed"))
+    start = time.monotonic()
+    task = loop.create_task(generator.run(args.duration))
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        loop.run_until_complete(asyncio.wait((task,)))
+    finally:
+        generator.close()
+        loop.close()
+    elapsed = time.monotonic() - start
+
+    stats = generator.total
+    print("\nLoad statistics:")
+    print("    Sent = %d, Received = %d, Lost = %d (%.2f%% loss)" %
+          (generator.sent, stats.received, generator.sent - stats.received,
+           100 * (generator.sent - stats.received) / generator.sent
+           if generator.sent else 0.))
+    print("    Send rate = %.0f/s of %g/s, Reply rate = %.0f/s, "
+          "Missed = %d" %
+          (generator.sent / elapsed, args.rate, stats.received / elapsed,
+           int(round(generator.missed))))
+    if stats.received:
+        print_rtt_distribution(stats)
+    if not stats.received:
+        sys.exit(1)
 
-    if requests:
-        print("\nPing statistics for %s:" % (ip,))
-        print("    Packets: Sent = %d, Received = %d, Lost = %d (%.2f%% loss)," % (
-            requests,
-            responses,
-            lost,
-            100 * lost / requests))
-    if responses:
-        print("Approximate round trip times in milli-seconds:")
-        print("    Minimum = %dms, Maximum = %dms, Average = %sms" %
-              (min_rtt,
-               max_rtt,
-               int(round(sum_rtt / responses))))
 
 if __name__ == '__main__':
     main()
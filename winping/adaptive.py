@@ -0,0 +1,131 @@
+import math
+import time
+
+from .errors import get_status
+from .payload import reply_rtt
+
+__all__ = [
+    'AdaptiveTimeouts',
+]
+
+IP_SUCCESS = 0
+IP_DEST_HOST_UNREACHABLE = 11003
+IP_REQ_TIMED_OUT = 11010
+
+BACKOFF_STATUSES = (IP_REQ_TIMED_OUT, IP_DEST_HOST_UNREACHABLE)
+
+# RFC 6298 smoothing factors
+ALPHA = 1 / 8
+BETA = 1 / 4
+
+
+class TargetState(object):
+    __slots__ = ('srtt', 'rttvar', 'rto', 'failures', 'next_probe',
+                 'skipped')
+
+    def __init__(self, rto):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = rto
+        self.failures = 0
+        self.next_probe = None
+        self.skipped = 0
+
+
+class AdaptiveTimeouts(object):
+    """ Per-target timeouts and probe backoff.
+
+    Timeout of target follows its observed RTT like TCP retransmission
+    timer (RFC 6298): srtt + 4 * rttvar, clamped to [min_timeout,
+    max_timeout] milliseconds. Targets without RTT samples get max_timeout.
+    Each timed out request doubles timeout until next sample, so single
+    late reply is not counted as loss again.
+
+    After threshold consecutive RequestTimedOut or
+    DestinationHostUnreachable outcomes target is backed off: should_probe()
+    returns False until recovery time, which starts at backoff seconds and
+    doubles with every further failure up to max_backoff. Any reply resets
+    target state. """
+
+    def __init__(self, max_timeout=1000, min_timeout=50, threshold=3,
+                 backoff=1., max_backoff=300., clock=time.monotonic):
+        self.max_timeout = max_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.targets = {}
+
+    def state(self, target):
+        try:
+            return self.targets[target]
+        except KeyError:
+            state = self.targets[target] = TargetState(self.max_timeout)
+            return state
+
+    def timeout(self, target):
+        """ Returns timeout in whole milliseconds for next request to target,
+        as ICMP API accepts integer timeout only """
+        state = self.targets.get(target)
+        rto = self.max_timeout if state is None else state.rto
+        return int(math.ceil(rto))
+
+    def should_probe(self, target):
+        """ False while target is backed off. Skipped probes are counted in
+        target state. """
+        state = self.targets.get(target)
+        if state is None or state.next_probe is None:
+            return True
+        if self.clock() >= state.next_probe:
+            return True
+        state.skipped += 1
+        return False
+
+    def backed_off(self):
+        """ Returns list of targets currently backed off """
+        now = self.clock()
+        return [target for target, state in self.targets.items()
+                if state.next_probe is not None and now < state.next_probe]
+
+    def observe(self, target, rtt):
+        """ Accounts reply with RTT in milliseconds """
+        state = self.state(target)
+        if state.srtt is None:
+            state.srtt = rtt
+            state.rttvar = rtt / 2
+        else:
+            state.rttvar += BETA * (abs(state.srtt - rtt) - state.rttvar)
+            state.srtt += ALPHA * (rtt - state.srtt)
+        # clock granularity of 1ms keeps timeout above zero variance
+        state.rto = min(max(state.srtt + max(4 * state.rttvar, 1.),
+                            self.min_timeout), self.max_timeout)
+        state.failures = 0
+        state.next_probe = None
+
+    def failure(self, target, status):
+        """ Accounts unsuccessful outcome with IP status code """
+        if status not in BACKOFF_STATUSES:
+            return
+        state = self.state(target)
+        state.failures += 1
+        if status == IP_REQ_TIMED_OUT:
+            state.rto = min(state.rto * 2, self.max_timeout)
+        if state.failures >= self.threshold:
+            delay = min(self.backoff * 2 ** (state.failures - self.threshold),
+                        self.max_backoff)
+            state.next_probe = self.clock() + delay
+
+    def add_result(self, target, result):
+        """ Accounts outcome of ping()-like call: list of replies or
+        exception instance """
+        if isinstance(result, OSError):
+            status = get_status(result)
+            if status is not None:
+                self.failure(target, status)
+            return
+        for rep in result:
+            if rep.Status == IP_SUCCESS:
+                self.observe(target, reply_rtt(rep))
+            else:
+                self.failure(target, rep.Status)
@@ -0,0 +1,98 @@
+import importlib
+import os
+import sys
+
+__all__ = [
+    'Backend',
+    'get_backend',
+    'register_backend',
+    'available_backends',
+    'default_backend_name',
+]
+
+
+class Backend(object):
+    """ Low-level echo engine behind ping() and ping6().
+
+    Backends mimic the contract of IcmpSendEcho/Icmp6SendEcho2: replies are
+    written into caller-provided buffer as arrays of ICMP_ECHO_REPLY
+    (ICMPV6_ECHO_REPLY) structures, return value is the reply count and
+    failures are raised as errno_map exceptions. Asynchronous variants return
+    future resolving to the reply count; default implementation runs blocking
+    call in executor. IPv4 source address is passed as source keyword only
+    when it is requested. """
+
+    name = None
+
+    def create_handle(self):
+        raise NotImplementedError
+
+    def create_handle6(self):
+        raise NotImplementedError
+
+    def close_handle(self, handle):
+        raise NotImplementedError
+
+    def send_echo(self, handle, address, data, options,
+                  buf, bufsize, timeout, source=None):
+        raise NotImplementedError
+
+    def send_echo6(self, handle, source, address, data, options,
+                   buf, bufsize, timeout):
+        raise NotImplementedError
+
+    def send_echo_async(self, handle, address, data, options,
+                        buf, bufsize, timeout, loop, source=None):
+        return loop.run_in_executor(None, self.send_echo, handle, address,
+                                    data, options, buf, bufsize, timeout,
+                                    source)
+
+    def send_echo6_async(self, handle, source, address, data, options,
+                         buf, bufsize, timeout, loop):
+        return loop.run_in_executor(None, self.send_echo6, handle, source,
+                                    address, data, options, buf, bufsize,
+                                    timeout)
+
+
+_registry = {
+    'windows': '.windows',
+    'socket': '.icmpsock',
+    'simulated': '.simulated',
+}
+_instances = {}
+
+
+def register_backend(name, factory):
+    """ Registers backend factory (callable or module path) under name """
+    _registry[name] = factory
+    _instances.pop(name, None)
+
+
+def available_backends():
+    return sorted(_registry)
+
+
+def default_backend_name():
+    name = os.environ.get('WINPING_BACKEND')
+    if name:
+        return name
+    return 'windows' if sys.platform == 'win32' else 'socket'
+
+
+def get_backend(backend=None):
+    if isinstance(backend, Backend):
+        return backend
+    name = default_backend_name() if backend is None else backend
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    try:
+        factory = _registry[name]
+    except KeyError:
+        raise ValueError("Unknown backend %r. Available backends: %s" %
+                         (name, ", ".join(available_backends())))
+    if isinstance(factory, str):
+        factory = importlib.import_module(factory, __name__).Backend
+    instance = _instances[name] = factory()
+    return instance
@@ -0,0 +1,460 @@
+import ctypes
+import errno
+import select
+import socket
+import struct
+import time
+
+from ..errors import *
+from ..errors import errno_map
+from ..structs import *
+from . import Backend as BaseBackend
+
+IP_TTL = getattr(socket, 'IP_TTL', 2)
+IP_TOS = getattr(socket, 'IP_TOS', 1)
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IP_RECVTTL = getattr(socket, 'IP_RECVTTL', 12)
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DONT = 0
+IP_PMTUDISC_DO = 2
+IPV6_UNICAST_HOPS = getattr(socket, 'IPV6_UNICAST_HOPS', 16)
+IPV6_TCLASS = getattr(socket, 'IPV6_TCLASS', 67)
+IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+IPV6_MTU_DISCOVER = getattr(socket, 'IPV6_MTU_DISCOVER', 23)
+MSG_ERRQUEUE = getattr(socket, 'MSG_ERRQUEUE', 0x2000)
+SO_EE_ORIGIN_LOCAL = 1
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+
+ICMP_ECHOREPLY = 0
+ICMP_ECHO = 8
+ICMP6_ECHOREQUEST = 128
+ICMP6_ECHOREPLY = 129
+
+IP_FLAG_DF = 0x2
+
+# receive buffer large enough to hold replies for thousands of outstanding
+# requests; kernel clamps it to net.core.rmem_max
+RCVBUF_SIZE = 1 << 22
+
+IP_SUCCESS = 0
+IP_BUF_TOO_SMALL = 11001
+IP_DEST_NET_UNREACHABLE = 11002
+IP_DEST_HOST_UNREACHABLE = 11003
+IP_DEST_PROT_UNREACHABLE = 11004
+IP_DEST_PORT_UNREACHABLE = 11005
+IP_NO_RESOURCES = 11006
+IP_PACKET_TOO_BIG = 11009
+IP_REQ_TIMED_OUT = 11010
+IP_BAD_ROUTE = 11012
+IP_TTL_EXPIRED_TRANSIT = 11013
+IP_TTL_EXPIRED_REASSEM = 11014
+IP_PARAM_PROBLEM = 11015
+IP_SOURCE_QUENCH = 11016
+IP_GENERAL_FAILURE = 11050
+
+# (icmp type, icmp code) -> IP_STATUS; code None matches any code
+icmp_status_map = {
+    (3, 0): IP_DEST_NET_UNREACHABLE,
+    (3, 1): IP_DEST_HOST_UNREACHABLE,
+    (3, 2): IP_DEST_PROT_UNREACHABLE,
+    (3, 3): IP_DEST_PORT_UNREACHABLE,
+    (3, 4): IP_PACKET_TOO_BIG,
+    (3, 5): IP_BAD_ROUTE,
+    (3, None): IP_DEST_HOST_UNREACHABLE,
+    (4, None): IP_SOURCE_QUENCH,
+    (11, 0): IP_TTL_EXPIRED_TRANSIT,
+    (11, 1): IP_TTL_EXPIRED_REASSEM,
+    (12, None): IP_PARAM_PROBLEM,
+}
+
+icmp6_status_map = {
+    (1, 0): IP_DEST_NET_UNREACHABLE,
+    (1, 4): IP_DEST_PORT_UNREACHABLE,
+    (1, None): IP_DEST_HOST_UNREACHABLE,
+    (2, None): IP_PACKET_TOO_BIG,
+    (3, 0): IP_TTL_EXPIRED_TRANSIT,
+    (3, 1): IP_TTL_EXPIRED_REASSEM,
+    (4, None): IP_PARAM_PROBLEM,
+}
+
+local_errno_map = {
+    errno.EMSGSIZE: IP_PACKET_TOO_BIG,
+    errno.ENETUNREACH: IP_DEST_NET_UNREACHABLE,
+    errno.EHOSTUNREACH: IP_DEST_HOST_UNREACHABLE,
+    errno.ENOBUFS: IP_NO_RESOURCES,
+    errno.EAGAIN: IP_NO_RESOURCES,
+}
+
+sock_extended_err = struct.Struct("=IBBBBII")
+icmp_header = struct.Struct("!BBHHH")
+
+
+def status_error(status, funcname):
+    exc = errno_map.get(status, OSError)
+    return exc(0, "%s failed" % (funcname,), None, status)
+
+
+def raise_status(status, funcname):
+    raise status_error(status, funcname)
+
+
+def icmp_status(status_map, icmp_type, icmp_code):
+    try:
+        return status_map[(icmp_type, icmp_code)]
+    except KeyError:
+        return status_map.get((icmp_type, None), IP_GENERAL_FAILURE)
+
+
+class EchoSocket(object):
+    """ Unprivileged ICMP datagram socket (net.ipv4.ping_group_range) """
+
+    def __init__(self, family):
+        self.family = family
+        if family == socket.AF_INET:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                                      socket.IPPROTO_ICMP)
+            self.sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            self.sock.setsockopt(socket.IPPROTO_IP, IP_RECVTTL, 1)
+            self.echo_request = ICMP_ECHO
+            self.echo_reply = ICMP_ECHOREPLY
+        else:
+            self.sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM,
+                                      socket.IPPROTO_ICMPV6)
+            self.sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+            self.echo_request = ICMP6_ECHOREQUEST
+            self.echo_reply = ICMP6_ECHOREPLY
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                 RCVBUF_SIZE)
+        except OSError:
+            pass
+        self.sock.setblocking(False)
+        self.seq = 0
+        self.source = None
+        self.source_struct = None
+        self.options = None
+        self.loop = None
+        self.waiters = {}
+        # receive buffer reused across reads
+        self.rbuf = bytearray(65536)
+        self.rview = memoryview(self.rbuf)
+        self.rbufs = (self.rbuf,)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.remove_reader(self.sock)
+        self.loop = None
+        self.sock.close()
+
+    def next_seq(self):
+        seq = (self.seq + 1) & 0xFFFF
+        while seq in self.waiters:
+            seq = (seq + 1) & 0xFFFF
+        self.seq = seq
+        return seq
+
+    def set_options(self, options):
+        """ Applies request options to socket. Options are sticky, so
+        absent ones reset socket to defaults after previous request. """
+        if options is None:
+            if self.options is None:
+                return
+            key = (0, 0, 0)
+        else:
+            key = (options.Ttl, options.Tos, options.Flags)
+        if key == self.options:
+            return
+        ttl, tos, flags = key
+        # -1 selects system default TTL
+        ttl = ttl or -1
+        pmtudisc = IP_PMTUDISC_DO if flags & IP_FLAG_DF else IP_PMTUDISC_DONT
+        if self.family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_IP, IP_TTL, ttl)
+            self.sock.setsockopt(socket.IPPROTO_IP, IP_TOS, tos)
+            self.sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, pmtudisc)
+        else:
+            self.sock.setsockopt(socket.IPPROTO_IPV6, IPV6_UNICAST_HOPS, ttl)
+            self.sock.setsockopt(socket.IPPROTO_IPV6, IPV6_TCLASS, tos)
+            self.sock.setsockopt(socket.IPPROTO_IPV6, IPV6_MTU_DISCOVER,
+                                 pmtudisc)
+        self.options = key
+
+    def bind(self, source):
+        """ Binds socket to source address. Ping socket is bound only once,
+        either here or implicitly by its first request, so source address
+        can't be changed afterwards. """
+        if source is None or source == self.source:
+            return
+        try:
+            self.sock.bind((source, 0))
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            raise OSError(e.errno, "Source address of socket backend handle "
+                          "is fixed once it is bound or has sent a request, "
+                          "use separate handle for source %s" % (source,))
+        self.source = source
+
+    def send(self, address, data):
+        seq = self.next_seq()
+        packet = icmp_header.pack(self.echo_request, 0, 0, 0, seq) + data
+        try:
+            self.sock.sendto(packet, (address, 0))
+        except OSError as e:
+            if e.errno not in local_errno_map:
+                raise
+            # error may be pending one left by ICMP error to another request,
+            # which is reported and cleared by this call. Genuine local
+            # failure repeats.
+            try:
+                self.sock.sendto(packet, (address, 0))
+            except OSError as e:
+                if e.errno in local_errno_map:
+                    return seq, local_errno_map[e.errno]
+                raise
+        return seq, IP_SUCCESS
+
+    def recv(self):
+        """ Reads one pending message without blocking.
+
+        Returns tuple (seq, status, address, ttl, payload) or None if there is
+        nothing to read. Non-matching packets are reported with seq=None. """
+        try:
+            return self._recv_error()
+        except BlockingIOError:
+            pass
+        try:
+            size, ancdata, flags, addr = self.sock.recvmsg_into(
+                self.rbufs, 64)
+        except BlockingIOError:
+            return None
+        except OSError:
+            # pending socket error duplicates message from error queue
+            return None, None, None, None, None
+        if size < icmp_header.size:
+            return None, None, None, None, None
+        icmp_type, _, _, _, seq = icmp_header.unpack_from(self.rbuf)
+        if icmp_type != self.echo_reply:
+            return None, None, None, None, None
+        ttl = 0
+        for level, ctype, cdata in ancdata:
+            if level == socket.IPPROTO_IP and ctype == IP_TTL:
+                ttl = struct.unpack("=i", cdata[:4])[0]
+        return (seq, IP_SUCCESS, addr[0], ttl,
+                bytes(self.rview[icmp_header.size:size]))
+
+    def _recv_error(self):
+        size, ancdata, flags, addr = self.sock.recvmsg_into(self.rbufs, 512,
+                                                            MSG_ERRQUEUE)
+        seq = None
+        if size >= icmp_header.size:
+            seq = icmp_header.unpack_from(self.rbuf)[4]
+        for level, ctype, cdata in ancdata:
+            if not ((level == socket.IPPROTO_IP and ctype == IP_RECVERR) or
+                    (level == socket.IPPROTO_IPV6 and ctype == IPV6_RECVERR)):
+                continue
+            (ee_errno, ee_origin, ee_type, ee_code,
+             _, ee_info, ee_data) = sock_extended_err.unpack_from(cdata)
+            offender = cdata[sock_extended_err.size:]
+            if ee_origin == SO_EE_ORIGIN_ICMP:
+                status = icmp_status(icmp_status_map, ee_type, ee_code)
+                address = socket.inet_ntop(socket.AF_INET, offender[4:8])
+            elif ee_origin == SO_EE_ORIGIN_ICMP6:
+                status = icmp_status(icmp6_status_map, ee_type, ee_code)
+                address = socket.inet_ntop(socket.AF_INET6, offender[8:24])
+            else:
+                status = local_errno_map.get(ee_errno, IP_GENERAL_FAILURE)
+                address = None
+            return seq, status, address, 0, b''
+        return None, None, None, None, None
+
+    def wait(self, seq, timeout):
+        """ Blocks until reply or error for seq arrives or timeout expires """
+        deadline = time.monotonic() + timeout / 1000
+        while True:
+            res = self.recv()
+            if res is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                select.select((self.sock,), (), (), remaining)
+                continue
+            if res[0] == seq:
+                return res
+            self.dispatch_one(res)
+
+    def watch(self, loop):
+        if self.loop is loop:
+            return
+        if self.loop is not None:
+            raise RuntimeError("Handle is already attached to another "
+                               "event loop")
+        loop.add_reader(self.sock, self.dispatch)
+        self.loop = loop
+
+    def submit(self, loop, address, data, timeout, callback):
+        """ Sends echo request and schedules callback(res, rtt) invocation
+        from event loop upon reply arrival or callback(None, None) upon
+        timeout """
+        self.watch(loop)
+        start = time.monotonic()
+        seq, status = self.send(address, data)
+        if status != IP_SUCCESS:
+            loop.call_soon(callback, (seq, status, None, 0, b''), 0)
+            return
+        timer = loop.call_later(timeout / 1000, self.expire, seq)
+        self.waiters[seq] = (callback, start, timer)
+
+    def dispatch(self):
+        while True:
+            res = self.recv()
+            if res is None:
+                return
+            self.dispatch_one(res)
+
+    def dispatch_one(self, res):
+        waiter = self.waiters.pop(res[0], None)
+        if waiter is None:
+            return
+        callback, start, timer = waiter
+        timer.cancel()
+        callback(res, int((time.monotonic() - start) * 1000))
+
+    def expire(self, seq):
+        waiter = self.waiters.pop(seq, None)
+        if waiter is not None:
+            waiter[0](None, None)
+
+
+def fill_reply(buf, bufsize, address, status, rtt, ttl, options, payload):
+    hdr_size = ctypes.sizeof(ICMP_ECHO_REPLY)
+    if bufsize < hdr_size + len(payload):
+        raise_status(IP_BUF_TOO_SMALL, "IcmpSendEcho")
+    rep = ICMP_ECHO_REPLY.from_buffer(buf)
+    data_ptr = ctypes.addressof(buf) + hdr_size
+    ctypes.memmove(data_ptr, payload, len(payload))
+    rep.Address = inet_addr(address)
+    rep.Status = status
+    rep.RoundTripTime = rtt
+    rep.DataSize = len(payload)
+    rep.Reserved = 0
+    rep.Data = data_ptr
+    rep.Options.Ttl = ttl
+    rep.Options.Tos = options.Tos if options is not None else 0
+    rep.Options.Flags = options.Flags if options is not None else 0
+    rep.Options.OptionsSize = 0
+    rep.Options.OptionsData = 0
+    return 1
+
+
+def fill_reply6(buf, bufsize, address, status, rtt, payload):
+    hdr_size = ctypes.sizeof(ICMPV6_ECHO_REPLY)
+    if bufsize < hdr_size + len(payload):
+        raise_status(IP_BUF_TOO_SMALL, "Icmp6SendEcho2")
+    rep = ICMPV6_ECHO_REPLY.from_buffer(buf)
+    ctypes.memmove(ctypes.addressof(buf) + hdr_size, payload, len(payload))
+    rep.Address.sin6_port = 0
+    rep.Address.sin6_flowinfo = 0
+    rep.Address.sin6_addr = inet6_addr(address).sin6_addr
+    rep.Address.sin6_scope_id = 0
+    rep.Status = status
+    rep.RoundTripTime = rtt
+    return 1
+
+
+class Backend(BaseBackend):
+    name = 'socket'
+
+    def create_handle(self):
+        return EchoSocket(socket.AF_INET)
+
+    def create_handle6(self):
+        return EchoSocket(socket.AF_INET6)
+
+    def close_handle(self, handle):
+        handle.close()
+
+    def _exchange(self, handle, address, data, timeout, funcname):
+        start = time.monotonic()
+        seq, status = handle.send(address, data)
+        if status != IP_SUCCESS:
+            raise_status(status, funcname)
+        res = handle.wait(seq, timeout)
+        rtt = int((time.monotonic() - start) * 1000)
+        return self._result(res, rtt, funcname)
+
+    def _result(self, res, rtt, funcname):
+        if res is None:
+            raise_status(IP_REQ_TIMED_OUT, funcname)
+        _, status, reply_address, ttl, payload = res
+        if reply_address is None:
+            raise_status(status, funcname)
+        return reply_address, status, rtt, ttl, payload
+
+    def _submit(self, handle, address, data, timeout, funcname, fill, loop):
+        fut = loop.create_future()
+
+        def on_result(res, rtt):
+            if fut.done():
+                return
+            try:
+                fut.set_result(fill(*self._result(res, rtt, funcname)))
+            except OSError as e:
+                fut.set_exception(e)
+
+        handle.submit(loop, address, data, timeout, on_result)
+        return fut
+
+    def send_echo(self, handle, address, data, options,
+                  buf, bufsize, timeout, source=None):
+        self._prepare(handle, source, options)
+        reply_address, status, rtt, ttl, payload = self._exchange(
+            handle, str(address), data, timeout, "IcmpSendEcho")
+        return fill_reply(buf, bufsize, reply_address, status, rtt, ttl,
+                          options, payload)
+
+    def send_echo6(self, handle, source, address, data, options,
+                   buf, bufsize, timeout):
+        self._prepare6(handle, source, options)
+        reply_address, status, rtt, ttl, payload = self._exchange(
+            handle, str(address.sin6_addr), data, timeout, "Icmp6SendEcho2")
+        return fill_reply6(buf, bufsize, reply_address, status, rtt, payload)
+
+    def _prepare(self, handle, source, options):
+        handle.set_options(options)
+        if source is not None and source is not handle.source_struct:
+            handle.bind(str(source))
+            handle.source_struct = source
+
+    def _prepare6(self, handle, source, options):
+        handle.set_options(options)
+        if source is not None and source is not handle.source_struct:
+            address = str(source.sin6_addr)
+            handle.bind(None if address == '::' else address)
+            handle.source_struct = source
+
+    def send_echo_async(self, handle, address, data, options,
+                        buf, bufsize, timeout, loop, source=None):
+        self._prepare(handle, source, options)
+
+        def fill(reply_address, status, rtt, ttl, payload):
+            return fill_reply(buf, bufsize, reply_address, status, rtt, ttl,
+                              options, payload)
+
+        return self._submit(handle, str(address), data, timeout,
+                            "IcmpSendEcho2", fill, loop)
+
+    def send_echo6_async(self, handle, source, address, data, options,
+                         buf, bufsize, timeout, loop):
+        self._prepare6(handle, source, options)
+
+        def fill(reply_address, status, rtt, ttl, payload):
+            return fill_reply6(buf, bufsize, reply_address, status, rtt,
+                               payload)
+
+        return self._submit(handle, str(address.sin6_addr), data, timeout,
+                            "Icmp6SendEcho2", fill, loop)
@@ -0,0 +1,293 @@
+""" In-process network emulator. Outcome of each request is derived from
+seed, target address and number of request to that target, so runs with the
+same seed are reproducible regardless of how requests interleave. """
+
+import hashlib
+import ipaddress
+import json
+import math
+import os
+import socket
+import struct
+import time
+
+from ..errors import *
+from ..errors import errno_map
+from ..structs import *
+from .icmpsock import fill_reply, fill_reply6, raise_status, status_error
+from . import Backend as BaseBackend
+
+__all__ = [
+    'Backend',
+    'TargetProfile',
+    'load_config',
+]
+
+IP_SUCCESS = 0
+IP_PACKET_TOO_BIG = 11009
+IP_REQ_TIMED_OUT = 11010
+IP_TTL_EXPIRED_TRANSIT = 11013
+
+IP_FLAG_DF = 0x2
+IP_HEADER_SIZE = 20
+IPV6_HEADER_SIZE = 40
+ICMP_HEADER_SIZE = 8
+
+DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'exponential')
+
+_UNIFORMS = struct.Struct('<4Q')
+_SCALE = 1 / (1 << 64)
+
+
+def _status(error):
+    """ Returns IP_STATUS code for status code, errno_map exception class
+    or its name """
+    if error is None or isinstance(error, int):
+        return error
+    for status, exc in errno_map.items():
+        if exc is error or exc.__name__ == error:
+            return status
+    raise ValueError("Unknown error %r" % (error,))
+
+
+class TargetProfile(object):
+    """ Behaviour of simulated target.
+
+    RTT in milliseconds follows distribution: 'constant' latency,
+    'uniform' within latency +- jitter, 'normal' with mean latency and
+    standard deviation jitter or 'exponential' latency plus exponential
+    tail with mean jitter. Requests are lost with probability loss. With
+    error set (IP_STATUS code, errno_map exception class or its name) reply
+    carries that status with probability error_rate, coming from
+    error_address or target itself. route lists addresses of routers on
+    the way, requests with TTL not exceeding its length expire in transit.
+    Requests larger than mtu with don't fragment flag get PacketTooBig. """
+
+    __slots__ = ('latency', 'jitter', 'distribution', 'loss', 'ttl',
+                 'error', 'error_rate', 'error_address', 'route', 'mtu')
+
+    def __init__(self, latency=1., jitter=0., distribution='normal',
+                 loss=0., ttl=64, error=None, error_rate=1.,
+                 error_address=None, route=(), mtu=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError("Unknown distribution %r. Available "
+                             "distributions: %s" %
+                             (distribution, ", ".join(DISTRIBUTIONS)))
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.loss = loss
+        self.ttl = ttl
+        self.error = _status(error)
+        self.error_rate = error_rate
+        self.error_address = error_address
+        self.route = tuple(route)
+        self.mtu = mtu
+
+    def rtt(self, u1, u2):
+        """ Draws RTT in milliseconds from two uniform variates in [0, 1) """
+        if self.distribution == 'constant' or not self.jitter:
+            res = self.latency
+        elif self.distribution == 'uniform':
+            res = self.latency + self.jitter * (2 * u1 - 1)
+        elif self.distribution == 'normal':
+            # Box-Muller transform
+            res = self.latency + self.jitter * (
+                math.sqrt(-2 * math.log(1 - u1)) * math.cos(2 * math.pi * u2))
+        else:
+            res = self.latency - self.jitter * math.log(1 - u1)
+        return max(res, 0.)
+
+
+class Backend(BaseBackend):
+    """ Simulated network. profiles maps IP addresses or networks to
+    TargetProfile, targets matching none of them follow default. Delays
+    are multiplied by time_scale, zero completes requests without waiting
+    while RTT reported in replies stays the simulated one. """
+
+    name = 'simulated'
+
+    def __init__(self, profiles=None, default=None, seed=0, time_scale=None):
+        if profiles is None and default is None:
+            config = os.environ.get('WINPING_SIMULATION')
+            if config:
+                profiles, default, seed, scale = load_config(config)
+                if time_scale is None:
+                    time_scale = scale
+        self.default = TargetProfile() if default is None else default
+        self.seed = seed
+        self.time_scale = 1. if time_scale is None else time_scale
+        self.addresses = {}
+        self.networks = []
+        for key, profile in (profiles or {}).items():
+            network = ipaddress.ip_network(key, strict=False)
+            if network.num_addresses == 1:
+                self.addresses[str(network.network_address)] = profile
+            else:
+                self.networks.append((network.prefixlen, network.version,
+                                      int(network.network_address),
+                                      int(network.netmask), profile))
+        # most specific network wins
+        self.networks.sort(key=lambda item: -item[0])
+        self.cache = {}
+        self.counters = {}
+
+    def profile(self, address):
+        """ Returns TargetProfile of IP address string """
+        try:
+            return self.cache[address]
+        except KeyError:
+            pass
+        profile = self.addresses.get(address)
+        if profile is None:
+            if ':' in address:
+                version = 6
+                ip = socket.inet_pton(socket.AF_INET6, address)
+            else:
+                version = 4
+                ip = socket.inet_aton(address)
+            ip = int.from_bytes(ip, 'big')
+            for _, net_version, net, mask, candidate in self.networks:
+                if net_version == version and ip & mask == net:
+                    profile = candidate
+                    break
+            else:
+                profile = self.default
+        self.cache[address] = profile
+        return profile
+
+    def _uniforms(self, address):
+        count = self.counters.get(address, 0)
+        self.counters[address] = count + 1
+        digest = hashlib.sha256(
+            ('%s:%s:%d' % (self.seed, address, count)).encode()).digest()
+        return [value * _SCALE for value in _UNIFORMS.unpack(digest)]
+
+    def _outcome(self, address, data, options, timeout, header_size):
+        """ Returns tuple (reply address, status, rtt, ttl, delay) for
+        request or None if it is lost. Reply address is None for failures
+        reported without reply. """
+        profile = self.profile(address)
+        u_loss, u_error, u1, u2 = self._uniforms(address)
+        ttl = options.Ttl if options is not None else 0
+        flags = options.Flags if options is not None else 0
+        hops = len(profile.route) + 1
+        rtt = profile.rtt(u1, u2)
+        if (profile.mtu is not None and flags & IP_FLAG_DF and
+                header_size + ICMP_HEADER_SIZE + len(data) > profile.mtu):
+            # reported by local stack right away
+            return None, IP_PACKET_TOO_BIG, 0., 0, 0.
+        if u_loss < profile.loss:
+            return None
+        if ttl and ttl < hops:
+            rtt = rtt * ttl / hops
+            res = (profile.route[ttl - 1], IP_TTL_EXPIRED_TRANSIT, rtt, 0)
+        elif profile.error is not None and u_error < profile.error_rate:
+            res = (profile.error_address or address, profile.error, rtt, 0)
+        else:
+            res = (address, IP_SUCCESS, rtt, profile.ttl)
+        if rtt >= timeout:
+            return None
+        return res + (rtt,)
+
+    def create_handle(self):
+        return object()
+
+    def create_handle6(self):
+        return object()
+
+    def close_handle(self, handle):
+        pass
+
+    def _sleep(self, delay):
+        if self.time_scale:
+            time.sleep(delay * self.time_scale / 1000)
+
+    def send_echo(self, handle, address, data, options,
+                  buf, bufsize, timeout, source=None):
+        res = self._outcome(str(address), data, options, timeout,
+                            IP_HEADER_SIZE)
+        if res is None:
+            self._sleep(timeout)
+            raise_status(IP_REQ_TIMED_OUT, "IcmpSendEcho")
+        reply_address, status, rtt, ttl, delay = res
+        self._sleep(delay)
+        if reply_address is None:
+            raise_status(status, "IcmpSendEcho")
+        return fill_reply(buf, bufsize, reply_address, status, int(rtt), ttl,
+                          options, data if status == IP_SUCCESS else b'')
+
+    def send_echo6(self, handle, source, address, data, options,
+                   buf, bufsize, timeout):
+        res = self._outcome(str(address.sin6_addr), data, options, timeout,
+                            IPV6_HEADER_SIZE)
+        if res is None:
+            self._sleep(timeout)
+            raise_status(IP_REQ_TIMED_OUT, "Icmp6SendEcho2")
+        reply_address, status, rtt, ttl, delay = res
+        self._sleep(delay)
+        if reply_address is None:
+            raise_status(status, "Icmp6SendEcho2")
+        return fill_reply6(buf, bufsize, reply_address, status, int(rtt),
+                           data if status == IP_SUCCESS else b'')
+
+    def _complete(self, loop, res, timeout, funcname, fill):
+        fut = loop.create_future()
+        if res is None or res[0] is None:
+            status = IP_REQ_TIMED_OUT if res is None else res[1]
+            delay = timeout if res is None else res[4]
+
+            def complete():
+                if not fut.done():
+                    fut.set_exception(status_error(status, funcname))
+        else:
+            delay = res[4]
+
+            def complete():
+                if fut.done():
+                    return
+                try:
+                    fut.set_result(fill(*res[:4]))
+                except OSError as e:
+                    fut.set_exception(e)
+
+        if self.time_scale:
+            loop.call_later(delay * self.time_scale / 1000, complete)
+        else:
+            loop.call_soon(complete)
+        return fut
+
+    def send_echo_async(self, handle, address, data, options,
+                        buf, bufsize, timeout, loop, source=None):
+        res = self._outcome(str(address), data, options, timeout,
+                            IP_HEADER_SIZE)
+
+        def fill(reply_address, status, rtt, ttl):
+            return fill_reply(buf, bufsize, reply_address, status, int(rtt),
+                              ttl, options,
+                              data if status == IP_SUCCESS else b'')
+
+        return self._complete(loop, res, timeout, "IcmpSendEcho2", fill)
+
+    def send_echo6_async(self, handle, source, address, data, options,
+                         buf, bufsize, timeout, loop):
+        res = self._outcome(str(address.sin6_addr), data, options, timeout,
+                            IPV6_HEADER_SIZE)
+
+        def fill(reply_address, status, rtt, ttl):
+            return fill_reply6(buf, bufsize, reply_address, status, int(rtt),
+                               data if status == IP_SUCCESS else b'')
+
+        return self._complete(loop, res, timeout, "Icmp6SendEcho2", fill)
+
+
+def load_config(path):
+    """ Reads simulation config from JSON file. Returns tuple (profiles,
+    default profile, seed, time scale). """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    profiles = {key: TargetProfile(**value)
+                for key, value in config.get('targets', {}).items()}
+    default = TargetProfile(**config.get('default', {}))
+    return (profiles, default, config.get('seed', 0),
+            config.get('time_scale', 1.))
@@ -0,0 +1,568 @@
+import ctypes
+import ctypes.wintypes
+import threading
+
+from ..errors import *
+from ..errors import errno_map
+from ..structs import *
+from . import Backend as BaseBackend
+
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+ERROR_IO_PENDING = 997
+INFINITE = 0xFFFFFFFF
+WT_EXECUTEONLYONCE = 0x00000008
+
+
+def icmp():
+    return ctypes.windll.iphlpapi
+
+
+def kernel():
+    return ctypes.windll.kernel32
+
+
+def _prototype(factory):
+    """ Defers creation of function prototype, and loading of its DLL, to
+    the first call. Stub replaces itself with bound function in module
+    namespace, so later calls go straight to it. """
+    name = factory.__name__
+
+    def bind():
+        fun = globals()[name] = factory()
+        return fun
+
+    def stub(*args, **kwargs):
+        return bind()(*args, **kwargs)
+
+    stub.__name__ = name
+    stub.bind = bind
+    return stub
+
+
+def _bound(name):
+    """ Returns prototype from module namespace, binding it if needed """
+    fun = globals()[name]
+    bind = getattr(fun, 'bind', None)
+    return fun if bind is None else bind()
+
+
+@_prototype
+def GetLastError():
+    fun = ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                             use_last_error=True)(("GetLastError", kernel()))
+    return fun
+
+
+def IcmpCreateFile_errcheck(res, func, args):
+    if res == INVALID_HANDLE_VALUE:
+        errno = GetLastError()
+        raise OSError(0, "IcmpCreateFile failed", None, errno)
+    return args
+
+
+@_prototype
+def IcmpCreateFile():
+    fun = ctypes.WINFUNCTYPE(ctypes.wintypes.HANDLE,
+                             use_last_error=True)(("IcmpCreateFile", icmp()))
+    fun.errcheck = IcmpCreateFile_errcheck
+    return fun
+
+
+@_prototype
+def Icmp6CreateFile():
+    fun = ctypes.WINFUNCTYPE(ctypes.wintypes.HANDLE,
+                             use_last_error=True)(("Icmp6CreateFile", icmp()))
+    fun.errcheck = IcmpCreateFile_errcheck
+    return fun
+
+
+def IcmpCloseHandle_errcheck(res, func, args):
+    if not res:
+        errno = GetLastError()
+        raise OSError(0, "IcmpCloseHandle failed", None, errno)
+    return args
+
+
+@_prototype
+def IcmpCloseHandle():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.BOOL,
+                              ctypes.wintypes.HANDLE,
+                              use_last_error=True)(
+                                  ("IcmpCloseHandle", icmp()), (
+                                      (1,"IcmpHandle"),)))
+    fun.errcheck = IcmpCloseHandle_errcheck
+    return fun
+
+
+def IcmpSendEcho_errcheck(res, func, args):
+    if res == 0:
+        errno = GetLastError()
+        if errno in errno_map:
+            raise errno_map[errno](0, "IcmpSendEcho failed", None, errno)
+        else:
+            raise OSError(0, "IcmpSendEcho failed", None, errno)
+    return args
+
+
+@_prototype
+def IcmpSendEcho():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                              ctypes.wintypes.HANDLE,
+                              IPAddr,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.WORD,
+                              ctypes.POINTER(IP_OPTION_INFORMATION),
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.DWORD,
+                              ctypes.wintypes.DWORD,
+                              use_last_error=True)(
+                                  ("IcmpSendEcho", icmp()), (
+                                      (1, "IcmpHandle"),
+                                      (1, "DestinationAddress"),
+                                      (1, "RequestData"),
+                                      (1, "RequestSize"),
+                                      (1, "RequestOptions"),
+                                      (1, "ReplyBuffer"),
+                                      (1, "ReplySize"),
+                                      (1, "Timeout"))))
+    fun.errcheck = IcmpSendEcho_errcheck
+    return fun
+
+
+def Icmp6SendEcho2_errcheck(res, func, args):
+    if res == 0:
+        errno = GetLastError()
+        if errno == ERROR_IO_PENDING:
+            pass
+        elif errno in errno_map:
+            raise errno_map[errno](0, "Icmp6SendEcho2 failed", None, errno)
+        else:
+            raise OSError(0, "Icmp6SendEcho2 failed", None, errno)
+    return args
+
+
+@_prototype
+def Icmp6SendEcho2():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.POINTER(sockaddr_in6),
+                              ctypes.POINTER(sockaddr_in6),
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.WORD,
+                              ctypes.POINTER(IP_OPTION_INFORMATION),
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.DWORD,
+                              ctypes.wintypes.DWORD,
+                              use_last_error=True)(
+                                  ("Icmp6SendEcho2", icmp()), (
+                                      (1, "IcmpHandle"),
+                                      (1, "Event"),
+                                      (1, "ApcRoutine"),
+                                      (1, "ApcContext"),
+                                      (1, "SourceAddress"),
+                                      (1, "DestinationAddress"),
+                                      (1, "RequestData"),
+                                      (1, "RequestSize"),
+                                      (1, "RequestOptions"),
+                                      (1, "ReplyBuffer"),
+                                      (1, "ReplySize"),
+                                      (1, "Timeout"))))
+    fun.errcheck = Icmp6SendEcho2_errcheck
+    return fun
+
+
+def Icmp6ParseReplies_errcheck(res, func, args):
+    if res == 0:
+        errno = GetLastError()
+        if errno in errno_map:
+            raise errno_map[errno](0, "Icmp6ParseReplies failed", None, errno)
+        else:
+            raise OSError(0, "Icmp6ParseReplies failed", None, errno)
+    return args
+
+
+@_prototype
+def Icmp6ParseReplies():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.DWORD,
+                              use_last_error=True)(
+                                  ("Icmp6ParseReplies", icmp()), (
+                                      (1, "ReplyBuffer"),
+                                      (1, "ReplySize"))))
+    fun.errcheck = Icmp6ParseReplies_errcheck
+    return fun
+
+
+def IcmpSendEcho2_errcheck(res, func, args):
+    if res == 0:
+        errno = GetLastError()
+        if errno == ERROR_IO_PENDING:
+            pass
+        elif errno in errno_map:
+            raise errno_map[errno](0, "IcmpSendEcho2 failed", None, errno)
+        else:
+            raise OSError(0, "IcmpSendEcho2 failed", None, errno)
+    return args
+
+
+@_prototype
+def IcmpSendEcho2():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.LPVOID,
+                              IPAddr,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.WORD,
+                              ctypes.POINTER(IP_OPTION_INFORMATION),
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.DWORD,
+                              ctypes.wintypes.DWORD,
+                              use_last_error=True)(
+                                  ("IcmpSendEcho2", icmp()), (
+                                      (1, "IcmpHandle"),
+                                      (1, "Event"),
+                                      (1, "ApcRoutine"),
+                                      (1, "ApcContext"),
+                                      (1, "DestinationAddress"),
+                                      (1, "RequestData"),
+                                      (1, "RequestSize"),
+                                      (1, "RequestOptions"),
+                                      (1, "ReplyBuffer"),
+                                      (1, "ReplySize"),
+                                      (1, "Timeout"))))
+    fun.errcheck = IcmpSendEcho2_errcheck
+    return fun
+
+
+def IcmpSendEcho2Ex_errcheck(res, func, args):
+    if res == 0:
+        errno = GetLastError()
+        if errno == ERROR_IO_PENDING:
+            pass
+        elif errno in errno_map:
+            raise errno_map[errno](0, "IcmpSendEcho2Ex failed", None, errno)
+        else:
+            raise OSError(0, "IcmpSendEcho2Ex failed", None, errno)
+    return args
+
+
+@_prototype
+def IcmpSendEcho2Ex():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.LPVOID,
+                              IPAddr,
+                              IPAddr,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.WORD,
+                              ctypes.POINTER(IP_OPTION_INFORMATION),
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.DWORD,
+                              ctypes.wintypes.DWORD,
+                              use_last_error=True)(
+                                  ("IcmpSendEcho2Ex", icmp()), (
+                                      (1, "IcmpHandle"),
+                                      (1, "Event"),
+                                      (1, "ApcRoutine"),
+                                      (1, "ApcContext"),
+                                      (1, "SourceAddress"),
+                                      (1, "DestinationAddress"),
+                                      (1, "RequestData"),
+                                      (1, "RequestSize"),
+                                      (1, "RequestOptions"),
+                                      (1, "ReplyBuffer"),
+                                      (1, "ReplySize"),
+                                      (1, "Timeout"))))
+    fun.errcheck = IcmpSendEcho2Ex_errcheck
+    return fun
+
+
+def IcmpParseReplies_errcheck(res, func, args):
+    if res == 0:
+        errno = GetLastError()
+        if errno in errno_map:
+            raise errno_map[errno](0, "IcmpParseReplies failed", None, errno)
+        else:
+            raise OSError(0, "IcmpParseReplies failed", None, errno)
+    return args
+
+
+@_prototype
+def IcmpParseReplies():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.DWORD,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.DWORD,
+                              use_last_error=True)(
+                                  ("IcmpParseReplies", icmp()), (
+                                      (1, "ReplyBuffer"),
+                                      (1, "ReplySize"))))
+    fun.errcheck = IcmpParseReplies_errcheck
+    return fun
+
+
+def CreateEvent_errcheck(res, func, args):
+    if not res:
+        errno = GetLastError()
+        raise OSError(0, "CreateEventW failed", None, errno)
+    return args
+
+
+@_prototype
+def CreateEvent():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.BOOL,
+                              ctypes.wintypes.BOOL,
+                              ctypes.wintypes.LPCWSTR,
+                              use_last_error=True)(
+                                  ("CreateEventW", kernel()), (
+                                      (1, "lpEventAttributes"),
+                                      (1, "bManualReset"),
+                                      (1, "bInitialState"),
+                                      (1, "lpName"))))
+    fun.errcheck = CreateEvent_errcheck
+    return fun
+
+
+@_prototype
+def CloseHandle():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.BOOL,
+                              ctypes.wintypes.HANDLE,
+                              use_last_error=True)(
+                                  ("CloseHandle", kernel()), (
+                                      (1, "hObject"),)))
+    return fun
+
+
+@_prototype
+def WAITORTIMERCALLBACK():
+    return ctypes.WINFUNCTYPE(None,
+                              ctypes.wintypes.LPVOID,
+                              ctypes.wintypes.BOOLEAN)
+
+
+def RegisterWaitForSingleObject_errcheck(res, func, args):
+    if not res:
+        errno = GetLastError()
+        raise OSError(0, "RegisterWaitForSingleObject failed", None, errno)
+    return args
+
+
+@_prototype
+def RegisterWaitForSingleObject():
+    fun = (ctypes.WINFUNCTYPE(
+        ctypes.wintypes.BOOL,
+        ctypes.POINTER(ctypes.wintypes.HANDLE),
+        ctypes.wintypes.HANDLE,
+        _bound('WAITORTIMERCALLBACK'),
+        ctypes.wintypes.LPVOID,
+        ctypes.wintypes.ULONG,
+        ctypes.wintypes.ULONG,
+        use_last_error=True)(
+            ("RegisterWaitForSingleObject", kernel()), (
+                (2, "phNewWaitObject"),
+                (1, "hObject"),
+                (1, "Callback"),
+                (1, "Context"),
+                (1, "dwMilliseconds"),
+                (1, "dwFlags"))))
+    fun.errcheck = RegisterWaitForSingleObject_errcheck
+    return fun
+
+
+@_prototype
+def UnregisterWaitEx():
+    fun = (ctypes.WINFUNCTYPE(ctypes.wintypes.BOOL,
+                              ctypes.wintypes.HANDLE,
+                              ctypes.wintypes.HANDLE,
+                              use_last_error=True)(
+                                  ("UnregisterWaitEx", kernel()), (
+                                      (1, "WaitHandle"),
+                                      (1, "CompletionEvent"))))
+    return fun
+
+
+class PendingEcho(object):
+    """ Outstanding echo request signalled via event object.
+
+    Completion is delivered by the system thread pool wait
+    (RegisterWaitForSingleObject) and handed over to the event loop, so no
+    thread is occupied per outstanding request. Buffers referenced by the
+    request are kept alive until completion. """
+
+    _lock = threading.Lock()
+    _pending = set()
+
+    def __init__(self, loop, parse, refs):
+        self.loop = loop
+        self.parse = parse
+        self.refs = refs
+        self.future = loop.create_future()
+        self.event = CreateEvent(None, True, False, None)
+        self.wait_handle = None
+        self.callback = WAITORTIMERCALLBACK(self._signalled)
+        with self._lock:
+            self._pending.add(self)
+
+    def start(self):
+        self.wait_handle = RegisterWaitForSingleObject(self.event,
+                                                       self.callback,
+                                                       None,
+                                                       INFINITE,
+                                                       WT_EXECUTEONLYONCE)
+
+    def _signalled(self, context, timed_out):
+        try:
+            self.loop.call_soon_threadsafe(self._complete)
+        except RuntimeError:
+            # event loop is closed already
+            self._release()
+
+    def _complete(self):
+        try:
+            if not self.future.done():
+                try:
+                    self.future.set_result(self.parse())
+                except OSError as e:
+                    self.future.set_exception(e)
+        finally:
+            self._release()
+
+    def _release(self):
+        if self.wait_handle is not None:
+            UnregisterWaitEx(self.wait_handle, None)
+            self.wait_handle = None
+        if self.event is not None:
+            CloseHandle(self.event)
+            self.event = None
+        with self._lock:
+            self._pending.discard(self)
+
+    def fail(self, exc):
+        self.future.set_exception(exc)
+        self._release()
+
+
+class Backend(BaseBackend):
+    name = 'windows'
+
+    def create_handle(self):
+        return IcmpCreateFile()
+
+    def create_handle6(self):
+        return Icmp6CreateFile()
+
+    def close_handle(self, handle):
+        IcmpCloseHandle(handle)
+
+    def send_echo(self, handle, address, data, options,
+                  buf, bufsize, timeout, source=None):
+        if source is not None:
+            return IcmpSendEcho2Ex(IcmpHandle=handle,
+                                   Event=None,
+                                   ApcRoutine=None,
+                                   ApcContext=None,
+                                   SourceAddress=source,
+                                   DestinationAddress=address,
+                                   RequestData=data,
+                                   RequestSize=len(data),
+                                   RequestOptions=options,
+                                   ReplyBuffer=buf,
+                                   ReplySize=bufsize,
+                                   Timeout=timeout)
+        return IcmpSendEcho(IcmpHandle=handle,
+                            DestinationAddress=address,
+                            RequestData=data,
+                            RequestSize=len(data),
+                            RequestOptions=options,
+                            ReplyBuffer=buf,
+                            ReplySize=bufsize,
+                            Timeout=timeout)
+
+    def send_echo6(self, handle, source, address, data, options,
+                   buf, bufsize, timeout):
+        count = Icmp6SendEcho2(IcmpHandle=handle,
+                               Event=None,
+                               ApcRoutine=None,
+                               ApcContext=None,
+                               SourceAddress=source,
+                               DestinationAddress=ctypes.byref(address),
+                               RequestData=data,
+                               RequestSize=len(data),
+                               RequestOptions=options,
+                               ReplyBuffer=buf,
+                               ReplySize=bufsize,
+                               Timeout=timeout)
+        Icmp6ParseReplies(ReplyBuffer=buf, ReplySize=bufsize)
+        return count
+
+    def send_echo_async(self, handle, address, data, options,
+                        buf, bufsize, timeout, loop, source=None):
+        def parse():
+            return IcmpParseReplies(ReplyBuffer=buf, ReplySize=bufsize)
+
+        pending = PendingEcho(loop, parse,
+                              (source, address, data, options, buf))
+        try:
+            if source is not None:
+                IcmpSendEcho2Ex(IcmpHandle=handle,
+                                Event=pending.event,
+                                ApcRoutine=None,
+                                ApcContext=None,
+                                SourceAddress=source,
+                                DestinationAddress=address,
+                                RequestData=data,
+                                RequestSize=len(data),
+                                RequestOptions=options,
+                                ReplyBuffer=buf,
+                                ReplySize=bufsize,
+                                Timeout=timeout)
+            else:
+                IcmpSendEcho2(IcmpHandle=handle,
+                              Event=pending.event,
+                              ApcRoutine=None,
+                              ApcContext=None,
+                              DestinationAddress=address,
+                              RequestData=data,
+                              RequestSize=len(data),
+                              RequestOptions=options,
+                              ReplyBuffer=buf,
+                              ReplySize=bufsize,
+                              Timeout=timeout)
+            pending.start()
+        except OSError as e:
+            pending.fail(e)
+        return pending.future
+
+    def send_echo6_async(self, handle, source, address, data, options,
+                         buf, bufsize, timeout, loop):
+        def parse():
+            return Icmp6ParseReplies(ReplyBuffer=buf, ReplySize=bufsize)
+
+        pending = PendingEcho(loop, parse,
+                              (source, address, data, options, buf))
+        try:
+            Icmp6SendEcho2(IcmpHandle=handle,
+                           Event=pending.event,
+                           ApcRoutine=None,
+                           ApcContext=None,
+                           SourceAddress=source,
+                           DestinationAddress=ctypes.byref(address),
+                           RequestData=data,
+                           RequestSize=len(data),
+                           RequestOptions=options,
+                           ReplyBuffer=buf,
+                           ReplySize=bufsize,
+                           Timeout=timeout)
+            pending.start()
+        except OSError as e:
+            pending.fail(e)
+        return pending.future
@@ -0,0 +1,220 @@
+import asyncio
+import os
+import socket
+import time
+
+from .structs import *
+from .columns import ResultColumns
+from .defaults import DEFAULT_CONCURRENCY
+from . import (IcmpHandle, Icmp6Handle, async_ping, async_ping6,
+               _send_async, _send6_async)
+
+__all__ = [
+    'ping_many',
+    'sweep',
+]
+
+NAN = float('nan')
+
+
+class BatchPinger(object):
+    """ Shares one handle per address family, along with its reply buffer
+    pool, between concurrent echo requests of a single event loop. With
+    AdaptiveTimeouts request timeout is chosen per target and outcomes are
+    fed back to it. With TimestampedPayload ping() sends its data and stamps
+    replies with microsecond RTT. """
+
+    def __init__(self, loop, *, timeout=1000, data=None, expected_count=1,
+                 backend=None, resolver=None, profile=None, timeouts=None,
+                 payload=None):
+        self.loop = loop
+        self.timeout = timeout
+        self.timeouts = timeouts
+        self.payload = payload
+        self.data = os.urandom(32) if data is None else data
+        self.expected_count = expected_count
+        self.backend = backend
+        self.resolver = resolver
+        self.profile = profile
+        self.handle = None
+        self.handle6 = None
+
+    async def _address(self, target):
+        """ Returns pair (address, address family) of target. Without
+        resolver targets are expected to be IP address literals. """
+        if self.resolver is not None:
+            return await self.resolver.resolve(target)
+        return target, socket.AF_INET6 if ':' in target else socket.AF_INET
+
+    def _timeout(self, target):
+        if self.timeouts is None:
+            return self.timeout
+        return self.timeouts.timeout(target)
+
+    async def ping(self, target):
+        """ Returns pair (target, replies) or (target, exception) """
+        timeout = self._timeout(target)
+        payload = self.payload
+        try:
+            address, af = await self._address(target)
+            data = self.data if payload is None else payload.next()
+            if af == socket.AF_INET6:
+                if self.handle6 is None:
+                    self.handle6 = Icmp6Handle(self.backend)
+                result = await async_ping6(
+                    self.handle6, address, timeout=timeout,
+                    data=data, expected_count=self.expected_count,
+                    profile=self.profile)
+            else:
+                if self.handle is None:
+                    self.handle = IcmpHandle(self.backend)
+                result = await async_ping(
+                    self.handle, address, timeout=timeout,
+                    data=data, expected_count=self.expected_count,
+                    profile=self.profile)
+        except OSError as e:
+            result = e
+        else:
+            if payload is not None:
+                payload.stamp(result)
+        if self.timeouts is not None:
+            self.timeouts.add_result(target, result)
+        return target, result
+
+    async def record(self, target, sink):
+        """ Writes outcome of echo request into ResultColumns sink straight
+        from reply buffer, without building reply objects """
+        profile = self.profile
+        options = profile.options if profile is not None else None
+        timeout = self._timeout(target)
+        try:
+            address, af = await self._address(target)
+            if af == socket.AF_INET6:
+                if self.handle6 is None:
+                    self.handle6 = Icmp6Handle(self.backend)
+                lease, count = await _send6_async(
+                    self.handle6, address, timeout, self.data,
+                    self.expected_count, options,
+                    profile and profile.source6())
+                replies = (ICMPV6_ECHO_REPLY * count).from_buffer(lease.buf)
+            else:
+                if self.handle is None:
+                    self.handle = IcmpHandle(self.backend)
+                lease, count = await _send_async(
+                    self.handle, address, timeout, self.data,
+                    self.expected_count, options,
+                    profile and profile.source4())
+                replies = (ICMP_ECHO_REPLY * count).from_buffer(lease.buf)
+        except OSError as e:
+            sink.add_result(target, e)
+            if self.timeouts is not None:
+                self.timeouts.add_result(target, e)
+            return
+        timestamp = time.time()
+        timeouts = self.timeouts
+        for r in replies:
+            status = r.Status
+            if status:
+                sink.add(target, status, NAN, 0, timestamp)
+                if timeouts is not None:
+                    timeouts.failure(target, status)
+            else:
+                ttl = r.Options.Ttl if hasattr(r, 'Options') else 0
+                sink.add(target, status, r.RoundTripTime, ttl, timestamp)
+                if timeouts is not None:
+                    timeouts.observe(target, r.RoundTripTime)
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        if self.handle6 is not None:
+            self.handle6.close()
+            self.handle6 = None
+
+
+def _run_bounded(loop, coros, concurrency):
+    """ Runs coroutines from iterable on loop, keeping at most concurrency of
+    them scheduled. Yields results in order of completion. """
+    if concurrency <= 0:
+        raise ValueError("concurrency must be positive")
+    pending = set()
+    coros = iter(coros)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    coro = next(coros)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    pending.add(loop.create_task(coro))
+            if not pending:
+                break
+            done, pending = loop.run_until_complete(
+                asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED))
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.wait(pending))
+
+
+def _probed(targets, timeouts):
+    if timeouts is None:
+        return targets
+    return (target for target in targets if timeouts.should_probe(target))
+
+
+def ping_many(targets, *, concurrency=DEFAULT_CONCURRENCY, timeout=1000,
+              data=None, expected_count=1, backend=None, resolver=None,
+              profile=None, timeouts=None):
+    """ Pings IPv4 and IPv6 addresses from targets iterable concurrently.
+
+    At most concurrency requests are in flight at any moment. Yields pairs
+    (target, replies) or (target, exception) in order of completion. If
+    Resolver is given, targets may also be host names. Echo request options
+    are taken from ProbeProfile, if any. If AdaptiveTimeouts is given, it
+    sets timeout of each request instead of timeout argument and targets
+    backed off by it are skipped. """
+    loop = asyncio.new_event_loop()
+    pinger = BatchPinger(loop, timeout=timeout, data=data,
+                         expected_count=expected_count, backend=backend,
+                         resolver=resolver, profile=profile,
+                         timeouts=timeouts)
+    try:
+        for res in _run_bounded(loop, (pinger.ping(target)
+                                       for target in _probed(targets,
+                                                             timeouts)),
+                                concurrency):
+            yield res
+    finally:
+        pinger.close()
+        loop.close()
+
+
+def sweep(targets, sink=None, *, concurrency=DEFAULT_CONCURRENCY,
+          timeout=1000, data=None, expected_count=1, backend=None,
+          resolver=None, profile=None, timeouts=None):
+    """ Pings targets like ping_many(), but records results into
+    ResultColumns sink instead of yielding reply objects. Returns sink. """
+    if sink is None:
+        sink = ResultColumns()
+    loop = asyncio.new_event_loop()
+    pinger = BatchPinger(loop, timeout=timeout, data=data,
+                         expected_count=expected_count, backend=backend,
+                         resolver=resolver, profile=profile,
+                         timeouts=timeouts)
+    try:
+        for _ in _run_bounded(loop, (pinger.record(target, sink)
+                                     for target in _probed(targets,
+                                                           timeouts)),
+                              concurrency):
+            pass
+    finally:
+        pinger.close()
+        loop.close()
+    return sink
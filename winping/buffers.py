@@ -0,0 +1,71 @@
+import ctypes
+
+__all__ = [
+    'BufferPool',
+    'BufferLease',
+]
+
+
+class BufferPool(object):
+    """ Free list of ctypes reply buffers.
+
+    acquire() hands out free buffer big enough for request or
+    allocates new one, release() returns buffer for reuse. At most max_free
+    buffers are retained. Free buffer too small for request is dropped and
+    counted in dropped, as putting it back would leave it on top of the
+    list for the next caller.
+
+    Leases may be released from other threads while pool is in use, e.g.
+    by replies outliving HandlePool checkout, so free list is changed only
+    by atomic pop() and append() calls. """
+
+    def __init__(self, max_free=1024):
+        self.max_free = max_free
+        self.free = []
+        self.allocated = 0
+        self.allocated_bytes = 0
+        self.reused = 0
+        self.dropped = 0
+
+    def acquire(self, size):
+        # buffers are released in LIFO order and are mostly of same size,
+        # so the last one fits in common case. Size is checked only after
+        # buffer is taken, as the list may change in between.
+        try:
+            buf = self.free.pop()
+        except IndexError:
+            pass
+        else:
+            if len(buf) >= size:
+                self.reused += 1
+                return buf
+            self.dropped += 1
+        self.allocated += 1
+        self.allocated_bytes += size
+        return ctypes.create_string_buffer(size)
+
+    def release(self, buf):
+        if len(self.free) < self.max_free:
+            self.free.append(buf)
+
+    def lease(self, size):
+        return BufferLease(self, self.acquire(size))
+
+    def clear(self):
+        self.free = []
+
+
+class BufferLease(object):
+    """ Returns buffer to the pool once last reference to lease is gone.
+
+    Replies referencing reply buffer hold the lease, so buffer is not reused
+    while any of them is alive. """
+
+    __slots__ = ('pool', 'buf')
+
+    def __init__(self, pool, buf):
+        self.pool = pool
+        self.buf = buf
+
+    def __del__(self):
+        self.pool.release(self.buf)
@@ -0,0 +1,258 @@
+import array
+import collections
+import math
+import struct
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .errors import get_status
+from .payload import reply_rtt
+
+__all__ = [
+    'ResultColumns',
+    'ColumnStats',
+]
+
+IP_SUCCESS = 0
+IP_REQ_TIMED_OUT = 11010
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+# row count prefix of serialized columns
+_ROWS = struct.Struct('=I')
+
+
+ColumnStats = collections.namedtuple('ColumnStats', [
+    'sent',
+    'received',
+    'lost',
+    'loss',
+    'min',
+    'max',
+    'avg',
+    'percentiles',
+])
+
+
+def _percentile(sorted_values, q):
+    # linear interpolation between closest ranks, same as numpy default
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class ResultColumns(object):
+    """ Compact columnar storage of probe results.
+
+    Each result occupies one row of typed arrays: target index, status code,
+    round trip time in milliseconds, TTL and timestamp. Statistics are
+    computed over whole columns, vectorized with NumPy when it is
+    available. """
+
+    def __init__(self, targets=()):
+        self.targets = []
+        self.index = {}
+        self.target = array.array('I')
+        self.status = array.array('I')
+        self.rtt = array.array('d')
+        self.ttl = array.array('B')
+        self.timestamp = array.array('d')
+        for target in targets:
+            self.target_index(target)
+
+    def __len__(self):
+        return len(self.status)
+
+    def target_index(self, target):
+        try:
+            return self.index[target]
+        except KeyError:
+            idx = self.index[target] = len(self.targets)
+            self.targets.append(target)
+            return idx
+
+    def add(self, target, status, rtt=float('nan'), ttl=0, timestamp=None):
+        self.target.append(self.target_index(target))
+        self.status.append(status)
+        self.rtt.append(rtt)
+        self.ttl.append(ttl)
+        self.timestamp.append(time.time() if timestamp is None else timestamp)
+
+    def add_result(self, target, result, timestamp=None):
+        """ Records outcome of ping()-like call: list of replies or
+        exception instance. Exceptions without status code are ignored. """
+        if timestamp is None:
+            timestamp = time.time()
+        if isinstance(result, OSError):
+            status = get_status(result)
+            if status:
+                self.add(target, status, timestamp=timestamp)
+            return
+        for rep in result:
+            if rep.Status == IP_SUCCESS:
+                options = getattr(rep, 'Options', None)
+                self.add(target, IP_SUCCESS, reply_rtt(rep),
+                         options.Ttl if options is not None else 0,
+                         timestamp)
+            else:
+                self.add(target, rep.Status, timestamp=timestamp)
+
+    def clear(self):
+        for col in (self.target, self.status, self.rtt, self.ttl,
+                    self.timestamp):
+            del col[:]
+
+    def dumps(self, index_offset=0):
+        """ Serializes rows into compact native byte order form for loads().
+        index_offset is added to target indices, so rows of a slice of
+        targets may be loaded into columns holding whole list. """
+        target = self.target
+        if index_offset:
+            target = array.array('I', [idx + index_offset for idx in target])
+        return b''.join((_ROWS.pack(len(self.status)), target.tobytes(),
+                         self.status.tobytes(), self.rtt.tobytes(),
+                         self.ttl.tobytes(), self.timestamp.tobytes()))
+
+    def loads(self, data):
+        """ Appends rows serialized by dumps() on the same machine. Target
+        indices must refer to targets of this instance. """
+        data = memoryview(data)
+        count, = _ROWS.unpack_from(data)
+        pos = _ROWS.size
+        for col in (self.target, self.status, self.rtt, self.ttl,
+                    self.timestamp):
+            size = count * col.itemsize
+            col.frombytes(data[pos:pos + size])
+            pos += size
+
+    def as_numpy(self):
+        """ Returns dict of zero-copy NumPy views over columns """
+        if numpy is None:
+            raise RuntimeError("NumPy is not available")
+        return {
+            'target': numpy.frombuffer(self.target, dtype=numpy.uint32),
+            'status': numpy.frombuffer(self.status, dtype=numpy.uint32),
+            'rtt': numpy.frombuffer(self.rtt, dtype=numpy.float64),
+            'ttl': numpy.frombuffer(self.ttl, dtype=numpy.uint8),
+            'timestamp': numpy.frombuffer(self.timestamp,
+                                          dtype=numpy.float64),
+        }
+
+    def stats(self, target=None, percentiles=DEFAULT_PERCENTILES):
+        """ Loss and RTT statistics for single target or all results """
+        idx = None if target is None else self.index.get(target, -1)
+        if numpy is not None and len(self.status):
+            return self._stats_numpy(idx, percentiles)
+        return self._stats_python(idx, percentiles)
+
+    def stats_by_target(self, percentiles=DEFAULT_PERCENTILES):
+        """ Statistics for every target computed in single pass over
+        columns. Returns ordered dict target -> ColumnStats. """
+        if numpy is not None and len(self.status):
+            return self._stats_by_target_numpy(percentiles)
+        sent = [0] * len(self.targets)
+        ok = [[] for _ in self.targets]
+        for idx, status, rtt in zip(self.target, self.status, self.rtt):
+            sent[idx] += 1
+            if status == IP_SUCCESS:
+                ok[idx].append(rtt)
+        res = collections.OrderedDict()
+        for target, count, values in zip(self.targets, sent, ok):
+            values.sort()
+            res[target] = self._make_stats(
+                count, len(values),
+                lambda: (values[0], values[-1], sum(values) / len(values),
+                         tuple(_percentile(values, q) for q in percentiles)),
+                percentiles)
+        return res
+
+    def _stats_by_target_numpy(self, percentiles):
+        ntargets = len(self.targets)
+        cols = self.as_numpy()
+        target = cols['target']
+        ok = cols['status'] == IP_SUCCESS
+        ok_target, ok_rtt = target[ok], cols['rtt'][ok]
+        sent = numpy.bincount(target, minlength=ntargets)
+        received = numpy.bincount(ok_target, minlength=ntargets)
+        sums = numpy.bincount(ok_target, weights=ok_rtt, minlength=ntargets)
+        # sort successful RTTs by target, then by value, so each target
+        # occupies contiguous sorted run starting at starts[target]
+        sorted_rtt = ok_rtt[numpy.lexsort((ok_rtt, ok_target))]
+        starts = numpy.cumsum(received) - received
+        top = numpy.maximum(received - 1, 0)
+        columns = []
+        if len(sorted_rtt):
+            limit = len(sorted_rtt) - 1
+            columns.append(sorted_rtt[numpy.minimum(starts, limit)])
+            columns.append(sorted_rtt[numpy.minimum(starts + top, limit)])
+            for q in percentiles:
+                pos = top * (q / 100.)
+                lo = numpy.floor(pos).astype(numpy.int64)
+                hi = numpy.minimum(lo + 1, top)
+                lo_v = sorted_rtt[numpy.minimum(starts + lo, limit)]
+                hi_v = sorted_rtt[numpy.minimum(starts + hi, limit)]
+                columns.append(lo_v + (hi_v - lo_v) * (pos - lo))
+        res = collections.OrderedDict()
+        for i, target in enumerate(self.targets):
+            n, r = int(sent[i]), int(received[i])
+            if r:
+                values = [float(col[i]) for col in columns]
+                res[target] = ColumnStats(
+                    n, r, n - r, 100 * (n - r) / n,
+                    values[0], values[1], float(sums[i]) / r,
+                    collections.OrderedDict(zip(percentiles, values[2:])))
+            else:
+                res[target] = self._make_stats(n, 0, None, percentiles)
+        return res
+
+    def _stats_numpy(self, idx, percentiles):
+        cols = self.as_numpy()
+        status, rtt = cols['status'], cols['rtt']
+        if idx is not None:
+            mask = cols['target'] == idx
+            status, rtt = status[mask], rtt[mask]
+        ok = rtt[status == IP_SUCCESS]
+        return self._make_stats(
+            len(status), len(ok),
+            lambda: (float(ok.min()), float(ok.max()), float(ok.mean()),
+                     tuple(float(v) for v in
+                           numpy.percentile(ok, percentiles))),
+            percentiles)
+
+    def _stats_python(self, idx, percentiles):
+        if idx is None:
+            rows = zip(self.status, self.rtt)
+        else:
+            rows = ((s, r) for t, s, r in
+                    zip(self.target, self.status, self.rtt) if t == idx)
+        sent = 0
+        ok = []
+        for status, rtt in rows:
+            sent += 1
+            if status == IP_SUCCESS:
+                ok.append(rtt)
+        ok.sort()
+        return self._make_stats(
+            sent, len(ok),
+            lambda: (ok[0], ok[-1], sum(ok) / len(ok),
+                     tuple(_percentile(ok, q) for q in percentiles)),
+            percentiles)
+
+    @staticmethod
+    def _make_stats(sent, received, rtt_stats, percentiles):
+        if received:
+            min_rtt, max_rtt, avg_rtt, pct = rtt_stats()
+            pct = collections.OrderedDict(zip(percentiles, pct))
+        else:
+            min_rtt = max_rtt = avg_rtt = float('nan')
+            pct = collections.OrderedDict((q, float('nan'))
+                                          for q in percentiles)
+        lost = sent - received
+        return ColumnStats(sent, received, lost,
+                           100 * lost / sent if sent else 0.,
+                           min_rtt, max_rtt, avg_rtt, pct)
@@ -0,0 +1,20 @@
+""" Default parameters of library modules which command line utility shows
+in its help. They live apart from the modules, so argument parser is built
+without importing modules the selected mode does not use. """
+
+# requests in flight of batch calls
+DEFAULT_CONCURRENCY = 256
+
+# StateTracker window in seconds and loss percent above which target is
+# degraded
+DEFAULT_STATE_WINDOW = 30.
+DEFAULT_MAX_LOSS = 20.
+
+DEFAULT_MAX_HOPS = 30
+
+# metrics endpoint of exporter
+DEFAULT_LISTEN = '127.0.0.1'
+DEFAULT_PORT = 9469
+
+# names of winping.output.writers
+OUTPUT_FORMATS = ('bin', 'csv', 'jsonl')
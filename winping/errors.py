@@ -1,3 +1,27 @@
+__all__ = [
+    'IcmpException',
+    'BufferTooSmall',
+    'DestinationNetUnreachable',
+    'DestinationHostUnreachable',
+    'DestinationProtocolUnreachable',
+    'DestinationPortUnreachable',
+    'NoResources',
+    'BadOption',
+    'HardwareError',
+    'PacketTooBig',
+    'RequestTimedOut',
+    'BadRequest',
+    'BadRoute',
+    'TTLExpiredInTransit',
+    'TTLExpiredOnReassembly',
+    'ParameterProblem',
+    'SourceQuench',
+    'OptionTooBig',
+    'BadDestination',
+    'GeneralFailure',
+]
+
+
 class IcmpException(OSError):
     pass
 
@@ -79,3 +103,12 @@ errno_map = {
     11018: BadDestination,
     11050: GeneralFailure,
 }
+
+
+def get_status(exc):
+    """ Returns IP_STATUS code carried by exception raised by ping
+    functions, or None """
+    status = getattr(exc, 'winerror', None)
+    if status is None and len(exc.args) > 3:
+        status = exc.args[3]
+    return status
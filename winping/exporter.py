@@ -0,0 +1,265 @@
+import asyncio
+import collections
+import os
+import time
+
+from .errors import *
+from .errors import errno_map
+from .payload import reply_rtt
+from .batch import BatchPinger, DEFAULT_CONCURRENCY
+from .defaults import DEFAULT_LISTEN, DEFAULT_PORT
+from .scheduler import IntervalScheduler
+
+__all__ = [
+    'Exporter',
+    'PromHistogram',
+]
+
+IP_SUCCESS = 0
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# seconds for client to send request line and headers
+REQUEST_TIMEOUT = 10.
+
+# RTT histogram bucket bounds in seconds
+RTT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.,
+               2.5, 5.)
+
+
+def escape_label(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class PromHistogram(object):
+    """ Cumulative histogram with fixed bucket bounds as exposed by
+    Prometheus """
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=RTT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        for idx, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[idx] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels, out):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            out.append('%s_bucket{%s,le="%r"} %d' %
+                       (name, labels, bound, cumulative))
+        out.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, self.count))
+        out.append('%s_sum{%s} %r' % (name, labels, self.sum))
+        out.append('%s_count{%s} %d' % (name, labels, self.count))
+
+
+class TargetMetrics(object):
+    __slots__ = ('labels', 'sent', 'received', 'errors', 'rtt', 'last_rtt')
+
+    def __init__(self, name, address):
+        self.labels = 'target="%s",address="%s"' % (escape_label(name),
+                                                     escape_label(address))
+        self.sent = 0
+        self.received = 0
+        self.errors = collections.Counter()
+        self.rtt = PromHistogram()
+        self.last_rtt = float('nan')
+
+    def add_result(self, result):
+        if isinstance(result, OSError):
+            self.sent += 1
+            self.errors[type(result).__name__] += 1
+            return
+        for rep in result:
+            self.sent += 1
+            if rep.Status == IP_SUCCESS:
+                self.received += 1
+                self.last_rtt = reply_rtt(rep) / 1000
+                self.rtt.observe(self.last_rtt)
+            else:
+                self.errors[errno_map.get(rep.Status, OSError).__name__] += 1
+
+
+class Exporter(object):
+    """ Probes targets continuously and exposes results in Prometheus text
+    format over HTTP.
+
+    Each target is probed on its own fixed cadence through shared
+    BatchPinger. Besides per-target counters and RTT histograms, probe
+    engine reports its in-flight request count and scheduler lag. Clients
+    which don't send whole request within request_timeout seconds are
+    disconnected. """
+
+    def __init__(self, loop, targets, *, interval=1., timeout=1000,
+                 data=None, max_inflight=DEFAULT_CONCURRENCY, profile=None,
+                 backend=None, request_timeout=REQUEST_TIMEOUT):
+        self.loop = loop
+        self.request_timeout = request_timeout
+        self.targets = collections.OrderedDict(targets)
+        self.interval = interval
+        self.pinger = BatchPinger(loop, timeout=timeout,
+                                  data=os.urandom(32) if data is None else data,
+                                  expected_count=1, backend=backend,
+                                  profile=profile)
+        self.max_inflight = max_inflight
+        self.metrics = collections.OrderedDict(
+            (name, TargetMetrics(name, address))
+            for name, address in self.targets.items())
+        self.schedulers = {}
+        self.inflight = 0
+        self.scrapes = 0
+        self.started = time.time()
+        self.tasks = []
+        self.server = None
+
+    async def _probe_target(self, name, semaphore):
+        scheduler = self.schedulers[name] = IntervalScheduler(self.interval)
+        scheduler.tick()
+        metrics = self.metrics[name]
+        while True:
+            async with semaphore:
+                self.inflight += 1
+                try:
+                    _, res = await self.pinger.ping(self.targets[name])
+                finally:
+                    self.inflight -= 1
+            metrics.add_result(res)
+            await scheduler.wait()
+
+    def start_probes(self):
+        semaphore = asyncio.Semaphore(self.max_inflight)
+        self.tasks = [asyncio.ensure_future(self._probe_target(name,
+                                                               semaphore))
+                      for name in self.targets]
+
+    async def start(self, host=DEFAULT_LISTEN, port=DEFAULT_PORT):
+        """ Starts probing and HTTP server. Returns bound (host, port) pair,
+        so port 0 may be used to pick free port. """
+        self.start_probes()
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+        self.tasks = []
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.pinger.close()
+
+    async def _read_request(self, reader):
+        """ Returns request line, skipping headers """
+        request = await reader.readline()
+        while True:
+            line = await reader.readline()
+            if not line or line in (b'\r\n', b'\n'):
+                break
+        return request
+
+    async def _handle(self, reader, writer):
+        try:
+            # single deadline for whole request, so client trickling
+            # header lines doesn't hold connection open either
+            request = await asyncio.wait_for(self._read_request(reader),
+                                             self.request_timeout)
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] not in ('GET', 'HEAD'):
+                status, body = '405 Method Not Allowed', b''
+            elif parts[1].split('?', 1)[0] != '/metrics':
+                status, body = '404 Not Found', b''
+            else:
+                self.scrapes += 1
+                status, body = '200 OK', self.render().encode('utf-8')
+            writer.write(('HTTP/1.0 %s\r\n'
+                          'Content-Type: %s\r\n'
+                          'Content-Length: %d\r\n'
+                          'Connection: close\r\n\r\n' %
+                          (status, CONTENT_TYPE, len(body))).encode('ascii'))
+            if parts[:1] != ['HEAD']:
+                writer.write(body)
+            await writer.drain()
+        except (OSError, UnicodeDecodeError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    def render(self):
+        out = []
+
+        def family(name, kind, help_text):
+            out.append('# HELP %s %s' % (name, help_text))
+            out.append('# TYPE %s %s' % (name, kind))
+
+        family('winping_probes_sent_total', 'counter',
+               'Echo requests sent.')
+        for m in self.metrics.values():
+            out.append('winping_probes_sent_total{%s} %d' % (m.labels, m.sent))
+        family('winping_probes_received_total', 'counter',
+               'Echo replies received.')
+        for m in self.metrics.values():
+            out.append('winping_probes_received_total{%s} %d' %
+                       (m.labels, m.received))
+        family('winping_probes_lost_total', 'counter',
+               'Echo requests without successful reply.')
+        for m in self.metrics.values():
+            out.append('winping_probes_lost_total{%s} %d' %
+                       (m.labels, m.sent - m.received))
+        family('winping_probe_errors_total', 'counter',
+               'Failed echo requests by exception class.')
+        for m in self.metrics.values():
+            for error, count in sorted(m.errors.items()):
+                out.append('winping_probe_errors_total{%s,error="%s"} %d' %
+                           (m.labels, error, count))
+        family('winping_rtt_seconds', 'histogram',
+               'Round trip time of successful echo requests.')
+        for m in self.metrics.values():
+            m.rtt.render('winping_rtt_seconds', m.labels, out)
+        family('winping_last_rtt_seconds', 'gauge',
+               'Round trip time of last successful echo request.')
+        for m in self.metrics.values():
+            if m.received:
+                out.append('winping_last_rtt_seconds{%s} %r' %
+                           (m.labels, m.last_rtt))
+
+        schedulers = list(self.schedulers.values())
+        family('winping_inflight_probes', 'gauge',
+               'Echo requests awaiting reply.')
+        out.append('winping_inflight_probes %d' % (self.inflight,))
+        family('winping_inflight_limit', 'gauge',
+               'Maximal number of echo requests awaiting reply.')
+        out.append('winping_inflight_limit %d' % (self.max_inflight,))
+        family('winping_scheduler_lag_seconds', 'gauge',
+               'Largest lateness of last probe tick among targets.')
+        out.append('winping_scheduler_lag_seconds %r' %
+                   (max((s.lag for s in schedulers), default=0.),))
+        family('winping_scheduler_max_lag_seconds', 'gauge',
+               'Largest lateness of probe tick since start.')
+        out.append('winping_scheduler_max_lag_seconds %r' %
+                   (max((s.max_lag for s in schedulers), default=0.),))
+        family('winping_scheduler_skipped_ticks_total', 'counter',
+               'Probe ticks skipped because probing fell behind schedule.')
+        out.append('winping_scheduler_skipped_ticks_total %d' %
+                   (sum(s.skipped for s in schedulers),))
+        family('winping_targets', 'gauge', 'Number of probed targets.')
+        out.append('winping_targets %d' % (len(self.targets),))
+        family('winping_scrapes_total', 'counter',
+               'Requests to metrics endpoint.')
+        out.append('winping_scrapes_total %d' % (self.scrapes,))
+        family('winping_start_time_seconds', 'gauge',
+               'Start time of exporter since unix epoch.')
+        out.append('winping_start_time_seconds %r' % (self.started,))
+        out.append('')
+        return '\n'.join(out)
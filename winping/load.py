@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import os
+import time
+
+from .batch import BatchPinger, DEFAULT_CONCURRENCY
+from .payload import TimestampedPayload, PAYLOAD_HEADER
+from .scheduler import TokenBucket
+from .stats import RttStats
+
+__all__ = [
+    'LoadGenerator',
+    'LoadReport',
+]
+
+DEFAULT_REPORT_INTERVAL = 1.
+
+
+class LoadReport(object):
+    """ Outcome of one report interval of LoadGenerator.
+
+    sent is number of requests sent during interval, stats is RttStats of
+    requests completed during it, so reply rate lags send rate by RTT.
+    missed is number of requests generator failed to send on time, either
+    because max_inflight requests were outstanding or because it was short
+    of CPU. """
+
+    __slots__ = ('elapsed', 'duration', 'sent', 'stats', 'inflight',
+                 'missed')
+
+    def __init__(self, elapsed, duration, sent, stats, inflight, missed):
+        self.elapsed = elapsed
+        self.duration = duration
+        self.sent = sent
+        self.stats = stats
+        self.inflight = inflight
+        self.missed = missed
+
+    @property
+    def send_rate(self):
+        return self.sent / self.duration if self.duration > 0 else 0.
+
+    @property
+    def reply_rate(self):
+        return (self.stats.received / self.duration
+                if self.duration > 0 else 0.)
+
+
+class LoadGenerator(object):
+    """ Sends echo requests to targets in round robin at given rate per
+    second, paced by TokenBucket.
+
+    Requests go through shared BatchPinger with at most max_inflight of them
+    outstanding. If data size allows, requests carry TimestampedPayload, so
+    RTT has microsecond resolution. Every report_interval seconds callback,
+    if any, receives LoadReport: comparing send rate with target rate and
+    reply rate with send rate tells whether generator or target is the
+    limit. """
+
+    def __init__(self, loop, targets, rate, *, size=32, timeout=1000,
+                 burst=None, max_inflight=DEFAULT_CONCURRENCY, backend=None,
+                 profile=None, report_interval=DEFAULT_REPORT_INTERVAL,
+                 callback=None, clock=time.monotonic):
+        self.loop = loop
+        self.targets = list(targets)
+        if not self.targets:
+            raise ValueError("at least one target is required")
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.report_interval = report_interval
+        self.callback = callback
+        self.clock = clock
+        payload = None
+        if size >= PAYLOAD_HEADER.size:
+            payload = TimestampedPayload(size)
+        self.pinger = BatchPinger(loop, timeout=timeout,
+                                  data=os.urandom(size), backend=backend,
+                                  profile=profile, payload=payload)
+        self.bucket = None
+        self.total = RttStats()
+        self.current = RttStats()
+        self.sent = 0
+        self.interval_sent = 0
+        self.inflight = 0
+        self.missed = 0.
+        self.tasks = set()
+        self.waiter = None
+
+    async def _probe(self, target):
+        try:
+            _, result = await self.pinger.ping(target)
+        finally:
+            self.inflight -= 1
+            # generator waiting for free slots is woken up once quarter of
+            # them is available, so it sends in batches
+            waiter = self.waiter
+            if (waiter is not None and not waiter.done() and
+                    self.inflight <= self.max_inflight * 3 // 4):
+                waiter.set_result(None)
+        self.current.add_result(result)
+
+    def _report(self, elapsed, duration):
+        stats = self.current
+        self.current = RttStats()
+        self.total.merge(stats)
+        overflow = self.bucket.overflow
+        missed = int(round(overflow - self.missed))
+        self.missed = overflow
+        report = LoadReport(elapsed, duration, self.interval_sent, stats,
+                            self.inflight, missed)
+        self.interval_sent = 0
+        if self.callback is not None:
+            self.callback(report)
+        return report
+
+    async def run(self, duration=None):
+        """ Generates load for duration seconds or until cancelled, then
+        waits for outstanding requests. Returns RttStats of all completed
+        requests, including ones completed after last report. """
+        loop = self.loop
+        clock = self.clock
+        tasks = self.tasks
+        targets = itertools.cycle(self.targets)
+        bucket = self.bucket = TokenBucket(self.rate, self.burst, clock)
+        interval = self.report_interval
+        start = last_report = clock()
+        next_report = start + interval
+        end = None if duration is None else start + duration
+        try:
+            while True:
+                now = clock()
+                if now >= next_report:
+                    self._report(now - start, now - last_report)
+                    last_report = now
+                    next_report += interval
+                    if next_report <= now:
+                        next_report = now + interval
+                if end is not None and now >= end:
+                    break
+                count = bucket.take(self.max_inflight - self.inflight)
+                if count:
+                    for _ in range(count):
+                        task = loop.create_task(self._probe(next(targets)))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    self.inflight += count
+                    self.sent += count
+                    self.interval_sent += count
+                    # let requests go out before next batch
+                    await asyncio.sleep(0)
+                    continue
+                wake = next_report if end is None else min(next_report, end)
+                if self.inflight >= self.max_inflight:
+                    self.waiter = loop.create_future()
+                    try:
+                        await asyncio.wait((self.waiter,),
+                                           timeout=max(wake - now, 0.))
+                    finally:
+                        self.waiter = None
+                else:
+                    wake = min(wake, now + bucket.delay())
+                    await asyncio.sleep(max(wake - clock(), 0.))
+            if tasks:
+                await asyncio.wait(set(tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.wait(set(tasks))
+            # requests completed after last report are accounted in total
+            self.total.merge(self.current)
+            self.current = RttStats()
+        return self.total
+
+    def close(self):
+        self.pinger.close()
@@ -0,0 +1,139 @@
+import collections
+import time
+
+from .defaults import DEFAULT_STATE_WINDOW, DEFAULT_MAX_LOSS
+from .stats import WindowedRttStats
+
+__all__ = [
+    'StateTracker',
+    'StateChange',
+    'UNKNOWN',
+    'UP',
+    'DEGRADED',
+    'DOWN',
+]
+
+UNKNOWN = 'unknown'
+UP = 'up'
+DEGRADED = 'degraded'
+DOWN = 'down'
+
+STATES = (UP, DEGRADED, DOWN, UNKNOWN)
+
+DEFAULT_WINDOW = DEFAULT_STATE_WINDOW
+DEFAULT_DOWN_COUNT = 3
+
+
+class StateChange(object):
+    """ Transition of target from one state to another. stats is RttStats
+    over state window at the moment of transition. """
+
+    __slots__ = ('timestamp', 'target', 'old', 'new', 'stats')
+
+    def __init__(self, timestamp, target, old, new, stats):
+        self.timestamp = timestamp
+        self.target = target
+        self.old = old
+        self.new = new
+        self.stats = stats
+
+    def as_dict(self):
+        stats = self.stats
+        return collections.OrderedDict([
+            ('timestamp', self.timestamp),
+            ('target', self.target),
+            ('old', self.old),
+            ('new', self.new),
+            ('sent', stats.sent),
+            ('received', stats.received),
+            ('loss', stats.loss),
+            ('rtt', stats.mean if stats.received else None),
+        ])
+
+
+class TargetState(object):
+    __slots__ = ('state', 'window', 'since')
+
+    def __init__(self, window, clock):
+        self.state = UNKNOWN
+        self.window = WindowedRttStats(window, clock=clock)
+        self.since = None
+
+
+class StateTracker(object):
+    """ Keeps state of targets from their recent probe results and reports
+    only transitions.
+
+    State is computed over sliding window of given length in seconds: target
+    is down when at least down_count probes were sent within window and none
+    of them was answered, degraded when loss exceeds max_loss percent or
+    average RTT exceeds max_rtt milliseconds, up otherwise. Target keeps its
+    state while window holds fewer unanswered probes only. Every transition
+    is passed to callback as StateChange. """
+
+    def __init__(self, window=DEFAULT_WINDOW, max_loss=DEFAULT_MAX_LOSS,
+                 max_rtt=None, down_count=DEFAULT_DOWN_COUNT, callback=None,
+                 clock=time.monotonic):
+        self.window = window
+        self.max_loss = max_loss
+        self.max_rtt = max_rtt
+        self.down_count = down_count
+        self.callback = callback
+        self.clock = clock
+        self.targets = collections.OrderedDict()
+        self.changes = 0
+
+    def _target(self, target):
+        try:
+            return self.targets[target]
+        except KeyError:
+            state = self.targets[target] = TargetState(self.window,
+                                                       self.clock)
+            return state
+
+    def classify(self, stats):
+        """ Returns state for RttStats over window """
+        if not stats.sent:
+            return UNKNOWN
+        if not stats.received:
+            # too few probes to tell down target from unlucky one
+            return DOWN if stats.sent >= self.down_count else UNKNOWN
+        if stats.loss > self.max_loss:
+            return DEGRADED
+        if self.max_rtt is not None and stats.mean > self.max_rtt:
+            return DEGRADED
+        return UP
+
+    def state(self, target):
+        state = self.targets.get(target)
+        return UNKNOWN if state is None else state.state
+
+    def add_result(self, target, result, timestamp=None):
+        """ Accounts outcome of ping()-like call: list of replies or
+        exception instance. Returns StateChange if target changed its state,
+        None otherwise. """
+        state = self._target(target)
+        state.window.add_result(result)
+        stats = state.window.current()
+        new = self.classify(stats)
+        if new == state.state or new == UNKNOWN:
+            return None
+        if timestamp is None:
+            timestamp = time.time()
+        event = StateChange(timestamp, target, state.state, new, stats)
+        state.state = new
+        state.since = timestamp
+        self.changes += 1
+        if self.callback is not None:
+            self.callback(event)
+        return event
+
+    def summary(self):
+        """ Returns ordered dict of number of targets by state, along with
+        number of transitions since previous call """
+        res = collections.OrderedDict((state, 0) for state in STATES)
+        for state in self.targets.values():
+            res[state.state] += 1
+        res['changes'] = self.changes
+        self.changes = 0
+        return res
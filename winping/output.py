@@ -0,0 +1,207 @@
+import csv
+import io
+import json
+import math
+import socket
+import struct
+import time
+
+from .errors import get_status
+from .payload import reply_rtt
+
+__all__ = [
+    'RecordWriter',
+    'JsonLinesWriter',
+    'CsvWriter',
+    'BinaryWriter',
+    'read_records',
+    'writers',
+]
+
+IP_SUCCESS = 0
+NAN = float('nan')
+
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_FLUSH_INTERVAL = 1.
+
+FIELDS = ('timestamp', 'target', 'address', 'seq', 'status', 'rtt', 'ttl')
+
+# timestamp, address (IPv4 addresses are IPv4-mapped), seq, status,
+# RTT in milliseconds (NaN if there was no reply), TTL
+BINARY_RECORD = struct.Struct("<d16sIIfB3x")
+V4_MAPPED_PREFIX = b'\x00' * 10 + b'\xff\xff'
+
+
+class RecordWriter(object):
+    """ Writes probe results as machine readable records.
+
+    Encoded records are collected in memory and written to binary stream in
+    batches, once batch_size records are pending or flush_interval seconds
+    passed since last write. """
+
+    def __init__(self, stream, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, clock=time.monotonic):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.pending = []
+        self.last_flush = clock()
+        self.count = 0
+        header = self.header()
+        if header:
+            self.pending.append(header)
+
+    def header(self):
+        return None
+
+    def encode(self, timestamp, target, address, seq, status, rtt, ttl):
+        raise NotImplementedError
+
+    def write(self, target, address, seq, status, rtt=NAN, ttl=0,
+              timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.pending.append(self.encode(timestamp, target, address, seq,
+                                        status, rtt, ttl))
+        self.count += 1
+        if (len(self.pending) >= self.batch_size or
+                self.clock() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def write_result(self, target, address, seq, result, timestamp=None):
+        """ Writes outcome of ping()-like call: list of replies or exception
+        instance. Exceptions without status code are ignored. """
+        if timestamp is None:
+            timestamp = time.time()
+        if isinstance(result, OSError):
+            status = get_status(result)
+            if status:
+                self.write(target, address, seq, status, NAN, 0, timestamp)
+            return
+        for rep in result:
+            if rep.Status == IP_SUCCESS:
+                options = getattr(rep, 'Options', None)
+                self.write(target, address, seq, IP_SUCCESS,
+                           reply_rtt(rep),
+                           options.Ttl if options is not None else 0,
+                           timestamp)
+            else:
+                self.write(target, address, seq, rep.Status, NAN, 0,
+                           timestamp)
+
+    def flush(self):
+        if self.pending:
+            self.stream.write(b''.join(self.pending))
+            self.pending = []
+        self.stream.flush()
+        self.last_flush = self.clock()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+
+class JsonLinesWriter(RecordWriter):
+    """ One JSON object per line. RTT and TTL are null if there was no
+    reply. """
+
+    def __init__(self, *args, **kwargs):
+        self.names = {}
+        super().__init__(*args, **kwargs)
+
+    def encode(self, timestamp, target, address, seq, status, rtt, ttl):
+        try:
+            names = self.names[(target, address)]
+        except KeyError:
+            names = self.names[(target, address)] = (json.dumps(target),
+                                                     json.dumps(address))
+        if status == IP_SUCCESS and not math.isnan(rtt):
+            tail = '"rtt":%s,"ttl":%d}\n' % (rtt, ttl)
+        else:
+            tail = '"rtt":null,"ttl":null}\n'
+        return ('{"timestamp":%.6f,"target":%s,"address":%s,"seq":%d,'
+                '"status":%d,%s' % (timestamp, names[0], names[1], seq,
+                                    status, tail)).encode('utf-8')
+
+
+class CsvWriter(RecordWriter):
+    """ Comma separated values with header line. RTT and TTL are empty if
+    there was no reply. """
+
+    def __init__(self, *args, **kwargs):
+        self.names = {}
+        super().__init__(*args, **kwargs)
+
+    def _quote(self, value):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='').writerow((value,))
+        return buf.getvalue()
+
+    def header(self):
+        return (','.join(FIELDS) + '\r\n').encode('ascii')
+
+    def encode(self, timestamp, target, address, seq, status, rtt, ttl):
+        try:
+            names = self.names[(target, address)]
+        except KeyError:
+            names = self.names[(target, address)] = '%s,%s' % (
+                self._quote(target), self._quote(address))
+        if status == IP_SUCCESS and not math.isnan(rtt):
+            tail = '%s,%d' % (rtt, ttl)
+        else:
+            tail = ','
+        return ('%.6f,%s,%d,%d,%s\r\n' % (timestamp, names, seq, status,
+                                          tail)).encode('utf-8')
+
+
+class BinaryWriter(RecordWriter):
+    """ Fixed width little-endian records of BINARY_RECORD layout. Target
+    names are not stored, only addresses. """
+
+    def __init__(self, *args, **kwargs):
+        self.addresses = {}
+        super().__init__(*args, **kwargs)
+
+    def encode(self, timestamp, target, address, seq, status, rtt, ttl):
+        try:
+            packed = self.addresses[address]
+        except KeyError:
+            if ':' in address:
+                packed = socket.inet_pton(socket.AF_INET6, address)
+            else:
+                packed = V4_MAPPED_PREFIX + socket.inet_aton(address)
+            self.addresses[address] = packed
+        return BINARY_RECORD.pack(timestamp, packed, seq & 0xFFFFFFFF,
+                                  status, rtt, ttl & 0xFF)
+
+
+def read_records(stream):
+    """ Decodes BinaryWriter output. Yields tuples (timestamp, address, seq,
+    status, rtt, ttl). """
+    size = BINARY_RECORD.size
+    while True:
+        chunk = stream.read(size * 4096)
+        if not chunk:
+            return
+        if len(chunk) % size:
+            chunk += stream.read(size - len(chunk) % size)
+        for (timestamp, packed, seq, status, rtt,
+             ttl) in BINARY_RECORD.iter_unpack(chunk):
+            if packed.startswith(V4_MAPPED_PREFIX):
+                address = socket.inet_ntoa(packed[12:])
+            else:
+                address = socket.inet_ntop(socket.AF_INET6, packed)
+            yield timestamp, address, seq, status, rtt, ttl
+
+
+writers = {
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'bin': BinaryWriter,
+}
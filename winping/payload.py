@@ -0,0 +1,127 @@
+import collections
+import ctypes
+import os
+import struct
+import time
+
+from .structs import ICMPV6_ECHO_REPLY
+
+__all__ = [
+    'TimestampedPayload',
+    'reply_rtt',
+]
+
+IP_SUCCESS = 0
+
+MAGIC = b'WPNG'
+# magic, sequence number, perf_counter_ns() of request
+PAYLOAD_HEADER = struct.Struct('<4sIQ')
+DEFAULT_WINDOW = 1024
+
+DUPLICATE = 'duplicate'
+REORDERED = 'reordered'
+
+_REPLY6_SIZE = ctypes.sizeof(ICMPV6_ECHO_REPLY)
+
+try:
+    clock_ns = time.perf_counter_ns
+except AttributeError:
+    def clock_ns():
+        return int(time.perf_counter() * 1e9)
+
+
+def reply_rtt(rep):
+    """ Returns RTT of reply in milliseconds: microsecond one measured by
+    TimestampedPayload if it is available, otherwise one reported by
+    system """
+    rtt_us = getattr(rep, 'RoundTripTimeUs', None)
+    return rep.RoundTripTime if rtt_us is None else rtt_us / 1000
+
+
+class TimestampedPayload(object):
+    """ Generates echo request data carrying sequence number and send time.
+
+    RTT reported by system has millisecond resolution. When request data
+    comes from next() and replies are passed to stamp() as soon as they are
+    returned, replies get Sequence and RoundTripTimeUs attributes, the
+    latter measured with perf_counter_ns(). Time spent in library is
+    included, it's a few microseconds per request.
+
+    Sequence numbers of last window requests are remembered to detect
+    duplicate and reordered replies. """
+
+    def __init__(self, size=32, clock=clock_ns, window=DEFAULT_WINDOW):
+        if size < PAYLOAD_HEADER.size:
+            raise ValueError("Timestamped payload needs at least %d bytes" %
+                             (PAYLOAD_HEADER.size,))
+        self.size = size
+        self.clock = clock
+        self.window = window
+        self.filler = os.urandom(size - PAYLOAD_HEADER.size)
+        self.seq = 0
+        self.highest = -1
+        self.seen = set()
+        self.order = collections.deque()
+        self.duplicates = 0
+        self.reordered = 0
+
+    def next(self):
+        """ Returns data for next request. Send time is taken here, so data
+        should be sent right away. """
+        seq = self.seq
+        self.seq = (seq + 1) & 0xFFFFFFFF
+        return PAYLOAD_HEADER.pack(MAGIC, seq, self.clock()) + self.filler
+
+    def decode(self, data):
+        """ Returns pair (sequence number, send time in nanoseconds) or None
+        if data doesn't carry timestamp """
+        if len(data) < PAYLOAD_HEADER.size:
+            return None
+        magic, seq, sent = PAYLOAD_HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return None
+        return seq, sent
+
+    def _reply_data(self, rep):
+        if hasattr(rep, 'Data'):
+            return rep.Data
+        # ICMPv6 reply data follows reply structure. Reply buffer always
+        # has room for header size bytes past it, see IcmpHandle.bufsize()
+        return ctypes.string_at(ctypes.addressof(rep._r) + _REPLY6_SIZE,
+                                PAYLOAD_HEADER.size)
+
+    def classify(self, seq):
+        """ Registers received sequence number. Returns DUPLICATE, REORDERED
+        or None for reply in order. """
+        if seq in self.seen:
+            self.duplicates += 1
+            return DUPLICATE
+        self.seen.add(seq)
+        self.order.append(seq)
+        if len(self.order) > self.window:
+            self.seen.discard(self.order.popleft())
+        if seq < self.highest:
+            self.reordered += 1
+            return REORDERED
+        self.highest = seq
+        return None
+
+    def stamp(self, replies, received=None):
+        """ Sets Sequence and RoundTripTimeUs of successful replies carrying
+        timestamp. Returns list of classify() outcomes for replies, None for
+        ones without timestamp. """
+        if received is None:
+            received = self.clock()
+        res = []
+        for rep in replies:
+            decoded = None
+            if rep.Status == IP_SUCCESS:
+                decoded = self.decode(self._reply_data(rep))
+            if decoded is None:
+                res.append(None)
+                continue
+            seq, sent = decoded
+            rep.Sequence = seq
+            rep.RoundTripTimeUs = (received - sent) / 1000
+            res.append(self.classify(seq))
+        return res
@@ -0,0 +1,160 @@
+import collections
+import contextlib
+import socket
+import threading
+import time
+
+from .errors import get_status
+from . import IcmpHandle, Icmp6Handle, ping, ping6
+
+__all__ = [
+    'HandlePool',
+]
+
+DEFAULT_POOL_SIZE = 8
+
+
+class HandlePool(object):
+    """ Bounded pool of warm IcmpHandle and Icmp6Handle objects shared by
+    threads.
+
+    Handle is not thread-safe, so each one is checked out by single thread
+    at a time. At most max_size handles of each address family exist;
+    checkout() waits for a free one when all are in use. Handle is closed
+    instead of being returned to the pool if it failed with error which
+    doesn't carry IP status, i.e. is not a regular echo request outcome. """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, *, backend=None,
+                 timeout=None):
+        self.max_size = max_size
+        self.backend = backend
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.idle = {socket.AF_INET: [], socket.AF_INET6: []}
+        self.size = {socket.AF_INET: 0, socket.AF_INET6: 0}
+        self.closed = False
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.
+        self.created = 0
+        self.discarded = 0
+
+    def _factory(self, family):
+        if family == socket.AF_INET:
+            return IcmpHandle
+        if family == socket.AF_INET6:
+            return Icmp6Handle
+        raise ValueError("Unsupported address family: %r" % (family,))
+
+    def checkout(self, family=socket.AF_INET, timeout=None):
+        """ Returns handle of given address family for exclusive use.
+        Raises TimeoutError if no handle became free within timeout
+        seconds. """
+        factory = self._factory(family)
+        if timeout is None:
+            timeout = self.timeout
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("Handle pool is closed")
+            self.checkouts += 1
+            idle = self.idle[family]
+            if not idle and self.size[family] >= self.max_size:
+                self.waits += 1
+                start = time.monotonic()
+                ready = self.cond.wait_for(
+                    lambda: (self.closed or idle or
+                             self.size[family] < self.max_size),
+                    timeout)
+                self.wait_time += time.monotonic() - start
+                if not ready:
+                    raise TimeoutError("No free handle within %s s" %
+                                       (timeout,))
+                if self.closed:
+                    raise RuntimeError("Handle pool is closed")
+            if idle:
+                return idle.pop()
+            # reserve slot, handle is created outside of lock
+            self.size[family] += 1
+        try:
+            handle = factory(self.backend)
+        except BaseException:
+            with self.cond:
+                self.size[family] -= 1
+                self.cond.notify()
+            raise
+        with self.cond:
+            self.created += 1
+        return handle
+
+    def checkin(self, handle, discard=False):
+        """ Returns handle to the pool. Handle is closed if discard is set or
+        pool is closed. """
+        family = (socket.AF_INET6 if isinstance(handle, Icmp6Handle)
+                  else socket.AF_INET)
+        with self.cond:
+            if not (discard or self.closed):
+                self.idle[family].append(handle)
+                self.cond.notify()
+                return
+            self.size[family] -= 1
+            if discard:
+                self.discarded += 1
+            self.cond.notify()
+        handle.close()
+
+    @contextlib.contextmanager
+    def handle(self, family=socket.AF_INET, timeout=None):
+        """ Context manager checking out handle and returning it back """
+        handle = self.checkout(family, timeout)
+        try:
+            yield handle
+        except BaseException as e:
+            self.checkin(handle, not (isinstance(e, OSError) and
+                                      get_status(e) is not None))
+            raise
+        else:
+            self.checkin(handle)
+
+    def ping(self, address, **kwargs):
+        """ ping() on pooled handle """
+        with self.handle(socket.AF_INET) as handle:
+            return ping(handle, address, **kwargs)
+
+    def ping6(self, address, **kwargs):
+        """ ping6() on pooled handle """
+        with self.handle(socket.AF_INET6) as handle:
+            return ping6(handle, address, **kwargs)
+
+    def metrics(self):
+        with self.cond:
+            idle = sum(len(handles) for handles in self.idle.values())
+            size = sum(self.size.values())
+            return collections.OrderedDict([
+                ('size', size),
+                ('idle', idle),
+                ('in_use', size - idle),
+                ('checkouts', self.checkouts),
+                ('waits', self.waits),
+                ('wait_time', self.wait_time),
+                ('created', self.created),
+                ('discarded', self.discarded),
+            ])
+
+    def close(self):
+        """ Closes idle handles. Handles in use are closed on checkin. """
+        with self.cond:
+            self.closed = True
+            handles = [handle for idle in self.idle.values()
+                       for handle in idle]
+            for family, idle in self.idle.items():
+                self.size[family] -= len(idle)
+                del idle[:]
+            self.cond.notify_all()
+        for handle in handles:
+            handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
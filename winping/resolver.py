@@ -0,0 +1,187 @@
+import collections
+import socket
+import time
+
+__all__ = [
+    'Resolver',
+]
+
+DEFAULT_TTL = 300.
+DEFAULT_NEGATIVE_TTL = 30.
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_WORKERS = 32
+
+
+def parse_literal(name):
+    """ Returns address family of IP address literal or None """
+    for af in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(af, name)
+        except (OSError, ValueError):
+            continue
+        return af
+    return None
+
+
+class Resolver(object):
+    """ Caching asynchronous name resolver.
+
+    Names are resolved concurrently with getaddrinfo in a thread pool and
+    first address of allowed family is returned as (address, family) pair.
+    Results are cached for ttl seconds, failures for negative_ttl seconds.
+    Concurrent lookups of the same name share single getaddrinfo call.
+    IP address literals are returned without lookup and are not cached.
+
+    getaddrinfo may be replaced with any function of the same signature,
+    e.g. stub returning fixed results. """
+
+    def __init__(self, *, family=socket.AF_UNSPEC, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 cache_size=DEFAULT_CACHE_SIZE, max_workers=DEFAULT_WORKERS,
+                 getaddrinfo=socket.getaddrinfo, clock=time.monotonic):
+        self.family = family
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache_size = cache_size
+        self.max_workers = max_workers
+        self.getaddrinfo = getaddrinfo
+        self.clock = clock
+        self.cache = collections.OrderedDict()
+        self.pending = {}
+        self.executor = None
+        self.lookups = 0
+        self.hits = 0
+
+    def lookup(self, name, family=None):
+        """ Returns cached (address, family) pair, raises cached error or
+        returns None if name is not in cache or its entry has expired """
+        if family is None:
+            family = self.family
+        key = (name, family)
+        try:
+            expires, value = self.cache[key]
+        except KeyError:
+            return None
+        if expires <= self.clock():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        if isinstance(value, OSError):
+            raise value
+        return value
+
+    def _store(self, key, value):
+        ttl = self.negative_ttl if isinstance(value, OSError) else self.ttl
+        self.cache[key] = (self.clock() + ttl, value)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _getaddrinfo(self, name, family):
+        ai_list = self.getaddrinfo(name, 0, family)
+        if family != socket.AF_UNSPEC:
+            ai_list = [ai for ai in ai_list if ai[0] == family]
+        else:
+            ai_list = [ai for ai in ai_list
+                       if ai[0] in (socket.AF_INET, socket.AF_INET6)]
+        if not ai_list:
+            raise socket.gaierror(socket.EAI_NONAME,
+                                  "No address of requested family")
+        return ai_list[0][4][0], ai_list[0][0]
+
+    def _known(self, name, family):
+        """ Returns (address, family) pair of IP address literal or cached
+        name, None if name has to be looked up """
+        af = parse_literal(name)
+        if af is not None:
+            if family not in (socket.AF_UNSPEC, af):
+                raise socket.gaierror(socket.EAI_NONAME,
+                                      "Address of other family requested")
+            return name, af
+        cached = self.lookup(name, family)
+        if cached is not None:
+            self.hits += 1
+        return cached
+
+    def resolve_blocking(self, name, family=None):
+        """ Same as resolve, but looks name up in calling thread. For
+        callers without event loop. """
+        if family is None:
+            family = self.family
+        known = self._known(name, family)
+        if known is not None:
+            return known
+        key = (name, family)
+        self.lookups += 1
+        try:
+            res = self._getaddrinfo(name, family)
+        except OSError as e:
+            self._store(key, e)
+            raise
+        self._store(key, res)
+        return res
+
+    async def resolve(self, name, family=None):
+        """ Returns (address, family) pair for name. Raises socket.gaierror
+        if name doesn't resolve to address of requested family. """
+        # loop machinery is needed by coroutines only, not by
+        # resolve_blocking
+        import asyncio
+        if family is None:
+            family = self.family
+        known = self._known(name, family)
+        if known is not None:
+            return known
+        key = (name, family)
+        fut = self.pending.get(key)
+        if fut is None:
+            self.lookups += 1
+            if self.executor is None:
+                import concurrent.futures
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    self.max_workers)
+            loop = asyncio.get_event_loop()
+            fut = loop.run_in_executor(self.executor, self._getaddrinfo,
+                                       name, family)
+            self.pending[key] = fut
+            fut.add_done_callback(lambda fut: self._done(key, fut))
+        # lookup is shared between callers, so cancellation of one of them
+        # must not cancel it for others
+        return await asyncio.shield(fut)
+
+    def _done(self, key, fut):
+        del self.pending[key]
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is None:
+            self._store(key, fut.result())
+        elif isinstance(exc, OSError):
+            self._store(key, exc)
+
+    async def resolve_many(self, names, family=None):
+        """ Resolves names concurrently. Returns ordered dict mapping each
+        name to (address, family) pair or exception. """
+        import asyncio
+        names = list(collections.OrderedDict.fromkeys(names))
+        results = await asyncio.gather(
+            *(self.resolve(name, family) for name in names),
+            return_exceptions=True)
+        for res in results:
+            if (isinstance(res, BaseException) and
+                    not isinstance(res, OSError)):
+                raise res
+        return collections.OrderedDict(zip(names, results))
+
+    def invalidate(self, name=None):
+        """ Drops cached entries of name, or whole cache """
+        if name is None:
+            self.cache.clear()
+        else:
+            for key in [key for key in self.cache if key[0] == name]:
+                del self.cache[key]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,103 @@
+import time
+
+__all__ = [
+    'IntervalScheduler',
+    'TokenBucket',
+]
+
+
+class IntervalScheduler(object):
+    """ Fixed cadence scheduler on monotonic clock.
+
+    Ticks are aligned to start + n * interval, so lateness of one tick
+    doesn't shift the following ones. When consumer falls behind by whole
+    intervals, missed ticks are skipped instead of being sent in a burst. """
+
+    def __init__(self, interval, clock=time.monotonic, start=None):
+        self.interval = interval
+        self.clock = clock
+        self.next_time = clock() if start is None else start
+        self.ticks = 0
+        self.skipped = 0
+        self.lag = 0.
+        self.max_lag = 0.
+
+    def delay(self):
+        """ Returns seconds left until next tick """
+        return max(self.next_time - self.clock(), 0.)
+
+    def tick(self):
+        """ Consumes due tick and returns its lateness in seconds """
+        now = self.clock()
+        lag = max(now - self.next_time, 0.)
+        self.lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        self.ticks += 1
+        self.next_time += self.interval
+        if now >= self.next_time:
+            missed = int((now - self.next_time) // self.interval) + 1
+            self.next_time += missed * self.interval
+            self.skipped += missed
+        return lag
+
+    def sleep(self):
+        """ Blocks until next tick and consumes it """
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+        return self.tick()
+
+    async def wait(self):
+        """ Waits for next tick without blocking event loop and consumes
+        it """
+        # asyncio is already loaded by whoever runs the loop, so blocking
+        # callers don't pay for its import
+        import asyncio
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self.tick()
+
+
+class TokenBucket(object):
+    """ Paces events to given rate per second on monotonic clock.
+
+    Tokens accumulate at rate up to burst (10ms worth of tokens by default).
+    Consumer takes all available tokens at once, so high rates don't need a
+    wakeup per event. Tokens which didn't fit into full bucket are counted
+    in overflow: consumer couldn't keep up with rate. """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        if not rate > 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(rate / 100, 1.) if burst is None else burst
+        self.clock = clock
+        self.tokens = 0.
+        self.last = clock()
+        self.overflow = 0.
+
+    def _refill(self):
+        now = self.clock()
+        tokens = self.tokens + (now - self.last) * self.rate
+        self.last = now
+        if tokens > self.burst:
+            self.overflow += tokens - self.burst
+            tokens = self.burst
+        self.tokens = tokens
+
+    def take(self, limit=None):
+        """ Consumes whole available tokens, at most limit, and returns
+        their number """
+        self._refill()
+        count = int(self.tokens)
+        if limit is not None and count > limit:
+            count = limit
+        self.tokens -= count
+        return count
+
+    def delay(self):
+        """ Returns seconds left until next whole token """
+        self._refill()
+        return max((1. - self.tokens) / self.rate, 0.)
@@ -0,0 +1,143 @@
+import asyncio
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+
+from .columns import ResultColumns
+from .batch import BatchPinger, DEFAULT_CONCURRENCY, _run_bounded, _probed
+from .scheduler import IntervalScheduler
+from . import ProbeProfile
+
+__all__ = [
+    'sharded_sweep',
+]
+
+_RESULT = b'R'
+_ERROR = b'E'
+
+
+def _split(targets, parts):
+    """ Splits list into contiguous slices of nearly equal size. Returns list
+    of pairs (offset, slice). """
+    size, extra = divmod(len(targets), parts)
+    res = []
+    offset = 0
+    for idx in range(parts):
+        end = offset + size + (idx < extra)
+        res.append((offset, targets[offset:end]))
+        offset = end
+    return res
+
+
+def _worker(conn, targets, index_offset, rounds, interval, concurrency,
+            timeout, data, expected_count, backend, profile_args,
+            timeouts):
+    """ Sweeps slice of targets in child process, sending results of each
+    round to parent as serialized ResultColumns """
+    # interrupt is handled by parent, which terminates workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    loop = asyncio.new_event_loop()
+    profile = None if profile_args is None else ProbeProfile(*profile_args)
+    pinger = BatchPinger(loop, timeout=timeout, data=data,
+                         expected_count=expected_count, backend=backend,
+                         profile=profile, timeouts=timeouts)
+    sink = ResultColumns(targets)
+    # rounds follow each other immediately with zero interval
+    scheduler = IntervalScheduler(interval) if interval > 0 else None
+    try:
+        if scheduler is not None:
+            scheduler.tick()
+        for round_no in range(rounds):
+            if round_no and scheduler is not None:
+                scheduler.sleep()
+            for _ in _run_bounded(loop, (pinger.record(target, sink)
+                                         for target in _probed(targets,
+                                                               timeouts)),
+                                  concurrency):
+                pass
+            conn.send_bytes(_RESULT + sink.dumps(index_offset))
+            sink.clear()
+    except Exception as e:
+        conn.send_bytes(_ERROR + ("%s: %s" % (type(e).__name__, e)).encode(
+            'utf-8', 'replace'))
+    finally:
+        pinger.close()
+        loop.close()
+        conn.close()
+
+
+def sharded_sweep(targets, *, processes=None, rounds=1, interval=1.,
+                  concurrency=DEFAULT_CONCURRENCY, timeout=1000, data=None,
+                  expected_count=1, backend=None, profile=None,
+                  timeouts=None):
+    """ Sweeps IP addresses like sweep(), sharding them across worker
+    processes.
+
+    Target list is split into contiguous slices, one per process (CPU count
+    by default). Each worker owns its handles, pings its slice rounds times
+    on fixed interval in seconds with at most concurrency requests in flight
+    and sends results of each round to parent as compact column batch
+    through a pipe. Returns ResultColumns with results of all workers, so
+    per-target statistics come from stats_by_target(). Duplicate targets are
+    probed once. Each worker gets its own copy of AdaptiveTimeouts, if any,
+    which persists across rounds.
+
+    On Windows calling module has to be importable by child processes, i.e.
+    protected with if __name__ == '__main__'. """
+    targets = list(collections.OrderedDict.fromkeys(targets))
+    res = ResultColumns(targets)
+    if not targets or rounds <= 0:
+        return res
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 0:
+        raise ValueError("processes must be positive")
+    if data is None:
+        data = os.urandom(32)
+    profile_args = None
+    if profile is not None:
+        profile_args = (profile.ttl, profile.tos, profile.dont_fragment,
+                        profile.source)
+
+    workers = []
+    try:
+        for offset, shard in _split(targets, min(processes, len(targets))):
+            reader, writer = multiprocessing.Pipe(duplex=False)
+            proc = multiprocessing.Process(
+                target=_worker,
+                args=(writer, shard, offset, rounds, interval, concurrency,
+                      timeout, data, expected_count, backend, profile_args,
+                      timeouts),
+                daemon=True)
+            proc.start()
+            writer.close()
+            workers.append((proc, reader))
+
+        pending = [reader for _, reader in workers]
+        errors = []
+        while pending:
+            for conn in multiprocessing.connection.wait(pending):
+                try:
+                    msg = conn.recv_bytes()
+                except EOFError:
+                    pending.remove(conn)
+                    continue
+                if msg[:1] == _RESULT:
+                    res.loads(memoryview(msg)[1:])
+                else:
+                    errors.append(msg[1:].decode('utf-8'))
+        for proc, _ in workers:
+            proc.join()
+            if proc.exitcode and not errors:
+                errors.append("exit code %d" % (proc.exitcode,))
+        if errors:
+            raise RuntimeError("Sweep worker failed: %s" % (errors[0],))
+    finally:
+        for proc, reader in workers:
+            reader.close()
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+    return res
@@ -0,0 +1,271 @@
+import collections
+import math
+import time
+
+from .errors import get_status
+from .payload import reply_rtt
+
+__all__ = [
+    'RttHistogram',
+    'RttStats',
+    'WindowedRttStats',
+    'TargetStats',
+]
+
+IP_SUCCESS = 0
+NAN = float('nan')
+
+
+class RttHistogram(object):
+    """ Log-linear histogram of RTT values in the spirit of HdrHistogram.
+
+    Values are stored in microseconds. Values below 2**precision_bits are
+    counted exactly, larger ones fall into buckets with relative width at
+    most 2**(1 - precision_bits). Counts are kept sparse, number of buckets
+    is bounded by value range and precision regardless of sample count. """
+
+    __slots__ = ('precision_bits', 'counts', 'total')
+
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        self.counts = {}
+        self.total = 0
+
+    def bucket(self, value):
+        bits = self.precision_bits
+        if value < (1 << bits):
+            return value
+        shift = value.bit_length() - bits
+        top = value >> shift
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + (top - half)
+
+    def bucket_value(self, idx):
+        """ Returns midpoint of bucket """
+        bits = self.precision_bits
+        if idx < (1 << bits):
+            return idx
+        half = 1 << (bits - 1)
+        k = idx - (1 << bits)
+        shift = k // half + 1
+        low = (k % half + half) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def add(self, rtt_ms, count=1):
+        idx = self.bucket(max(int(round(rtt_ms * 1000)), 0))
+        self.counts[idx] = self.counts.get(idx, 0) + count
+        self.total += count
+
+    def merge(self, other):
+        counts = self.counts
+        for idx, count in other.counts.items():
+            counts[idx] = counts.get(idx, 0) + count
+        self.total += other.total
+
+    def percentiles(self, qs):
+        """ Returns list of values (in milliseconds) at given percentiles """
+        if not self.total:
+            return [NAN] * len(qs)
+        order = sorted((q, i) for i, q in enumerate(qs))
+        res = [NAN] * len(qs)
+        pos = 0
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            while pos < len(order) and seen >= order[pos][0] / 100 * self.total:
+                res[order[pos][1]] = self.bucket_value(idx) / 1000
+                pos += 1
+            if pos == len(order):
+                break
+        last = self.bucket_value(max(self.counts)) / 1000
+        for q, i in order[pos:]:
+            res[i] = last
+        return res
+
+    def percentile(self, q):
+        return self.percentiles((q,))[0]
+
+
+class RttStats(object):
+    """ Constant memory running statistics of probe results: loss, min, max,
+    mean, standard deviation, jitter (mean absolute difference between
+    consecutive RTTs) and percentiles from RttHistogram. """
+
+    __slots__ = ('sent', 'received', 'min', 'max', 'mean', '_m2',
+                 '_first_rtt', '_last_rtt', '_jitter_sum', '_jitter_count',
+                 'histogram')
+
+    def __init__(self, precision_bits=7):
+        self.sent = 0
+        self.received = 0
+        self.min = NAN
+        self.max = NAN
+        self.mean = NAN
+        self._m2 = 0.
+        self._first_rtt = None
+        self._last_rtt = None
+        self._jitter_sum = 0.
+        self._jitter_count = 0
+        self.histogram = RttHistogram(precision_bits)
+
+    @property
+    def lost(self):
+        return self.sent - self.received
+
+    @property
+    def loss(self):
+        return 100 * self.lost / self.sent if self.sent else 0.
+
+    @property
+    def stddev(self):
+        if self.received < 2:
+            return NAN if not self.received else 0.
+        return math.sqrt(self._m2 / (self.received - 1))
+
+    @property
+    def jitter(self):
+        if not self._jitter_count:
+            return NAN
+        return self._jitter_sum / self._jitter_count
+
+    def add(self, rtt):
+        """ Accounts successful reply with given RTT in milliseconds """
+        self.sent += 1
+        self.received += 1
+        n = self.received
+        if n == 1:
+            self.min = self.max = self.mean = rtt
+        else:
+            if rtt < self.min:
+                self.min = rtt
+            if rtt > self.max:
+                self.max = rtt
+            delta = rtt - self.mean
+            self.mean += delta / n
+            self._m2 += delta * (rtt - self.mean)
+        if self._last_rtt is not None:
+            self._jitter_sum += abs(rtt - self._last_rtt)
+            self._jitter_count += 1
+        else:
+            self._first_rtt = rtt
+        self._last_rtt = rtt
+        self.histogram.add(rtt)
+
+    def add_loss(self, count=1):
+        self.sent += count
+
+    def add_result(self, result):
+        """ Accounts outcome of ping()-like call: list of replies or
+        exception instance. Exceptions without status code are ignored. """
+        if isinstance(result, OSError):
+            if get_status(result):
+                self.add_loss()
+            return
+        for rep in result:
+            if rep.Status == IP_SUCCESS:
+                self.add(reply_rtt(rep))
+            else:
+                self.add_loss()
+
+    def merge(self, other):
+        """ Adds other stats, which are assumed to follow this ones in time """
+        if other.received:
+            if self._last_rtt is not None:
+                self._jitter_sum += abs(other._first_rtt - self._last_rtt)
+                self._jitter_count += 1
+            else:
+                self._first_rtt = other._first_rtt
+            if self.received:
+                n = self.received + other.received
+                delta = other.mean - self.mean
+                self._m2 += (other._m2 +
+                             delta * delta * self.received * other.received / n)
+                self.mean += delta * other.received / n
+                self.min = min(self.min, other.min)
+                self.max = max(self.max, other.max)
+            else:
+                self.min, self.max = other.min, other.max
+                self.mean, self._m2 = other.mean, other._m2
+            self._last_rtt = other._last_rtt
+        self.sent += other.sent
+        self.received += other.received
+        self._jitter_sum += other._jitter_sum
+        self._jitter_count += other._jitter_count
+        self.histogram.merge(other.histogram)
+
+    def percentile(self, q):
+        return self.histogram.percentile(q)
+
+    def percentiles(self, qs=(50, 90, 99)):
+        return collections.OrderedDict(zip(qs, self.histogram.percentiles(qs)))
+
+    def summary(self, qs=(50, 90, 99)):
+        res = collections.OrderedDict([
+            ('sent', self.sent),
+            ('received', self.received),
+            ('lost', self.lost),
+            ('loss', self.loss),
+            ('min', self.min),
+            ('max', self.max),
+            ('avg', self.mean),
+            ('stddev', self.stddev),
+            ('jitter', self.jitter),
+        ])
+        for q, value in self.percentiles(qs).items():
+            res['p%g' % (q,)] = value
+        return res
+
+
+class WindowedRttStats(object):
+    """ RttStats over sliding time window.
+
+    Window is split into fixed number of slots, each holding RttStats of its
+    time span. Memory use is bounded by number of slots. """
+
+    def __init__(self, window=60., slots=6, precision_bits=7,
+                 clock=time.monotonic):
+        self.window = window
+        self.slot_width = window / slots
+        self.precision_bits = precision_bits
+        self.clock = clock
+        self.slots = collections.deque(maxlen=slots)
+        self.total = RttStats(precision_bits)
+
+    def _slot(self):
+        idx = int(self.clock() // self.slot_width)
+        if not self.slots or self.slots[-1][0] != idx:
+            self.slots.append((idx, RttStats(self.precision_bits)))
+        return self.slots[-1][1]
+
+    def add(self, rtt):
+        self._slot().add(rtt)
+        self.total.add(rtt)
+
+    def add_loss(self, count=1):
+        self._slot().add_loss(count)
+        self.total.add_loss(count)
+
+    def add_result(self, result):
+        self._slot().add_result(result)
+        self.total.add_result(result)
+
+    def current(self):
+        """ Returns RttStats merged over slots within window """
+        oldest = int(self.clock() // self.slot_width) - self.slots.maxlen
+        res = RttStats(self.precision_bits)
+        for idx, stats in self.slots:
+            if idx > oldest:
+                res.merge(stats)
+        return res
+
+
+class TargetStats(collections.OrderedDict):
+    """ Mapping of target to its statistics, created on first access """
+
+    def __init__(self, factory=RttStats):
+        super().__init__()
+        self.factory = factory
+
+    def __missing__(self, target):
+        stats = self[target] = self.factory()
+        return stats
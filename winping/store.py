@@ -0,0 +1,295 @@
+import collections
+import mmap
+import os
+import struct
+import time
+
+from .errors import get_status
+from .payload import reply_rtt
+from .stats import TargetStats
+
+__all__ = [
+    'TimeSeriesWriter',
+    'TimeSeriesReader',
+]
+
+IP_SUCCESS = 0
+NAN = float('nan')
+
+MAGIC = b'WPTS'
+VERSION = 1
+TARGETS_FILE = 'targets'
+SEGMENT_SUFFIX = '.seg'
+DEFAULT_SEGMENT_RECORDS = 1 << 20
+
+# magic, version, record size, number of records written
+SEGMENT_HEADER = struct.Struct('<4sHHQ16x')
+COUNT_OFFSET = 8
+COUNT = struct.Struct('<Q')
+# timestamp, target id, status, RTT in milliseconds (NaN without reply)
+RECORD = struct.Struct('<dIIf')
+
+
+def _read_targets(path):
+    try:
+        with open(os.path.join(path, TARGETS_FILE), encoding='utf-8') as f:
+            return [line.rstrip('\n') for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def _segment_names(path):
+    return sorted(name for name in os.listdir(path)
+                  if name.endswith(SEGMENT_SUFFIX) and
+                  name[:-len(SEGMENT_SUFFIX)].isdigit())
+
+
+def _read_header(buf, name):
+    magic, version, record_size, count = SEGMENT_HEADER.unpack_from(buf)
+    if (magic != MAGIC or version != VERSION or
+            record_size != RECORD.size):
+        raise ValueError("Not a time-series segment: %s" % (name,))
+    return count
+
+
+class TimeSeriesWriter(object):
+    """ Appends probe results to directory of fixed size memory-mapped
+    segment files.
+
+    Each record is RECORD: timestamp, target id, status and RTT. Target
+    names are kept in separate append-only file, id is line number. Segment
+    holds up to segment_records records, its header keeps number of records
+    written, so store may be appended to again after restart. When segment
+    fills up, next one is started and, if max_segments is set, the oldest
+    segments beyond that number are removed. """
+
+    def __init__(self, path, segment_records=DEFAULT_SEGMENT_RECORDS,
+                 max_segments=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.targets = _read_targets(path)
+        self.ids = {name: idx for idx, name in enumerate(self.targets)}
+        self.targets_file = open(os.path.join(path, TARGETS_FILE), 'a',
+                                 encoding='utf-8')
+        self.file = None
+        self.map = None
+        self.count = 0
+        self.capacity = 0
+        names = _segment_names(path)
+        if names:
+            self.seq = int(names[-1][:-len(SEGMENT_SUFFIX)])
+            self._open_segment(names[-1])
+        else:
+            self.seq = 0
+            self._new_segment()
+
+    def _segment_path(self, name):
+        return os.path.join(self.path, name)
+
+    def _open_segment(self, name):
+        f = open(self._segment_path(name), 'r+b')
+        size = os.fstat(f.fileno()).st_size
+        if size < SEGMENT_HEADER.size + RECORD.size:
+            f.close()
+            raise ValueError("Not a time-series segment: %s" % (name,))
+        self.file = f
+        self.map = mmap.mmap(f.fileno(), size)
+        self.count = _read_header(self.map, name)
+        self.capacity = (size - SEGMENT_HEADER.size) // RECORD.size
+
+    def _new_segment(self):
+        self.seq += 1
+        name = '%010d%s' % (self.seq, SEGMENT_SUFFIX)
+        size = SEGMENT_HEADER.size + self.segment_records * RECORD.size
+        f = open(self._segment_path(name), 'w+b')
+        f.truncate(size)
+        self.file = f
+        self.map = mmap.mmap(f.fileno(), size)
+        SEGMENT_HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, 0)
+        self.count = 0
+        self.capacity = self.segment_records
+        if self.max_segments is not None:
+            for old in _segment_names(self.path)[:-self.max_segments]:
+                try:
+                    os.remove(self._segment_path(old))
+                except OSError:
+                    # segment may still be mapped by reader on Windows
+                    pass
+
+    def _close_segment(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def target_id(self, target):
+        try:
+            return self.ids[target]
+        except KeyError:
+            pass
+        if '\n' in target:
+            raise ValueError("Target name contains line break: %r" %
+                             (target,))
+        idx = self.ids[target] = len(self.targets)
+        self.targets.append(target)
+        self.targets_file.write(target + '\n')
+        self.targets_file.flush()
+        return idx
+
+    def append(self, target, status, rtt=NAN, timestamp=None):
+        if self.count >= self.capacity:
+            self._close_segment()
+            self._new_segment()
+        RECORD.pack_into(self.map,
+                         SEGMENT_HEADER.size + self.count * RECORD.size,
+                         time.time() if timestamp is None else timestamp,
+                         self.target_id(target), status, rtt)
+        self.count += 1
+        # count is updated after record, so readers never see partial one
+        COUNT.pack_into(self.map, COUNT_OFFSET, self.count)
+
+    def write_result(self, target, result, timestamp=None):
+        """ Appends outcome of ping()-like call: list of replies or
+        exception instance. Exceptions without status code are ignored. """
+        if timestamp is None:
+            timestamp = time.time()
+        if isinstance(result, OSError):
+            status = get_status(result)
+            if status:
+                self.append(target, status, NAN, timestamp)
+            return
+        for rep in result:
+            if rep.Status == IP_SUCCESS:
+                self.append(target, IP_SUCCESS, reply_rtt(rep), timestamp)
+            else:
+                self.append(target, rep.Status, NAN, timestamp)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            self._close_segment()
+            self.map = None
+            self.targets_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+
+class TimeSeriesReader(object):
+    """ Queries store written by TimeSeriesWriter, possibly while it is
+    being written.
+
+    Segments are memory-mapped and only records within requested time range
+    are read: records are appended in time order, so range bounds are found
+    by binary search over timestamps. """
+
+    def __init__(self, path):
+        if not os.path.isdir(path):
+            raise FileNotFoundError("No time-series store at %s" % (path,))
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        """ Rereads target names added since store was opened """
+        self.targets = _read_targets(self.path)
+        self.ids = {name: idx for idx, name in enumerate(self.targets)}
+
+    def _name(self, target_id):
+        if target_id >= len(self.targets):
+            self.reload()
+        try:
+            return self.targets[target_id]
+        except IndexError:
+            return '#%d' % (target_id,)
+
+    @staticmethod
+    def _bisect(buf, count, timestamp):
+        """ Returns index of first record with timestamp not less than
+        given """
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(
+                    buf, SEGMENT_HEADER.size + mid * RECORD.size)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start=None, end=None, targets=None):
+        """ Yields records (timestamp, target, status, rtt) with
+        start <= timestamp < end, optionally only for given target names """
+        ids = None
+        if targets is not None:
+            ids = {self.ids[name] for name in targets if name in self.ids}
+        for name in _segment_names(self.path):
+            try:
+                f = open(os.path.join(self.path, name), 'rb')
+            except FileNotFoundError:
+                # removed by retention meanwhile
+                continue
+            with f:
+                if os.fstat(f.fileno()).st_size < SEGMENT_HEADER.size:
+                    continue
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    count = _read_header(buf, name)
+                    if not count:
+                        continue
+                    first = RECORD.unpack_from(buf, SEGMENT_HEADER.size)[0]
+                    if end is not None and first >= end:
+                        return
+                    lo = 0 if start is None else self._bisect(buf, count,
+                                                              start)
+                    hi = count if end is None else self._bisect(buf, count,
+                                                                end)
+                    if lo >= hi:
+                        continue
+                    view = memoryview(buf)[
+                        SEGMENT_HEADER.size + lo * RECORD.size:
+                        SEGMENT_HEADER.size + hi * RECORD.size]
+                    try:
+                        for (timestamp, target_id, status,
+                             rtt) in RECORD.iter_unpack(view):
+                            if ids is None or target_id in ids:
+                                yield (timestamp, self._name(target_id),
+                                       status, rtt)
+                    finally:
+                        view.release()
+                finally:
+                    buf.close()
+
+    def aggregate(self, start=None, end=None, targets=None, step=None):
+        """ Computes per-target statistics of records in time range.
+
+        Returns TargetStats of RttStats. If step in seconds is given,
+        returns ordered dict of bucket start time to TargetStats of that
+        bucket instead. """
+        if step is None:
+            res = TargetStats()
+            for timestamp, target, status, rtt in self.query(start, end,
+                                                             targets):
+                if status == IP_SUCCESS:
+                    res[target].add(rtt)
+                else:
+                    res[target].add_loss()
+            return res
+        res = collections.OrderedDict()
+        for timestamp, target, status, rtt in self.query(start, end,
+                                                         targets):
+            bucket = timestamp - timestamp % step
+            try:
+                stats = res[bucket]
+            except KeyError:
+                stats = res[bucket] = TargetStats()
+            if status == IP_SUCCESS:
+                stats[target].add(rtt)
+            else:
+                stats[target].add_loss()
+        return res
@@ -0,0 +1,112 @@
+import ctypes
+import socket
+import struct
+
+__all__ = [
+    'IPAddr',
+    'in6_addr',
+    'sockaddr_in6',
+    'IPV6_ADDRESS_EX',
+    'ICMPV6_ECHO_REPLY',
+    'IP_OPTION_INFORMATION',
+    'ICMP_ECHO_REPLY',
+    'DUMMYUNION',
+    'IO_STATUS_BLOCK',
+    'inet_addr',
+    'inet6_addr',
+]
+
+
+# Windows ULONG is always 32-bit (LLP64), unlike c_ulong on LP64 platforms
+ULONG = ctypes.c_uint32
+
+
+class IPAddr(ctypes.Structure):
+    _fields_ = [ ("S_addr", ULONG),
+                 ]
+
+    def __str__(self):
+        return socket.inet_ntoa(struct.pack("=L", self.S_addr))
+
+
+class in6_addr(ctypes.Structure):
+    _fields_ = [ ("Byte", ctypes.c_ubyte * 16),
+                 ]
+
+    def __str__(self):
+        return socket.inet_ntop(socket.AF_INET6, bytes(self.Byte))
+
+
+class sockaddr_in6(ctypes.Structure):
+    _fields_ = [
+        ("sin6_family", ctypes.c_short),
+        ("sin6_port", ctypes.c_ushort),
+        ("sin6_flowinfo", ULONG),
+        ("sin6_addr", in6_addr),
+        ("sin6_scope_id", ULONG)
+    ]
+
+
+class IPV6_ADDRESS_EX(ctypes.Structure):
+    _fields_ = [
+        ("sin6_port", ctypes.c_ushort),
+        ("sin6_flowinfo", ULONG),
+        ("sin6_addr", in6_addr),
+        ("sin6_scope_id", ULONG)
+    ]
+    _pack_ = 1
+
+
+class ICMPV6_ECHO_REPLY(ctypes.Structure):
+    _fields_ = [
+        ("Address", IPV6_ADDRESS_EX),
+        ("Status", ULONG),
+        ("RoundTripTime", ctypes.c_uint)
+    ]
+
+
+class IP_OPTION_INFORMATION(ctypes.Structure):
+    _fields_ = [ ("Ttl", ctypes.c_ubyte),
+                 ("Tos", ctypes.c_ubyte),
+                 ("Flags", ctypes.c_ubyte),
+                 ("OptionsSize", ctypes.c_ubyte),
+                 ("OptionsData", ctypes.c_uint32),
+                 ]
+
+
+class ICMP_ECHO_REPLY(ctypes.Structure):
+    _fields_ = [ ("Address", IPAddr),
+                 ("Status", ULONG),
+                 ("RoundTripTime", ULONG),
+                 ("DataSize", ctypes.c_ushort),
+                 ("Reserved", ctypes.c_ushort),
+                 ("Data", ctypes.c_void_p),
+                 ("Options", IP_OPTION_INFORMATION),
+                 ]
+
+
+class DUMMYUNION(ctypes.Union):
+    _fields_ = [
+        ("Status", ctypes.c_long),
+        ("Pointer", ctypes.c_void_p),
+    ]
+
+
+class IO_STATUS_BLOCK(ctypes.Structure):
+    _fields_ = [
+        ("DUMMYUNIONNAME", DUMMYUNION),
+        ("Information", ctypes.POINTER(ctypes.c_ulong))
+    ]
+
+
+def inet_addr(ip):
+    return IPAddr(struct.unpack("=L", socket.inet_aton(ip))[0])
+
+
+def inet6_addr(ip):
+    # AF_INET6 as understood by Windows ICMP API
+    return sockaddr_in6(23,
+                        0,
+                        0,
+                        in6_addr.from_buffer_copy(socket.inet_pton(socket.AF_INET6, ip)),
+                        0)
@@ -0,0 +1,177 @@
+import asyncio
+import collections
+import os
+
+from .errors import *
+from .errors import errno_map, get_status
+from .structs import *
+from .defaults import DEFAULT_MAX_HOPS
+from . import (IcmpHandle, Icmp6Handle, _send_async, _send6_async, _parse,
+               _parse6, DEFAULT_TTL)
+
+__all__ = [
+    'traceroute',
+    'async_traceroute',
+    'path_mtu',
+    'async_path_mtu',
+    'TraceHop',
+]
+
+IP_SUCCESS = 0
+IP_PACKET_TOO_BIG = 11009
+IP_REQ_TIMED_OUT = 11010
+IP_TTL_EXPIRED_TRANSIT = 11013
+IP_FLAG_DF = 0x2
+
+DEFAULT_QUERIES = 3
+DEFAULT_MTU_PROBES = 8
+# Ethernet MTU, upper bound of search unless given
+DEFAULT_MAX_MTU = 1500
+
+# IP + ICMP header sizes
+IP_OVERHEAD = 20 + 8
+IP6_OVERHEAD = 40 + 8
+MIN_MTU = 68
+MIN_MTU6 = 1280
+
+
+TraceHop = collections.namedtuple('TraceHop', ['ttl', 'results'])
+TraceHop.__doc__ = """ Outcomes of probes sent with given TTL: reply object
+or exception for each one """
+
+
+def _is6(handle):
+    return isinstance(handle, Icmp6Handle)
+
+
+async def _probe(handle, address, timeout, data, options):
+    """ Sends single echo request, returns reply or exception """
+    try:
+        if _is6(handle):
+            lease, count = await _send6_async(handle, address, timeout, data,
+                                              1, options)
+            return _parse6(lease, count)[0]
+        lease, count = await _send_async(handle, address, timeout, data, 1,
+                                         options)
+        return _parse(lease, count)[0]
+    except IcmpException as e:
+        return e
+
+
+def _is_terminal(result):
+    """ True if probe reached destination or got final error from router """
+    if isinstance(result, OSError):
+        return get_status(result) not in (None, IP_TTL_EXPIRED_TRANSIT,
+                                          IP_REQ_TIMED_OUT)
+    return result.Status != IP_TTL_EXPIRED_TRANSIT
+
+
+async def async_traceroute(handle, address, *, max_hops=DEFAULT_MAX_HOPS,
+                           queries=DEFAULT_QUERIES, timeout=1000, data=None):
+    """ Traces route to address on handle of matching address family.
+
+    Probes for all hops are sent at once, so whole trace takes about one
+    timeout rather than one per hop. Returns list of TraceHop up to first
+    hop which reached destination or reported final error. """
+    if data is None:
+        data = handle.default_data
+    base = handle.options if _is6(handle) else None
+    probes = []
+    for ttl in range(1, max_hops + 1):
+        options = IP_OPTION_INFORMATION(ttl,
+                                        base.Tos if base is not None else 0,
+                                        base.Flags if base is not None else 0,
+                                        0, 0)
+        for _ in range(queries):
+            probes.append(_probe(handle, address, timeout, data, options))
+    results = await asyncio.gather(*probes)
+    hops = []
+    for idx in range(max_hops):
+        hop = TraceHop(idx + 1, results[idx * queries:(idx + 1) * queries])
+        hops.append(hop)
+        if any(_is_terminal(res) for res in hop.results):
+            break
+    return hops
+
+
+async def async_path_mtu(handle, address, *, high=DEFAULT_MAX_MTU,
+                         low=None, probes=DEFAULT_MTU_PROBES, timeout=1000):
+    """ Discovers path MTU to address by searching largest echo request
+    which passes with DF flag set.
+
+    Each round sends probes of several sizes in parallel, narrowing
+    [low, high] range of MTU values probes + 1 times, so search takes few
+    round trips. Lost probes are considered too big. Returns MTU in bytes,
+    raises exception of the smallest probe if even it fails. Result equal
+    to high means that path MTU is at least high, as larger requests
+    aren't sent. """
+    if _is6(handle):
+        overhead = IP6_OVERHEAD
+        low = MIN_MTU6 if low is None else low
+        base = handle.options
+        options = IP_OPTION_INFORMATION(base.Ttl, base.Tos,
+                                        base.Flags | IP_FLAG_DF, 0, 0)
+    else:
+        overhead = IP_OVERHEAD
+        low = MIN_MTU if low is None else low
+        options = IP_OPTION_INFORMATION(DEFAULT_TTL, 0, IP_FLAG_DF, 0, 0)
+    if not overhead <= low <= high:
+        raise ValueError("Invalid MTU range: %d-%d" % (low, high))
+    payload = os.urandom(high - overhead)
+
+    async def passes(mtu):
+        res = await _probe(handle, address, timeout,
+                           payload[:mtu - overhead], options)
+        status = get_status(res) if isinstance(res, OSError) else res.Status
+        if status == IP_SUCCESS:
+            return True
+        exc = res if isinstance(res, OSError) else errno_map.get(
+            status, OSError)(0, "Path MTU probe failed", None, status)
+        if status not in (IP_PACKET_TOO_BIG, IP_REQ_TIMED_OUT):
+            raise exc
+        return exc
+
+    # low is not known to pass yet, so it is probed in the first round
+    good = low - 1
+    while good < high:
+        step = max((high - good) // (probes + 1), 1)
+        sizes = list(range(high, good, -step))[:probes]
+        if good < low:
+            sizes[-1] = low
+        sizes.sort()
+        results = await asyncio.gather(*(passes(mtu) for mtu in sizes))
+        if good < low and results[0] is not True:
+            raise results[0]
+        for mtu, res in zip(sizes, results):
+            if res is True:
+                good = mtu
+            else:
+                high = mtu - 1
+                break
+    return good
+
+
+def _run(address, backend, coro_fun):
+    handle = (Icmp6Handle if ':' in address else IcmpHandle)(backend)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro_fun(handle))
+    finally:
+        handle.close()
+        loop.close()
+
+
+def traceroute(address, *, max_hops=DEFAULT_MAX_HOPS, queries=DEFAULT_QUERIES,
+               timeout=1000, data=None, backend=None):
+    """ Blocking version of async_traceroute() on private handle """
+    return _run(address, backend, lambda handle: async_traceroute(
+        handle, address, max_hops=max_hops, queries=queries,
+        timeout=timeout, data=data))
+
+
+def path_mtu(address, *, high=DEFAULT_MAX_MTU, low=None,
+             probes=DEFAULT_MTU_PROBES, timeout=1000, backend=None):
+    """ Blocking version of async_path_mtu() on private handle """
+    return _run(address, backend, lambda handle: async_path_mtu(
+        handle, address, high=high, low=low, probes=probes,
+        timeout=timeout))
@@ -0,0 +1,139 @@
+import collections
+import time
+
+from .errors import *
+from .errors import errno_map
+
+__all__ = [
+    'Tracer',
+]
+
+IP_SUCCESS = 0
+
+PHASES = ('address', 'buffer', 'send', 'parse')
+
+try:
+    clock_ns = time.perf_counter_ns
+except AttributeError:
+    def clock_ns():
+        return int(time.perf_counter() * 1e9)
+
+
+class Span(object):
+    """ Timestamps of single traced request """
+
+    __slots__ = ('tracer', 'pool', 'allocated', 'marks')
+
+    def __init__(self, tracer, pool):
+        self.tracer = tracer
+        self.pool = pool
+        self.allocated = pool.allocated_bytes
+        self.marks = [tracer.clock()]
+
+    def mark(self):
+        self.marks.append(self.tracer.clock())
+
+    def leased(self):
+        self.marks.append(self.tracer.clock())
+        self.allocated = self.pool.allocated_bytes - self.allocated
+
+    def finish(self, replies):
+        self.marks.append(self.tracer.clock())
+        self.tracer.record(self, replies)
+
+    def fail(self, exc):
+        self.tracer.error(exc)
+
+
+class Tracer(object):
+    """ Collects per-phase durations of ping calls (destination address
+    conversion, reply buffer acquisition, backend send call, reply decoding)
+    along with counters of allocated buffer bytes, decoded replies and
+    errors by exception class.
+
+    Tracer is active while installed with set_tracer() or used as context
+    manager. Without installed tracer ping functions skip instrumentation
+    entirely. If callback is given, it is called for each successful request
+    with tuple of phase durations in nanoseconds and list of replies. For
+    asynchronous calls send phase includes waiting for reply. """
+
+    def __init__(self, callback=None, clock=clock_ns):
+        self.callback = callback
+        self.clock = clock
+        self._prev = None
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.total_ns = [0] * len(PHASES)
+        self.max_ns = [0] * len(PHASES)
+        self.buffer_bytes = 0
+        self.replies = 0
+        self.errors = collections.Counter()
+
+    def span(self, handle):
+        return Span(self, handle.buffers)
+
+    def record(self, span, replies):
+        marks = span.marks
+        durations = tuple(marks[idx + 1] - marks[idx]
+                          for idx in range(len(PHASES)))
+        total_ns, max_ns = self.total_ns, self.max_ns
+        for idx, value in enumerate(durations):
+            total_ns[idx] += value
+            if value > max_ns[idx]:
+                max_ns[idx] = value
+        self.calls += 1
+        self.buffer_bytes += span.allocated
+        self.replies += len(replies)
+        for rep in replies:
+            if rep.Status != IP_SUCCESS:
+                self.errors[errno_map.get(rep.Status, OSError).__name__] += 1
+        if self.callback is not None:
+            self.callback(durations, replies)
+
+    def error(self, exc):
+        self.errors[type(exc).__name__] += 1
+
+    def summary(self):
+        res = collections.OrderedDict()
+        res['calls'] = self.calls
+        phases = res['phases'] = collections.OrderedDict()
+        for idx, name in enumerate(PHASES):
+            phases[name] = collections.OrderedDict([
+                ('total_ns', self.total_ns[idx]),
+                ('mean_ns', self.total_ns[idx] / self.calls
+                    if self.calls else 0.),
+                ('max_ns', self.max_ns[idx]),
+            ])
+        res['buffer_bytes'] = self.buffer_bytes
+        res['replies'] = self.replies
+        res['errors'] = collections.OrderedDict(sorted(self.errors.items()))
+        return res
+
+    def format(self):
+        total = sum(self.total_ns)
+        lines = ["%-8s %12s %12s %12s %7s" % ("phase", "total ms", "mean us",
+                                             "max us", "share")]
+        for idx, name in enumerate(PHASES):
+            lines.append("%-8s %12.3f %12.3f %12.3f %6.1f%%" % (
+                name, self.total_ns[idx] / 1e6,
+                self.total_ns[idx] / self.calls / 1e3 if self.calls else 0.,
+                self.max_ns[idx] / 1e3,
+                self.total_ns[idx] * 100 / total if total else 0.))
+        lines.append("calls=%d replies=%d buffer_bytes=%d" %
+                     (self.calls, self.replies, self.buffer_bytes))
+        if self.errors:
+            lines.append("errors: " + ", ".join(
+                "%s=%d" % item for item in sorted(self.errors.items())))
+        return "\n".join(lines)
+
+    def __enter__(self):
+        from . import set_tracer
+        self._prev = set_tracer(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        from . import set_tracer
+        set_tracer(self._prev)
+        self._prev = None